@@ -1,7 +1,65 @@
 # A number of rows to be sent as a batch to the database
 BATCH_SIZE = 1000
+# A bulk_write batch is also flushed when its encoded size reaches this limit
+BULK_WRITE_MAX_BYTES = 16 * 1024 * 1024
 PAGE_SIZE = 100
 
+# Pagination mode of find_by_pagination ("keyset" or "skip")
+# keyset: resume each page from the last seen sort key (linear scan)
+# skip: legacy skip/limit paging
+PAGINATION_MODE = "keyset"
+
+# update_many_by_map sends at most MAP_UPDATE_CHUNK_SIZE keys per update and
+# falls back to the per-document path for maps larger than MAP_UPDATE_MAX_KEYS
+MAP_UPDATE_CHUNK_SIZE = 5000
+MAP_UPDATE_MAX_KEYS = 50000
+
+# A number of worker threads used by parallel operations (e.g. parallel_scan)
+JOBS = 1
+# A number of domains migrated concurrently by versions using DomainExecutor
+DOMAIN_JOBS = 1
+# Throughput of a domain worker assumed by the expected finish time of the plan
+DOMAIN_DOCS_PER_SECOND = 1000
+# Resolve workspace_id of per-domain collections (e.g. MONITORING.alert) in one
+# scan over every domain instead of one scan per domain
+CROSS_DOMAIN_SCAN = False
+
+# A number of collections handled concurrently by DDL operations, e.g.
+# drop_indexes(db_name, "*") and drop_collections
+DDL_JOBS = 4
+# Temporary indexes created from a dry-run report (migrate.py --index-advice)
+# are named with TEMP_INDEX_PREFIX, and only advised for filter shapes which
+# examine at least INDEX_ADVICE_MIN_DOCS_EXAMINED documents in total
+TEMP_INDEX_PREFIX = "db_migration_tmp_"
+INDEX_ADVICE_MIN_DOCS_EXAMINED = 10000
+# A number of collections whose indexes are rebuilt concurrently after a run
+# (migrate.py --rebuild-indexes). A collection claimed for a rebuild in the ledger
+# is claimed again by another runner when the claim is older than
+# INDEX_REBUILD_CLAIM_SECONDS (its runner died), so keep it above the longest build
+INDEX_REBUILD_JOBS = 4
+INDEX_REBUILD_CLAIM_SECONDS = 3600
+
+# A number of requests kept in flight by AsyncMongoCustomClient.gather
+ASYNC_CONCURRENCY = 100
+
+# The ledger records finished steps and scan checkpoints, so that an interrupted
+# migration continues where it stopped. It is off unless LEDGER is set or
+# migrate.py runs with --ledger (always on for --enqueue/--worker), so that a
+# re-run of a version runs every step again by default.
+LEDGER = False
+# Database of the ledger and of the work queue
+LEDGER_DB = "db_migration"
+# find_by_pagination saves a scan checkpoint every LEDGER_CHECKPOINT_PAGES pages
+LEDGER_CHECKPOINT_PAGES = 10
+
+# Work queue of migrate.py --enqueue/--worker (stored in LEDGER_DB.work_queue)
+# A runner renews the lease of its unit every third of WORK_QUEUE_LEASE_SECONDS,
+# idle runners poll every WORK_QUEUE_POLL_SECONDS and a failing unit is retried
+# until it has been claimed WORK_QUEUE_MAX_ATTEMPTS times
+WORK_QUEUE_LEASE_SECONDS = 300
+WORK_QUEUE_POLL_SECONDS = 5
+WORK_QUEUE_MAX_ATTEMPTS = 3
+
 LOG_PATH = "db_migration_log"
 
 # This is used because the database name is different depending on the environment.
@@ -21,8 +79,23 @@ DB_NAME_MAP = {
 
 CONNECTION_URI = "localhost:27017"
 
+# Keyword options of MongoClient, merged with CONNECTION_OPTIONS of the external yaml
+# e.g. maxPoolSize, minPoolSize, compressors (zstd, snappy, zlib), socketTimeoutMS,
+#      retryWrites, w (write concern), readConcernLevel
+CONNECTION_OPTIONS = {
+    "readPreference": "primary",
+}
+
 LOG = {}
 
+# Sampling rate of debug logs per client operation ("*" for the others)
+# e.g. {"insert_one": 0.01, "update_one": 0.01, "*": 1.0}
+LOG_SAMPLE_RATE = {}
+
+# Filters, updates and documents longer than this are cut in debug logs
+# (0 to log the full payload)
+LOG_PAYLOAD_MAX_LENGTH = 512
+
 DEFAULT_LOGGER = "migration"
 
 HANDLER_DEFAULT_CONSOLE = {
@@ -31,12 +104,16 @@ HANDLER_DEFAULT_CONSOLE = {
     "filters": [],
 }
 
+# Records are written by a background thread. The log file is rotated every
+# maxBytes and the rotated files are gzipped into the "backup" directory.
 HANDLER_DEFAULT_FILE = {
     "level": "DEBUG",
-    "formatter": "standard",
-    "class": "logging.FileHandler",
+    "formatter": "file",
+    "class": "lib.log_handler.QueueRotatingFileHandler",
     "filename": "",
     "mode": "w",
+    "maxBytes": 100 * 1024 * 1024,
+    "backupCount": 20,
 }
 
 HANDLER_DEFAULT_TMPL = {
@@ -49,8 +126,9 @@ FORMATTER_DEFAULT_TMPL = {
         "format": "%(asctime)s.%(msecs)03dZ [%(levelname)s] %(message)s",
         "datefmt": "%Y-%m-%dT%H:%M:%S",
     },
+    # newline-delimited JSON
     "file": {
-        "format": '{"time": "%(asctime)s.%(msecs)03dZ", "level": "%(levelname)s", "file_name": "%(filename)s", "line": %(lineno)d, "message": %(message)s}',
+        "()": "lib.log_handler.JsonFormatter",
         "datefmt": "%Y-%m-%dT%H:%M:%S",
     },
 }
@@ -1,2 +1,3 @@
 from lib.mongo_custom_client import MongoCustomClient
+from lib.async_mongo_custom_client import AsyncMongoCustomClient
 from lib.logger import set_logger
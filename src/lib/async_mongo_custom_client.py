@@ -0,0 +1,613 @@
+import asyncio
+import logging
+
+from pymongo import AsyncMongoClient
+from pymongo.asynchronous.collection import AsyncCollection
+import pymongo.errors
+
+from conf import *
+from lib.mongo_custom_client import MongoCustomClient
+from lib.op_logger import OperationLogger
+from lib.util import load_yaml_from_file, print_stage, print_finish_stage
+
+_LOGGER = logging.getLogger(DEFAULT_LOGGER)
+
+__all__ = ["AsyncMongoCustomClient"]
+
+# options of migrate.py which need the synchronous client
+_UNSUPPORTED_OPTIONS = ["ledger", "reset_ledger", "index_advice", "rebuild_indexes"]
+
+
+class AsyncMongoCustomClient(object):
+    """asyncio counterpart of MongoCustomClient built on pymongo's async API.
+
+    Every database method is a coroutine with the same name and arguments as
+    in MongoCustomClient, so a migration can keep hundreds of latency-bound
+    requests in flight with gather(). In dry-run mode writes are recorded and
+    skipped like in MongoCustomClient, but filters are not explained.
+
+    Only the methods defined here are available. The ledger, --index-advice,
+    --rebuild-indexes, deferred index drops, bulk_writer, parallel_scan and
+    the map updates need the synchronous client: the constructor raises a
+    ValueError when one of these options is set, and find_by_pagination
+    always pages by keyset. The client does not ask to confirm the config,
+    migrate.py does it before the event loop starts.
+
+    async def main(file_path):
+        mongo_client = AsyncMongoCustomClient(file_path, "vX.Y.Z")
+        await mongo_client.gather(
+            *[migrate_domain(mongo_client, domain_id) for domain_id in domain_ids]
+        )
+    """
+
+    # runtime options given by the command line, shared with MongoCustomClient
+    options = MongoCustomClient.options
+
+    def __init__(self, file_path: str = None, version: str = None):
+        self.conn = None
+        self.version = version
+        self._init_catalog()
+        if file_path:
+            self.file_conf = load_yaml_from_file(file_path)
+            self.batch_size = self.file_conf.get("BATCH_SIZE", BATCH_SIZE)
+            self.page_size = self.file_conf.get("PAGE_SIZE", PAGE_SIZE)
+            self.db_name_map = self.file_conf.get("DB_NAME_MAP", DB_NAME_MAP)
+            self.ddl_jobs = self.file_conf.get("DDL_JOBS", DDL_JOBS)
+            self.concurrency = self.file_conf.get(
+                "ASYNC_CONCURRENCY", ASYNC_CONCURRENCY
+            )
+            ledger_enabled = self.file_conf.get("LEDGER", LEDGER)
+            self.op_logger = OperationLogger(
+                _LOGGER,
+                self.file_conf.get("LOG_SAMPLE_RATE", LOG_SAMPLE_RATE),
+                self.file_conf.get("LOG_PAYLOAD_MAX_LENGTH", LOG_PAYLOAD_MAX_LENGTH),
+            )
+
+            print_stage("SET", "CONFIG")
+            _LOGGER.debug(f"config from external yaml applied (file_path={file_path})")
+            self._view_yaml()
+
+        else:
+            self.file_conf = None
+            self.batch_size = BATCH_SIZE
+            self.page_size = PAGE_SIZE
+            self.db_name_map = DB_NAME_MAP
+            self.ddl_jobs = DDL_JOBS
+            self.concurrency = ASYNC_CONCURRENCY
+            ledger_enabled = LEDGER
+            self.op_logger = OperationLogger(
+                _LOGGER, LOG_SAMPLE_RATE, LOG_PAYLOAD_MAX_LENGTH
+            )
+            _LOGGER.debug("conf from default conf")
+
+        unsupported = [
+            option for option in _UNSUPPORTED_OPTIONS if self.options.get(option)
+        ]
+        if ledger_enabled:
+            unsupported.append("LEDGER")
+        if unsupported:
+            raise ValueError(
+                f"AsyncMongoCustomClient does not support "
+                f"{', '.join(unsupported)}. Use MongoCustomClient instead."
+            )
+
+        self.recorder = MongoCustomClient._get_dry_run_recorder()
+        self._create_connection_pool()
+
+    async def gather(self, *coros, concurrency: int = None):
+        """Await coroutines concurrently with at most `concurrency` in flight."""
+        semaphore = asyncio.Semaphore(concurrency or self.concurrency)
+
+        async def _run(coro):
+            async with semaphore:
+                return await coro
+
+        return await asyncio.gather(*[_run(coro) for coro in coros])
+
+    async def insert_one(
+        self, db_name: str, col_name: str, q_create: dict, is_new: bool = False
+    ):
+        self._log_op(
+            "insert_one",
+            db_name=db_name,
+            col_name=col_name,
+            q_create=q_create,
+            is_new=is_new,
+        )
+
+        collection = await self._get_collection(db_name, col_name, is_new)
+        if isinstance(collection, AsyncCollection):
+            if self._skip_write("insert_one", db_name, col_name):
+                return
+
+            await collection.insert_one(q_create)
+            if is_new:
+                self._add_catalog_collection(db_name, col_name)
+
+    async def insert_many(self, db_name: str, col_name: str, records, is_new):
+        self._log_op(
+            "insert_many",
+            db_name=db_name,
+            col_name=col_name,
+            is_new=is_new,
+        )
+
+        collection = await self._get_collection(db_name, col_name, is_new)
+        if isinstance(collection, AsyncCollection):
+            if self._skip_write("insert_many", db_name, col_name, count=len(records)):
+                return
+
+            await collection.insert_many(records)
+            if is_new:
+                self._add_catalog_collection(db_name, col_name)
+
+    async def update_many(
+        self,
+        db_name: str,
+        col_name: str,
+        q_filter: dict,
+        q_update: dict,
+        upsert: bool = False,
+    ):
+        self._log_op(
+            "update_many",
+            db_name=db_name,
+            col_name=col_name,
+            q_filter=q_filter,
+            q_update=q_update,
+            upsert=upsert,
+        )
+
+        collection = await self._get_collection(db_name, col_name)
+        if isinstance(collection, AsyncCollection):
+            if self._skip_write("update_many", db_name, col_name, q_filter=q_filter):
+                return
+
+            await collection.update_many(q_filter, q_update, upsert)
+
+    async def update_one(
+        self,
+        db_name: str,
+        col_name: str,
+        q_filter: dict,
+        q_update: dict,
+        upsert: bool = False,
+    ):
+        self._log_op(
+            "update_one",
+            db_name=db_name,
+            col_name=col_name,
+            q_filter=q_filter,
+            q_update=q_update,
+            upsert=upsert,
+        )
+
+        collection = await self._get_collection(db_name, col_name)
+        if isinstance(collection, AsyncCollection):
+            if self._skip_write("update_one", db_name, col_name, q_filter=q_filter):
+                return
+
+            await collection.update_one(q_filter, q_update, upsert)
+
+    async def delete_many(
+        self, db_name: str, col_name: str, q_filter: dict, q_options: dict = None
+    ):
+        self._log_op(
+            "delete_many",
+            db_name=db_name,
+            col_name=col_name,
+            q_filter=q_filter,
+            q_options=q_options,
+        )
+
+        collection = await self._get_collection(db_name, col_name)
+        if isinstance(collection, AsyncCollection):
+            if self._skip_write("delete_many", db_name, col_name, q_filter=q_filter):
+                return
+
+            await collection.delete_many(q_filter, q_options)
+
+    async def count(self, db_name: str, col_name: str, q_filter: dict):
+        self._log_op(
+            "count",
+            db_name=db_name,
+            col_name=col_name,
+            q_filter=q_filter,
+        )
+
+        collection = await self._get_collection(db_name, col_name)
+        if isinstance(collection, AsyncCollection):
+            self._record_read("count", db_name, col_name, q_filter=q_filter)
+            return await collection.count_documents(q_filter)
+        else:
+            return 0
+
+    async def find_one(
+        self, db_name: str, col_name: str, q_filter: dict, projection: dict = {}
+    ):
+        self._log_op(
+            "find_one",
+            db_name=db_name,
+            col_name=col_name,
+            q_filter=q_filter,
+            projection=projection,
+        )
+        collection = await self._get_collection(db_name, col_name)
+        if isinstance(collection, AsyncCollection):
+            self._record_read("find_one", db_name, col_name, q_filter=q_filter)
+            return await collection.find_one(q_filter)
+
+    async def find(
+        self, db_name: str, col_name: str, q_filter: dict, projection: dict = {}
+    ):
+        """Return an async cursor (use `async for`) or an empty cursor."""
+        self._log_op(
+            "find",
+            db_name=db_name,
+            col_name=col_name,
+            q_filter=q_filter,
+            projection=projection,
+        )
+
+        collection = await self._get_collection(db_name, col_name)
+        if isinstance(collection, AsyncCollection):
+            self._record_read("find", db_name, col_name, q_filter=q_filter)
+            return collection.find(q_filter, projection or None)
+        else:
+            return _EmptyCursor()
+
+    async def find_by_pagination(
+        self,
+        db_name: str,
+        col_name: str,
+        q_filter: dict,
+        projection=None,
+        show_progress=False,
+        sort_key="_id",
+    ):
+        self._log_op(
+            "find_by_pagination",
+            db_name=db_name,
+            col_name=col_name,
+            q_filter=q_filter,
+            projection=projection,
+            show_progress=show_progress,
+            sort_key=sort_key,
+        )
+
+        if projection is None:
+            projection = {}
+
+        collection = await self._get_collection(db_name, col_name)
+
+        total_count = await self.count(db_name, col_name, q_filter)
+        if total_count == 0 or not isinstance(collection, AsyncCollection):
+            return
+
+        projection, strip_fields = self._create_keyset_projection(
+            projection, sort_key
+        )
+        if sort_key == "_id":
+            sort = [("_id", 1)]
+        else:
+            sort = [(sort_key, 1), ("_id", 1)]
+
+        current_count = 0
+        last_item = None
+        while True:
+            page_filter = self._create_keyset_filter(q_filter, sort_key, last_item)
+            cursor = (
+                collection.find(page_filter, projection or None)
+                .sort(sort)
+                .limit(self.page_size)
+            )
+
+            items = await cursor.to_list(length=None)
+            self._record_read("find_page", db_name, col_name, q_filter=q_filter)
+            if len(items) == 0:
+                break
+
+            last_item = items[-1]
+            if strip_fields:
+                last_item = {
+                    "_id": last_item["_id"],
+                    sort_key: self._get_field_value(last_item, sort_key),
+                }
+                for item in items:
+                    for field in strip_fields:
+                        item.pop(field, None)
+
+            current_count += len(items)
+            if show_progress:
+                current_percent = round(current_count / total_count * 100, 2)
+                _LOGGER.debug(
+                    "%s.%s Operated Count : %s/%s (%s%%)",
+                    db_name,
+                    col_name,
+                    current_count,
+                    total_count,
+                    current_percent,
+                )
+
+            yield items
+
+            if len(items) < self.page_size:
+                break
+
+    async def aggregate(self, db_name: str, col_name: str, pipeline: list):
+        self._log_op(
+            "aggregate",
+            db_name=db_name,
+            col_name=col_name,
+            pipeline=pipeline,
+        )
+
+        collection = await self._get_collection(db_name, col_name)
+        if isinstance(collection, AsyncCollection):
+            self._record_read(
+                "aggregate",
+                db_name,
+                col_name,
+                q_filter=self._get_match_filter(pipeline),
+            )
+            return await collection.aggregate(pipeline)
+        else:
+            return _EmptyCursor()
+
+    async def bulk_write(
+        self, db_name: str, col_name: str, operations: list, ordered: bool = True
+    ):
+        result = {
+            "inserted": 0,
+            "matched": 0,
+            "modified": 0,
+            "upserted": 0,
+            "deleted": 0,
+        }
+        if len(operations) == 0:
+            return result
+
+        collection = await self._get_collection(db_name, col_name)
+        if not isinstance(collection, AsyncCollection):
+            return result
+
+        if self._skip_write("bulk_write", db_name, col_name, count=len(operations)):
+            return result
+
+        for index in range(0, len(operations), self.batch_size):
+            batch = operations[index : index + self.batch_size]
+            bulk_result = await collection.bulk_write(batch, ordered=ordered)
+            result["inserted"] += bulk_result.inserted_count
+            result["matched"] += bulk_result.matched_count
+            result["modified"] += bulk_result.modified_count
+            result["upserted"] += bulk_result.upserted_count
+            result["deleted"] += bulk_result.deleted_count
+        return result
+
+    async def get_indexes(self, db_name: str, col_name: str, comment=None):
+        self._log_op(
+            "get_indexes",
+            db_name=db_name,
+            col_name=col_name,
+            comment=comment,
+        )
+
+        results = []
+        collection = await self._get_collection(db_name, col_name)
+        if isinstance(collection, AsyncCollection):
+            self._record_read("get_indexes", db_name, col_name)
+            indexes = await collection.index_information(comment=comment)
+
+            for raw_index in indexes:
+                items = indexes[raw_index]["key"]
+
+                index = {
+                    "name": raw_index,
+                    "v": indexes[raw_index]["v"],
+                    "key": self._create_index_key(items),
+                    "options": {
+                        option: value
+                        for option, value in indexes[raw_index].items()
+                        if option not in ["key", "v", "ns"]
+                    },
+                }
+                results.append(index)
+        return results
+
+    async def create_index(
+        self, db_name: str, col_name: str, keys: list, name: str = None, **options
+    ):
+        self._log_op(
+            "create_index",
+            db_name=db_name,
+            col_name=col_name,
+            keys=keys,
+            name=name,
+            **options,
+        )
+
+        collection = await self._get_collection(db_name, col_name)
+        if isinstance(collection, AsyncCollection):
+            if self._skip_write("create_index", db_name, col_name):
+                return
+
+            return await collection.create_index(keys, name=name, **options)
+
+    async def has_index(self, db_name: str, col_name: str, name: str) -> bool:
+        return any(
+            index["name"] == name
+            for index in await self.get_indexes(db_name, col_name)
+        )
+
+    async def drop_index(self, db_name: str, col_name: str, name: str):
+        self._log_op("drop_index", db_name=db_name, col_name=col_name, name=name)
+
+        collection = await self._get_collection(db_name, col_name)
+        if isinstance(collection, AsyncCollection):
+            if self._skip_write("drop_index", db_name, col_name):
+                return
+
+            try:
+                await collection.drop_index(name)
+            except pymongo.errors.OperationFailure as e:
+                _LOGGER.debug(f"SKIP / index not found ({name}): {e}")
+
+    async def drop_indexes(self, db_name: str, col_name: str, comment=None):
+        """Drop the indexes of a collection, or of every collection with "*".
+
+        The drops are neither deferred nor captured for a rebuild (see the
+        class docstring). With "*" up to DDL_JOBS collections run at a time.
+        """
+        self._log_op(
+            "drop_indexes",
+            db_name=db_name,
+            col_name=col_name,
+            comment=comment,
+        )
+
+        if col_name == "*":
+            if self._skip_write("drop_indexes", db_name, col_name):
+                return
+
+            return await self.gather(
+                *[
+                    self.drop_indexes(db_name, name, comment)
+                    for name in await self.get_collection_names(db_name)
+                ],
+                concurrency=self.ddl_jobs,
+            )
+
+        collection = await self._get_collection(db_name, col_name)
+        if isinstance(collection, AsyncCollection):
+            if self._skip_write("drop_indexes", db_name, col_name):
+                return
+
+            return await collection.drop_indexes(comment=comment)
+
+    async def drop_collection(self, db_name: str, col_name: str):
+        self._log_op(
+            "drop_collection",
+            db_name=db_name,
+            col_name=col_name,
+        )
+        collection = await self._get_collection(db_name, col_name)
+        if isinstance(collection, AsyncCollection):
+            if self._skip_write("drop_collection", db_name, col_name):
+                return
+
+            result = await collection.drop()
+            self._remove_catalog_collection(db_name, col_name)
+            return result
+
+    async def get_collection_names(self, db_name: str) -> list:
+        """Return the collections of a mapped database, without system ones."""
+        real_db_name = self.db_name_map.get(db_name)
+        if real_db_name is None or not await self._has_database(real_db_name):
+            return []
+
+        # a lookup of "*" loads the collection names into the catalog
+        await self._has_collection(real_db_name, "*")
+        col_names = self._collection_names.get(real_db_name, set())
+        return sorted(
+            col_name for col_name in col_names if not col_name.startswith("system.")
+        )
+
+    async def distinct(self, db_name: str, col_name: str, key: str):
+        self._log_op(
+            "distinct",
+            db_name=db_name,
+            col_name=col_name,
+            key=key,
+        )
+        collection = await self._get_collection(db_name, col_name)
+        if isinstance(collection, AsyncCollection):
+            self._record_read("distinct", db_name, col_name)
+            return await collection.distinct(key)
+
+    async def close(self):
+        if self.conn is not None:
+            await self.conn.close()
+
+    # the helpers without I/O are shared with MongoCustomClient
+    _log_op = MongoCustomClient._log_op
+    _skip_write = MongoCustomClient._skip_write
+    _record_read = MongoCustomClient._record_read
+    _get_connection_uri = MongoCustomClient._get_connection_uri
+    _get_connection_options = MongoCustomClient._get_connection_options
+    _view_yaml = MongoCustomClient._view_yaml
+    invalidate_catalog = MongoCustomClient.invalidate_catalog
+    _init_catalog = MongoCustomClient._init_catalog
+    _get_collection_handle = MongoCustomClient._get_collection_handle
+    _add_catalog_collection = MongoCustomClient._add_catalog_collection
+    _remove_catalog_collection = MongoCustomClient._remove_catalog_collection
+    _get_match_filter = staticmethod(MongoCustomClient._get_match_filter)
+    _create_keyset_filter = staticmethod(MongoCustomClient._create_keyset_filter)
+    _create_keyset_projection = staticmethod(
+        MongoCustomClient._create_keyset_projection
+    )
+    _get_field_value = staticmethod(MongoCustomClient._get_field_value)
+    _create_index_key = staticmethod(MongoCustomClient._create_index_key)
+
+    def _create_connection_pool(self):
+        connection_uri = self._get_connection_uri()
+        connection_options = self._get_connection_options()
+
+        self.conn = AsyncMongoClient(connection_uri, **connection_options)
+        _LOGGER.debug(
+            f"Mongo DB async connection successful (options = {connection_options})"
+        )
+        print_finish_stage()
+
+    async def _get_collection(
+        self, db: str, col_name: str, is_new: bool = False
+    ) -> [AsyncCollection, None]:
+        try:
+            db_name = self.db_name_map.get(db)
+
+            if db_name is None:
+                raise TypeError(f"Does not found {db} key in DB_NAME_MAP")
+
+            if not await self._has_database(db_name):
+                raise ValueError(f"Does not found database. (db = {db_name})")
+
+            if not is_new:
+                if not await self._has_collection(db_name, col_name):
+                    raise ValueError(
+                        f"Dose not found collection. (db = {db_name}, collection = {col_name})"
+                    )
+            return self._get_collection_handle(db_name, col_name)
+
+        except Exception as e:
+            _LOGGER.debug(f"SKIP / {e}")
+            return None
+
+    async def _has_database(self, db_name: str) -> bool:
+        if self._database_names and db_name in self._database_names:
+            self.catalog_stats["hit"] += 1
+            return True
+
+        self.catalog_stats["miss"] += 1
+        self._database_names = set(await self.conn.list_database_names())
+        return db_name in self._database_names
+
+    async def _has_collection(self, db_name: str, col_name: str) -> bool:
+        col_names = self._collection_names.get(db_name)
+        if col_names and col_name in col_names:
+            self.catalog_stats["hit"] += 1
+            return True
+
+        self.catalog_stats["miss"] += 1
+        col_names = set(await self.conn[db_name].list_collection_names())
+        self._collection_names[db_name] = col_names
+        return col_name in col_names
+
+
+class _EmptyCursor(object):
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        raise StopAsyncIteration
+
+    async def to_list(self, length=None):
+        return []
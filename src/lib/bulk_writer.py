@@ -0,0 +1,218 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bson
+import pymongo.collection
+from pymongo import (
+    InsertOne,
+    UpdateOne,
+    UpdateMany,
+    ReplaceOne,
+    DeleteOne,
+    DeleteMany,
+)
+
+from conf import DEFAULT_LOGGER
+
+_LOGGER = logging.getLogger(DEFAULT_LOGGER)
+
+__all__ = ["BulkWriter"]
+
+_local = threading.local()
+
+
+class BulkWriter(object):
+    """Buffer write operations and send them as bounded bulk_write batches.
+
+    A batch is flushed every `batch_size` operations or when the encoded size
+    of the buffered operations reaches `max_bytes`. Flushed batches are written
+    by a background thread while the caller keeps reading, and at most one
+    batch is in flight at a time so memory stays flat.
+
+    with mongo_client.bulk_writer("IDENTITY", "user") as writer:
+        for item in items:
+            writer.append(UpdateOne({"_id": item["_id"]}, {"$set": {...}}))
+
+    print(writer.result)
+
+    When the block raises, the buffered operations are discarded and only the
+    batch already in flight is waited for, so no partial batch is written
+    after the failure.
+
+    When `record_write` is given (dry-run), batches are passed to it as
+    record_write(count) instead of being written.
+    """
+
+    def __init__(
+        self,
+        collection: pymongo.collection.Collection,
+        batch_size: int,
+        max_bytes: int = None,
+        ordered: bool = True,
+        background: bool = True,
+        name: str = "",
+        record_write=None,
+    ):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.ordered = ordered
+        self.name = name
+        self.record_write = record_write
+        self.result = {
+            "batch": 0,
+            "inserted": 0,
+            "matched": 0,
+            "modified": 0,
+            "upserted": 0,
+            "deleted": 0,
+        }
+
+        self._operations = []
+        self._bytes = 0
+        self._skipped = 0
+        self._future = None
+        self._executor = None
+        if background and record_write is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="bulk_writer"
+            )
+
+        _get_open_writers().append(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def append(self, operation):
+        if not isinstance(self.collection, pymongo.collection.Collection):
+            if self._skipped == 0:
+                _LOGGER.debug(
+                    f"SKIP / bulk_writer has no collection ({self.name}), "
+                    f"operations are not written"
+                )
+            self._skipped += 1
+            return
+
+        self._operations.append(operation)
+        if self.max_bytes:
+            self._bytes += self._estimate_size(operation)
+
+        if len(self._operations) >= self.batch_size or (
+            self.max_bytes and self._bytes >= self.max_bytes
+        ):
+            self.flush()
+
+    def extend(self, operations):
+        for operation in operations:
+            self.append(operation)
+
+    def flush(self):
+        """Send the buffered operations after the previous batch has finished."""
+        self._wait()
+
+        if not self._operations:
+            return
+
+        operations = self._operations
+        self._operations = []
+        self._bytes = 0
+
+        if self._executor:
+            self._future = self._executor.submit(self._write, operations)
+        else:
+            self._write(operations)
+
+    def close(self):
+        try:
+            self.flush()
+            self._wait()
+        finally:
+            self._release()
+
+        if self._skipped:
+            _LOGGER.debug(
+                f"bulk_writer skipped ({self.name}): operations = {self._skipped}"
+            )
+        _LOGGER.debug(f"bulk_writer result ({self.name}): {self.result}")
+        return self.result
+
+    def abort(self):
+        """Discard the buffered operations and wait for the batch in flight.
+
+        An error of that batch is logged rather than raised, so that it does
+        not hide the exception which aborted the writer.
+        """
+        discarded = len(self._operations)
+        self._operations = []
+        self._bytes = 0
+        try:
+            self._wait()
+        except Exception as e:
+            _LOGGER.error(f"bulk_writer batch failed while aborting ({self.name}): {e}")
+        finally:
+            self._release()
+
+        _LOGGER.debug(
+            f"bulk_writer aborted ({self.name}): {self.result}, discarded = {discarded}"
+        )
+        return self.result
+
+    def _release(self):
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+        open_writers = _get_open_writers()
+        if self in open_writers:
+            open_writers.remove(self)
+
+    @staticmethod
+    def flush_open_writers():
+        """Write everything buffered by the writers open in the current thread."""
+        for writer in list(_get_open_writers()):
+            writer.flush()
+            writer._wait()
+
+    def _wait(self):
+        if self._future is not None:
+            future = self._future
+            self._future = None
+            future.result()
+
+    def _write(self, operations):
+        if self.record_write is not None:
+            self.record_write(len(operations))
+            self.result["batch"] += 1
+            return
+
+        result = self.collection.bulk_write(operations, ordered=self.ordered)
+        self.result["batch"] += 1
+        self.result["inserted"] += result.inserted_count
+        self.result["matched"] += result.matched_count
+        self.result["modified"] += result.modified_count
+        self.result["upserted"] += result.upserted_count
+        self.result["deleted"] += result.deleted_count
+
+    @staticmethod
+    def _estimate_size(operation) -> int:
+        size = 0
+        if isinstance(
+            operation, (UpdateOne, UpdateMany, ReplaceOne, DeleteOne, DeleteMany)
+        ):
+            size += len(bson.encode({"q": getattr(operation, "_filter", {})}))
+        if isinstance(operation, (InsertOne, UpdateOne, UpdateMany, ReplaceOne)):
+            size += len(bson.encode({"u": getattr(operation, "_doc", {})}))
+        return size
+
+
+def _get_open_writers() -> list:
+    if not hasattr(_local, "writers"):
+        _local.writers = []
+    return _local.writers
@@ -0,0 +1,104 @@
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from rich.console import Console
+from rich.table import Table
+
+from conf import DEFAULT_LOGGER
+
+_LOGGER = logging.getLogger(DEFAULT_LOGGER)
+
+__all__ = ["DDLExecutor"]
+
+
+class DDLExecutor(object):
+    """Run a DDL method of the client on many collections of a database.
+
+    op is the name of a client method taking (db_name, col_name, **kwargs),
+    e.g. "drop_indexes", "drop_collection" or "coll_mod". The collections
+    run on a pool of `jobs` threads (DDL_JOBS) and the time of every
+    collection is printed. A failing collection is reported and raised once
+    the others are finished.
+    """
+
+    def __init__(self, mongo_client, jobs: int = None):
+        self.mongo_client = mongo_client
+        self.jobs = max(jobs or getattr(mongo_client, "ddl_jobs", 1) or 1, 1)
+
+    def run(self, op: str, db_name: str, col_names: list, **kwargs) -> list:
+        col_names = list(col_names)
+        if not col_names:
+            return []
+
+        start = datetime.now()
+        if self.jobs <= 1 or len(col_names) <= 1:
+            results = [
+                self._run_collection(op, db_name, col_name, kwargs)
+                for col_name in col_names
+            ]
+        else:
+            with ThreadPoolExecutor(
+                max_workers=self.jobs, thread_name_prefix="ddl"
+            ) as executor:
+                futures = [
+                    executor.submit(
+                        contextvars.copy_context().run,
+                        self._run_collection,
+                        op,
+                        db_name,
+                        col_name,
+                        kwargs,
+                    )
+                    for col_name in col_names
+                ]
+                results = [future.result() for future in futures]
+
+        elapsed = datetime.now() - start
+        _LOGGER.debug(
+            f"ddl_executor: {op} {db_name} "
+            f"(collections = {len(results)}, jobs = {self.jobs}, time = {elapsed})"
+        )
+        if len(results) > 1:
+            self._print_report(op, db_name, results, elapsed)
+
+        errors = [result for result in results if result["error"]]
+        if errors:
+            raise errors[0]["exception"]
+        return results
+
+    def _run_collection(self, op: str, db_name: str, col_name: str, kwargs: dict):
+        result = {"col_name": col_name, "elapsed": None, "error": None}
+        start = datetime.now()
+        try:
+            getattr(self.mongo_client, op)(db_name, col_name, **kwargs)
+        except Exception as e:
+            _LOGGER.error(f"ddl_executor: {op} {db_name}.{col_name} failed: {e}")
+            result["error"] = str(e)
+            result["exception"] = e
+
+        result["elapsed"] = datetime.now() - start
+        return result
+
+    @staticmethod
+    def _print_report(op: str, db_name: str, results: list, elapsed):
+        table = Table(title=f"{op.upper()} ({db_name})")
+        table.add_column("Collection")
+        table.add_column("Time", justify="right")
+        table.add_column("Status")
+
+        for result in sorted(results, key=lambda item: item["elapsed"], reverse=True):
+            table.add_row(
+                result["col_name"],
+                str(result["elapsed"]),
+                result["error"] or "DONE",
+            )
+
+        console = Console()
+        console.print(table)
+        console.print(
+            f"Collections: {len(results)} / DDL time: "
+            f"{sum((result['elapsed'] for result in results), timedelta())} "
+            f"/ Elapsed: {elapsed}"
+        )
@@ -0,0 +1,74 @@
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from conf import DEFAULT_LOGGER, DOMAIN_DOCS_PER_SECOND
+from lib.domain_scheduler import DomainScheduler
+from lib.ledger import ledger_scope
+
+_LOGGER = logging.getLogger(DEFAULT_LOGGER)
+
+__all__ = ["DomainExecutor"]
+
+
+class DomainExecutor(object):
+    """Run func(mongo_client, domain_info) for every domain.
+
+    With `jobs` > 1 the domains run on a thread pool sharing the connection
+    pool of the client. Every domain runs in its own copy of the context with
+    the ledger scope set to its domain_id, so context-local state set by func
+    does not leak between domains. Results are returned in domain order.
+
+    When the collections of the workload are given, the domains are submitted
+    largest first (see DomainScheduler) and the plan is printed before start.
+    """
+
+    def __init__(self, mongo_client, jobs: int = None):
+        self.mongo_client = mongo_client
+        self.jobs = max(jobs or getattr(mongo_client, "domain_jobs", 1) or 1, 1)
+        self.docs_per_second = getattr(
+            mongo_client, "domain_docs_per_second", DOMAIN_DOCS_PER_SECOND
+        )
+
+    def run(self, domain_infos, func, collections: list = None) -> list:
+        domain_infos = list(domain_infos)
+        if self.jobs <= 1 or len(domain_infos) <= 1:
+            return [
+                contextvars.copy_context().run(self._run_domain, func, domain_info)
+                for domain_info in domain_infos
+            ]
+
+        _LOGGER.debug(
+            f"domain_executor:\n\t"
+            f"- jobs: {self.jobs}\n\t"
+            f"- domains: {len(domain_infos)}"
+        )
+
+        scheduled_infos = domain_infos
+        if collections:
+            scheduler = DomainScheduler(
+                self.mongo_client,
+                collections,
+                self.jobs,
+                self.docs_per_second,
+            )
+            scheduled_infos = scheduler.schedule(domain_infos)
+            scheduler.print_plan(scheduled_infos)
+
+        with ThreadPoolExecutor(
+            max_workers=self.jobs, thread_name_prefix="domain"
+        ) as executor:
+            futures = {
+                id(domain_info): executor.submit(
+                    contextvars.copy_context().run,
+                    self._run_domain,
+                    func,
+                    domain_info,
+                )
+                for domain_info in scheduled_infos
+            }
+            return [futures[id(domain_info)].result() for domain_info in domain_infos]
+
+    def _run_domain(self, func, domain_info: dict):
+        with ledger_scope(domain_info["domain_id"]):
+            return func(self.mongo_client, domain_info)
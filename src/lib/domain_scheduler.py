@@ -0,0 +1,119 @@
+import heapq
+import logging
+from datetime import datetime, timedelta
+
+from rich.console import Console
+from rich.table import Table
+
+from conf import DEFAULT_LOGGER
+
+_LOGGER = logging.getLogger(DEFAULT_LOGGER)
+
+__all__ = ["DomainScheduler"]
+
+
+class DomainScheduler(object):
+    """Order domains longest-processing-time first for a pool of `jobs` workers.
+
+    The workload of a domain is the number of its documents in the given
+    (db_name, col_name) collections, counted with one $group per collection.
+    Collections of a database alias missing from DB_NAME_MAP are skipped and
+    logged, so the schedule follows the configured databases.
+    Submitting the largest domains first lets a giant tenant start right away
+    instead of deciding the end of the run when it is picked up last. The
+    expected finish time assumes `docs_per_second` per worker.
+    """
+
+    def __init__(
+        self, mongo_client, collections: list, jobs: int, docs_per_second: int
+    ):
+        self.mongo_client = mongo_client
+        self.collections = self._get_mapped_collections(collections)
+        self.jobs = max(jobs, 1)
+        self.docs_per_second = max(docs_per_second, 1)
+        self.workloads = {}
+
+    def schedule(self, domain_infos: list) -> list:
+        """Return domain_infos sorted by workload, the largest first."""
+        self.workloads = self._get_workloads()
+        return sorted(
+            domain_infos,
+            key=lambda domain_info: self.workloads.get(domain_info["domain_id"], 0),
+            reverse=True,
+        )
+
+    def print_plan(self, domain_infos: list):
+        workers = self._create_plan(domain_infos)
+        makespan = max(worker["workload"] for worker in workers)
+        total = sum(worker["workload"] for worker in workers)
+        duration = timedelta(seconds=round(makespan / self.docs_per_second))
+
+        table = Table(title="DOMAIN SCHEDULE (largest first)")
+        table.add_column("Worker", justify="right")
+        table.add_column("Domains", justify="right")
+        table.add_column("Documents", justify="right")
+        table.add_column("Largest Domain")
+        table.add_column("Estimated Time", justify="right")
+
+        for index, worker in enumerate(workers):
+            largest = worker["domains"][0] if worker["domains"] else ""
+            seconds = round(worker["workload"] / self.docs_per_second)
+            table.add_row(
+                str(index),
+                str(len(worker["domains"])),
+                f"{worker['workload']:,}",
+                f"{largest} ({self.workloads.get(largest, 0):,})" if largest else "",
+                str(timedelta(seconds=seconds)),
+            )
+
+        console = Console()
+        console.print(table)
+        console.print(
+            f"Documents: {total:,} / Expected time: {duration} "
+            f"/ Expected finish: {(datetime.now() + duration):%Y-%m-%d %H:%M:%S} "
+            f"(assuming {self.docs_per_second:,} docs/s per worker)"
+        )
+
+    def _create_plan(self, domain_infos: list) -> list:
+        """Assign domains in order to the least loaded worker, as the pool does."""
+        workers = [{"workload": 0, "domains": []} for _ in range(self.jobs)]
+        heap = [(0, index) for index in range(self.jobs)]
+        for domain_info in domain_infos:
+            domain_id = domain_info["domain_id"]
+            workload, index = heapq.heappop(heap)
+            workers[index]["domains"].append(domain_id)
+            workers[index]["workload"] += self.workloads.get(domain_id, 0)
+            heapq.heappush(heap, (workers[index]["workload"], index))
+        return workers
+
+    def _get_mapped_collections(self, collections: list) -> list:
+        db_name_map = self.mongo_client.db_name_map
+        skipped = [
+            f"{db_name}.{col_name}"
+            for db_name, col_name in collections
+            if db_name not in db_name_map
+        ]
+        if skipped:
+            _LOGGER.info(
+                f"SKIP domain workload of {', '.join(skipped)} "
+                f"(database not in DB_NAME_MAP)"
+            )
+        return [
+            (db_name, col_name)
+            for db_name, col_name in collections
+            if db_name in db_name_map
+        ]
+
+    def _get_workloads(self) -> dict:
+        workloads = {}
+        for db_name, col_name in self.collections:
+            start = datetime.now()
+            pipeline = [{"$group": {"_id": "$domain_id", "count": {"$sum": 1}}}]
+            for item in self.mongo_client.aggregate(db_name, col_name, pipeline):
+                workloads[item["_id"]] = workloads.get(item["_id"], 0) + item["count"]
+
+            _LOGGER.debug(
+                f"domain workload counted ({db_name}.{col_name}, "
+                f"time = {datetime.now() - start})"
+            )
+        return workloads
@@ -0,0 +1,253 @@
+import json
+import logging
+import threading
+
+from rich.console import Console
+from rich.table import Table
+
+from conf import DEFAULT_LOGGER
+from lib.util import get_current_step
+
+_LOGGER = logging.getLogger(DEFAULT_LOGGER)
+
+__all__ = ["DryRunRecorder", "get_filter_shape"]
+
+NO_STEP = "(no step)"
+
+
+class DryRunRecorder(object):
+    """Record what every @print_log step would do without writing anything.
+
+    Reads are executed and counted, writes are counted by operation type and
+    never sent to the database. The first time a step uses a filter shape on a
+    collection, the filter is explained with "queryPlanner" verbosity, which
+    plans the query without running it, and the plan (COLLSCAN, IXSCAN, ...)
+    is kept. For a collection scan the examined documents are estimated from
+    the collection metadata. A filter which needs a secondary index of a
+    collection whose indexes a previous step dropped is reported as a
+    collection scan. Drops deferred by IndexDropPlanner are recorded in the
+    step which requested them.
+    """
+
+    def __init__(self):
+        self.steps = {}
+        self.dropped_indexes = set()
+        self._lock = threading.RLock()
+
+    def record_read(
+        self, op: str, db_name: str, col_name: str, collection=None, q_filter=None
+    ):
+        step = self._get_step()
+        with self._lock:
+            step["reads"][op] = step["reads"].get(op, 0) + 1
+            step["round_trips"] += 1
+
+        self._record_shape(step, db_name, col_name, collection, q_filter)
+
+    def record_write(
+        self,
+        op: str,
+        db_name: str,
+        col_name: str,
+        count: int = 1,
+        collection=None,
+        q_filter=None,
+        round_trips: int = 1,
+    ):
+        step = self._get_step()
+        with self._lock:
+            step["writes"][op] = step["writes"].get(op, 0) + count
+            step["round_trips"] += round_trips
+
+            if op in ["drop_indexes", "drop_collection"]:
+                self.dropped_indexes.add((db_name, col_name))
+
+        _LOGGER.debug(
+            f"[DRY-RUN] skip {op} ({db_name}.{col_name}, count={count}, q_filter={q_filter})"
+        )
+        self._record_shape(step, db_name, col_name, collection, q_filter)
+
+    def record_deferred_drop(self, db_name: str, col_name: str):
+        step = self._get_step()
+        with self._lock:
+            op = "drop_indexes (deferred)"
+            step["writes"][op] = step["writes"].get(op, 0) + 1
+            step.setdefault("deferred_drops", []).append(f"{db_name}.{col_name}")
+
+        _LOGGER.debug(f"[DRY-RUN] defer drop_indexes ({db_name}.{col_name})")
+
+    def report(self, report_path: str = None):
+        console = Console()
+        table = Table(title="DRY-RUN REPORT", show_lines=True)
+        table.add_column("Step")
+        table.add_column("Round Trips", justify="right")
+        table.add_column("Writes")
+        table.add_column("Filter Shape")
+        table.add_column("Plan")
+        table.add_column("Docs Examined", justify="right")
+
+        for step_name, step in self.steps.items():
+            write_ops = ", ".join(
+                f"{op}={count}" for op, count in step["writes"].items()
+            )
+
+            shapes = list(step["shapes"].values()) or [{}]
+            for index, shape in enumerate(shapes):
+                table.add_row(
+                    step_name if index == 0 else "",
+                    str(step["round_trips"]) if index == 0 else "",
+                    write_ops if index == 0 else "",
+                    f"{shape.get('db_name', '')}.{shape.get('col_name', '')} "
+                    f"{shape.get('shape', '')} x{shape.get('round_trips', 0)}"
+                    if shape
+                    else "",
+                    shape.get("plan", ""),
+                    _format_count(shape.get("docs_examined")),
+                )
+
+        console.print(table)
+
+        for step_name, step in self.steps.items():
+            if step.get("deferred_drops"):
+                console.print(
+                    f"Deferred index drops of {step_name}: "
+                    f"{', '.join(step['deferred_drops'])}"
+                )
+
+        if report_path:
+            with open(report_path, "w") as f:
+                json.dump(self.steps, f, indent=2, default=str)
+            console.print(f"Dry-run report saved. (path = {report_path})")
+
+    def _get_step(self) -> dict:
+        step_name = get_current_step() or NO_STEP
+        with self._lock:
+            if step_name not in self.steps:
+                self.steps[step_name] = {
+                    "round_trips": 0,
+                    "reads": {},
+                    "writes": {},
+                    "shapes": {},
+                }
+            return self.steps[step_name]
+
+    def _record_shape(
+        self, step: dict, db_name: str, col_name: str, collection, q_filter
+    ):
+        if q_filter is None:
+            return
+
+        shape = json.dumps(get_filter_shape(q_filter), sort_keys=True)
+        key = f"{db_name}.{col_name} {shape}"
+        with self._lock:
+            if key in step["shapes"]:
+                step["shapes"][key]["round_trips"] += 1
+                return
+
+            step["shapes"][key] = {
+                "db_name": db_name,
+                "col_name": col_name,
+                "shape": shape,
+                "fields": get_filter_fields(q_filter),
+                "round_trips": 1,
+            }
+
+        if collection is not None:
+            plan = self._explain(db_name, col_name, collection, q_filter)
+            with self._lock:
+                step["shapes"][key].update(plan)
+
+    def _explain(self, db_name: str, col_name: str, collection, q_filter) -> dict:
+        try:
+            explain = collection.database.command(
+                {
+                    "explain": {"find": collection.name, "filter": q_filter},
+                    "verbosity": "queryPlanner",
+                }
+            )
+        except Exception as e:
+            _LOGGER.debug(f"[DRY-RUN] explain failed ({db_name}.{col_name}): {e}")
+            return {"plan": "UNKNOWN"}
+
+        stages = []
+        index_names = []
+        _collect_stages(explain.get("queryPlanner", {}), stages, index_names)
+
+        plan = {
+            "plan": _get_plan_name(stages, index_names),
+            "index_names": index_names,
+            "docs_examined": None,
+        }
+        if plan["plan"] == "COLLSCAN":
+            plan["docs_examined"] = collection.estimated_document_count()
+
+        with self._lock:
+            indexes_dropped = (db_name, col_name) in self.dropped_indexes or (
+                db_name,
+                "*",
+            ) in self.dropped_indexes
+
+        uses_secondary_index = any(name != "_id_" for name in index_names)
+        if indexes_dropped and uses_secondary_index:
+            plan["plan"] = "COLLSCAN (indexes dropped)"
+            plan["docs_examined"] = collection.estimated_document_count()
+
+        return plan
+
+
+def get_filter_shape(q_filter):
+    """Replace every value of a filter with its type name."""
+    if isinstance(q_filter, dict):
+        return {key: get_filter_shape(value) for key, value in q_filter.items()}
+    if isinstance(q_filter, list):
+        if any(isinstance(value, dict) for value in q_filter):
+            return [get_filter_shape(value) for value in q_filter]
+        return "list"
+    return type(q_filter).__name__
+
+
+def get_filter_fields(q_filter) -> list:
+    """Return the document fields a filter compares, in order of appearance."""
+    fields = []
+    if isinstance(q_filter, dict):
+        for key, value in q_filter.items():
+            if key.startswith("$"):
+                for field in get_filter_fields(value):
+                    if field not in fields:
+                        fields.append(field)
+            elif key not in fields:
+                fields.append(key)
+    elif isinstance(q_filter, list):
+        for value in q_filter:
+            for field in get_filter_fields(value):
+                if field not in fields:
+                    fields.append(field)
+    return fields
+
+
+def _collect_stages(plan, stages: list, index_names: list):
+    if isinstance(plan, dict):
+        if stage := plan.get("stage"):
+            stages.append(stage)
+            if index_name := plan.get("indexName"):
+                index_names.append(index_name)
+        for key, value in plan.items():
+            if key != "rejectedPlans":
+                _collect_stages(value, stages, index_names)
+    elif isinstance(plan, list):
+        for value in plan:
+            _collect_stages(value, stages, index_names)
+
+
+def _get_plan_name(stages: list, index_names: list) -> str:
+    if "COLLSCAN" in stages:
+        return "COLLSCAN"
+    if "IDHACK" in stages or "EXPRESS_IDHACK" in stages:
+        return "IDHACK"
+    if index_names:
+        return f"IXSCAN ({', '.join(dict.fromkeys(index_names))})"
+    return stages[0] if stages else "UNKNOWN"
+
+
+def _format_count(count) -> str:
+    return "" if count is None else f"{count:,}"
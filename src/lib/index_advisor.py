@@ -0,0 +1,188 @@
+import contextlib
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from rich.console import Console
+from rich.table import Table
+
+from conf import DEFAULT_LOGGER, TEMP_INDEX_PREFIX
+
+_LOGGER = logging.getLogger(DEFAULT_LOGGER)
+
+__all__ = ["IndexAdvisor"]
+
+# fields of a temporary index, in order of appearance in the filter
+MAX_INDEX_FIELDS = 3
+
+
+class IndexAdvisor(object):
+    """Temporary indexes for the lookups of the steps, derived from a dry run.
+
+    The dry-run report keeps every filter shape of a step with its plan. A
+    shape which scans its collection (COLLSCAN) on more than one round trip
+    and examines at least `min_docs_examined` documents in total gets an
+    index on its fields, named with TEMP_INDEX_PREFIX. The index is created
+    when a step using it starts and is kept for later runs of the step (e.g.
+    the next domain), then dropped by finish(), which reports the build time
+    against the time of the steps and the full scans seen by the dry run.
+
+    An index is built outside the lock of the advisor, so that steps of other
+    domains using other indexes are not held up. Steps which need an index
+    whose build is in progress wait for it.
+    """
+
+    def __init__(self, mongo_client, advice: dict):
+        self.mongo_client = mongo_client
+        self.advice = advice
+        self.indexes = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_report(
+        cls, mongo_client, report_path: str, min_docs_examined: int = 0
+    ) -> "IndexAdvisor":
+        with open(report_path) as f:
+            steps = json.load(f)
+
+        advice = {}
+        for step_name, step in steps.items():
+            for shape in step.get("shapes", {}).values():
+                index = cls._create_index_advice(shape, min_docs_examined)
+                if index:
+                    advice.setdefault(step_name, []).append(index)
+
+        advisor = cls(mongo_client, advice)
+        advisor.print_advice()
+        return advisor
+
+    @contextlib.contextmanager
+    def supporting_indexes(self, step_name: str):
+        """Create the advised indexes of a step which do not exist yet."""
+        indexes = [
+            self._ensure_index(step_name, advice)
+            for advice in self.advice.get(step_name, [])
+        ]
+        start = datetime.now()
+        try:
+            yield
+        finally:
+            elapsed = datetime.now() - start
+            with self._lock:
+                for index in indexes:
+                    index["step_time"] += elapsed
+
+    def finish(self):
+        """Drop the temporary indexes and report their build time."""
+        for index in self.indexes.values():
+            self.mongo_client.drop_index(
+                index["db_name"], index["col_name"], index["name"]
+            )
+        if self.indexes:
+            self._print_report()
+
+    def print_advice(self):
+        table = Table(title="INDEX ADVICE")
+        table.add_column("Step")
+        table.add_column("Collection")
+        table.add_column("Keys")
+        table.add_column("Round Trips", justify="right")
+        table.add_column("Docs Examined", justify="right")
+
+        for step_name, indexes in self.advice.items():
+            for index in indexes:
+                table.add_row(
+                    step_name,
+                    f"{index['db_name']}.{index['col_name']}",
+                    ", ".join(field for field, _ in index["keys"]),
+                    str(index["round_trips"]),
+                    f"{index['docs_examined']:,}",
+                )
+
+        Console().print(table)
+
+    def _ensure_index(self, step_name: str, advice: dict) -> dict:
+        key = (advice["db_name"], advice["col_name"], advice["name"])
+        with self._lock:
+            index = self.indexes.get(key)
+            if index is None:
+                index = dict(advice, build_time=timedelta(), step_time=timedelta())
+                index["steps"] = {}
+                index["building"] = None
+                self.indexes[key] = index
+
+            index["steps"][step_name] = advice["round_trips"]
+            building = index["building"]
+            is_builder = building is None
+            if is_builder:
+                building = index["building"] = threading.Event()
+
+        if not is_builder:
+            # another step is building the index
+            building.wait()
+            return index
+
+        try:
+            if not self.mongo_client.has_index(*key):
+                start = datetime.now()
+                self.mongo_client.create_index(
+                    advice["db_name"],
+                    advice["col_name"],
+                    advice["keys"],
+                    name=advice["name"],
+                )
+                elapsed = datetime.now() - start
+                with self._lock:
+                    index["build_time"] += elapsed
+                _LOGGER.debug(f"temporary index created ({key}, time = {elapsed})")
+        finally:
+            with self._lock:
+                index["building"] = None
+            building.set()
+        return index
+
+    def _print_report(self):
+        table = Table(title="TEMPORARY INDEXES")
+        table.add_column("Index")
+        table.add_column("Build Time", justify="right")
+        table.add_column("Step Time", justify="right")
+        table.add_column("Dry-Run Full Scans", justify="right")
+
+        for index in self.indexes.values():
+            scans = sum(index["steps"].values())
+            table.add_row(
+                f"{index['db_name']}.{index['col_name']}.{index['name']}",
+                str(index["build_time"]),
+                str(index["step_time"]),
+                str(scans),
+            )
+            _LOGGER.debug(
+                f"temporary index: {index['name']} (build = {index['build_time']}, "
+                f"step = {index['step_time']}, dry-run full scans = {scans})"
+            )
+
+        Console().print(table)
+
+    @staticmethod
+    def _create_index_advice(shape: dict, min_docs_examined: int) -> [dict, None]:
+        if not str(shape.get("plan", "")).startswith("COLLSCAN"):
+            return None
+
+        round_trips = shape.get("round_trips", 0)
+        docs_examined = (shape.get("docs_examined") or 0) * round_trips
+        if round_trips < 2 or docs_examined < min_docs_examined:
+            return None
+
+        fields = shape.get("fields", [])[:MAX_INDEX_FIELDS]
+        if not fields or fields[0] == "_id":
+            return None
+
+        return {
+            "db_name": shape["db_name"],
+            "col_name": shape["col_name"],
+            "keys": [(field, 1) for field in fields],
+            "name": TEMP_INDEX_PREFIX + "_".join(fields).replace(".", "_"),
+            "round_trips": round_trips,
+            "docs_examined": docs_examined,
+        }
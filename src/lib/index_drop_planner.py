@@ -0,0 +1,75 @@
+import logging
+import threading
+
+from conf import DEFAULT_LOGGER
+
+_LOGGER = logging.getLogger(DEFAULT_LOGGER)
+
+__all__ = ["IndexDropPlanner"]
+
+
+class IndexDropPlanner(object):
+    """Collect the index drops requested by the steps of a version.
+
+    Modules drop the indexes of their database at the start of their main(),
+    which inside a domain loop happens before the lookups that need them and
+    once per domain. While a planner is attached to the client (see
+    MongoCustomClient.defer_index_drops), drop_indexes only records the
+    request, and flush() issues every requested drop once after the reads.
+
+    With a ledger the requests are also saved, so that drops requested by
+    steps which a resumed run skips, or by another runner, are not lost.
+    """
+
+    def __init__(self, ledger=None):
+        self.ledger = ledger
+        self._requests = {}
+        self._dropped = set()
+        self._lock = threading.Lock()
+
+    def request(self, db_name: str, col_name: str, comment=None):
+        key = (db_name, col_name)
+        with self._lock:
+            if key in self._requests or key in self._dropped:
+                return
+            self._requests[key] = comment
+
+        if self.ledger:
+            self.ledger.save_index_drop(db_name, col_name, comment)
+        _LOGGER.debug(f"index drop deferred ({db_name}.{col_name})")
+
+    def get_requests(self) -> list:
+        """Return the pending (db_name, col_name, comment) in request order."""
+        requests = {}
+        if self.ledger:
+            for index_drop in self.ledger.get_index_drops(dropped=False):
+                key = (index_drop["db_name"], index_drop["col_name"])
+                requests[key] = index_drop.get("comment")
+
+        with self._lock:
+            for key, comment in self._requests.items():
+                requests.setdefault(key, comment)
+            return [
+                (db_name, col_name, comment)
+                for (db_name, col_name), comment in requests.items()
+                if (db_name, col_name) not in self._dropped
+            ]
+
+    def flush(self, mongo_client, db_names: list = None) -> int:
+        """Drop the requested indexes (of db_names only, when given) once."""
+        count = 0
+        for db_name, col_name, comment in self.get_requests():
+            if db_names and db_name not in db_names:
+                continue
+
+            mongo_client.drop_indexes(db_name, col_name, comment, defer=False)
+            with self._lock:
+                self._requests.pop((db_name, col_name), None)
+                self._dropped.add((db_name, col_name))
+
+            if self.ledger:
+                self.ledger.save_index_drop(db_name, col_name, comment, dropped=True)
+            count += 1
+
+        _LOGGER.debug(f"deferred index drops issued (count = {count})")
+        return count
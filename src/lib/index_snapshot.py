@@ -0,0 +1,193 @@
+import logging
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from pymongo import IndexModel
+from rich.console import Console
+from rich.table import Table
+
+from conf import DEFAULT_LOGGER, TEMP_INDEX_PREFIX
+
+_LOGGER = logging.getLogger(DEFAULT_LOGGER)
+
+__all__ = ["IndexSnapshot"]
+
+# index_information() fields which are not options of createIndexes
+_NOT_OPTIONS = ["key", "v", "ns", "background"]
+
+
+class IndexSnapshot(object):
+    """Index definitions captured before drop_indexes, rebuilt after the run.
+
+    Every collection is captured once, before its first drop. rebuild() sends
+    one createIndexes command per collection with all of its missing indexes,
+    on `jobs` threads, and prints the time of every build. Collections dropped
+    by the migration are skipped, and a failing build (e.g. a unique index
+    violated by migrated documents) is reported without stopping the others.
+
+    With a ledger the definitions are saved, so that indexes dropped by an
+    interrupted run are still rebuilt, and every runner of a shared migration
+    claims the collections it rebuilds. A claim is renewed when the build of
+    its collection starts, and a claim older than `claim_seconds` is taken
+    over by the next runner, so the collections of a crashed runner are
+    rebuilt too.
+    """
+
+    def __init__(self, ledger=None, jobs: int = 4, claim_seconds: int = 3600):
+        self.ledger = ledger
+        self.jobs = max(jobs, 1)
+        self.claim_seconds = claim_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._snapshots = {}
+        self._lock = threading.Lock()
+
+    def capture(self, collection, indexes: list):
+        """Keep the indexes (see MongoCustomClient.get_indexes) of a collection."""
+        # keys are kept as pairs since field names may contain dots
+        indexes = [
+            {
+                "name": index["name"],
+                "key": [[field, value] for field, value in index["key"].items()],
+                "options": index.get("options", {}),
+            }
+            for index in indexes
+            if index["name"] != "_id_"
+            and not index["name"].startswith(TEMP_INDEX_PREFIX)
+        ]
+        key = (collection.database.name, collection.name)
+        with self._lock:
+            if not indexes or key in self._snapshots:
+                return
+            self._snapshots[key] = {"collection": collection, "indexes": indexes}
+
+        if self._use_ledger():
+            self.ledger.save_index_snapshot(key[0], key[1], indexes)
+        _LOGGER.debug(
+            f"index snapshot captured ({key[0]}.{key[1]}, indexes = {len(indexes)})"
+        )
+
+    def rebuild(self) -> list:
+        snapshots = self._get_pending_snapshots()
+        if not snapshots:
+            return []
+
+        start = datetime.now()
+        with ThreadPoolExecutor(
+            max_workers=self.jobs, thread_name_prefix="index_rebuild"
+        ) as executor:
+            results = list(executor.map(self._rebuild_collection, snapshots))
+
+        self._print_report(results, datetime.now() - start)
+        return results
+
+    def _rebuild_collection(self, snapshot: dict) -> dict:
+        collection = snapshot["collection"]
+        result = {
+            "collection": f"{collection.database.name}.{collection.name}",
+            "indexes": [],
+            "elapsed": None,
+            "error": None,
+        }
+
+        if self._use_ledger() and not self.ledger.renew_index_snapshot_claim(
+            collection.database.name, collection.name, self.owner
+        ):
+            _LOGGER.warning(
+                f"SKIP index rebuild of {result['collection']}: "
+                f"claimed by another runner"
+            )
+            result["error"] = "SKIP (claimed by another runner)"
+            result["elapsed"] = timedelta()
+            return result
+
+        start = datetime.now()
+        try:
+            if collection.name not in collection.database.list_collection_names():
+                result["error"] = "SKIP (collection dropped)"
+            else:
+                existing = collection.index_information()
+                models = [
+                    self._create_index_model(index)
+                    for index in snapshot["indexes"]
+                    if index["name"] not in existing
+                ]
+                if models:
+                    result["indexes"] = collection.create_indexes(models)
+        except Exception as e:
+            _LOGGER.error(
+                f"index rebuild failed ({result['collection']}): {e}", exc_info=True
+            )
+            result["error"] = str(e)
+
+        result["elapsed"] = datetime.now() - start
+        if self._use_ledger():
+            self.ledger.mark_index_snapshot_rebuilt(
+                collection.database.name, collection.name, result["error"]
+            )
+        _LOGGER.debug(f"index rebuild: {result}")
+        return result
+
+    def _get_pending_snapshots(self) -> list:
+        if not self._use_ledger():
+            with self._lock:
+                snapshots = list(self._snapshots.values())
+                self._snapshots = {}
+            return snapshots
+
+        client = self.ledger.collection.database.client
+        return [
+            {
+                "collection": client[snapshot["db_name"]][snapshot["col_name"]],
+                "indexes": snapshot["indexes"],
+            }
+            for snapshot in self.ledger.claim_index_snapshots(
+                self.owner, self.claim_seconds
+            )
+        ]
+
+    def _use_ledger(self) -> bool:
+        return self.ledger is not None and not self.ledger.read_only
+
+    @staticmethod
+    def _create_index_model(index: dict) -> IndexModel:
+        options = {
+            option: value
+            for option, value in index.get("options", {}).items()
+            if option not in _NOT_OPTIONS
+        }
+        keys = []
+        for field, value in index["key"]:
+            # a text index is reported by its internal _fts/_ftsx keys
+            if field == "_fts":
+                keys.extend((text, "text") for text in options.get("weights", {}))
+            elif field != "_ftsx":
+                keys.append((field, value))
+
+        return IndexModel(keys, name=index["name"], **options)
+
+    @staticmethod
+    def _print_report(results: list, elapsed):
+        table = Table(title="INDEX REBUILD")
+        table.add_column("Collection")
+        table.add_column("Indexes", justify="right")
+        table.add_column("Time", justify="right")
+        table.add_column("Status")
+
+        for result in sorted(results, key=lambda item: item["elapsed"], reverse=True):
+            table.add_row(
+                result["collection"],
+                str(len(result["indexes"])),
+                str(result["elapsed"]),
+                result["error"] or "DONE",
+            )
+
+        console = Console()
+        console.print(table)
+        console.print(
+            f"Collections: {len(results)} / Build time: "
+            f"{sum((result['elapsed'] for result in results), timedelta())} "
+            f"/ Elapsed: {elapsed}"
+        )
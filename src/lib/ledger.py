@@ -0,0 +1,266 @@
+import contextlib
+import contextvars
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+
+from conf import DEFAULT_LOGGER
+from lib.util import get_current_step_key
+
+_LOGGER = logging.getLogger(DEFAULT_LOGGER)
+_LEDGER_SCOPE = contextvars.ContextVar("ledger_scope", default="")
+
+__all__ = ["MigrationLedger", "ledger_scope", "get_ledger_scope"]
+
+LEDGER_COLLECTION = "ledger"
+
+
+@contextlib.contextmanager
+def ledger_scope(scope: str):
+    """Record the steps run inside the block per scope (e.g. per domain_id).
+
+    with ledger_scope(domain_id):
+        identity.main(mongo_client, domain_id, workspace_mode)
+    """
+    token = _LEDGER_SCOPE.set(scope or "")
+    try:
+        yield
+    finally:
+        _LEDGER_SCOPE.reset(token)
+
+
+def get_ledger_scope() -> str:
+    return _LEDGER_SCOPE.get()
+
+
+class MigrationLedger(object):
+    """Persistent record of the finished steps and scan checkpoints of a version.
+
+    A step is recorded once it finished without an error and is skipped by
+    @print_log when the version is run again in the same scope. Keyset scans
+    of find_by_pagination save the last processed sort key, so a re-run of an
+    unfinished step continues the scan from there. Nothing is written in
+    read_only mode (dry-run).
+
+    {"_id": "v2.0.1/domain-xxx/identity_user_refactoring(domain-xxx)",
+     "type": "step", "version": "v2.0.1", "scope": "domain-xxx", ...}
+    """
+
+    def __init__(self, collection, version: str, read_only: bool = False):
+        self.collection = collection
+        self.version = version
+        self.read_only = read_only
+
+    def is_done(self, step: str) -> bool:
+        return (
+            self.collection.count_documents(
+                {"_id": self._create_step_id(step), "type": "step"}, limit=1
+            )
+            > 0
+        )
+
+    def has_done_steps(self) -> bool:
+        """Whether any step of the current scope has been finished before."""
+        return (
+            self.collection.count_documents(
+                {"version": self.version, "scope": get_ledger_scope(), "type": "step"},
+                limit=1,
+            )
+            > 0
+        )
+
+    def mark_done(self, step: str, elapsed=None):
+        if self.read_only:
+            return
+
+        self.collection.replace_one(
+            {"_id": self._create_step_id(step)},
+            {
+                "type": "step",
+                "version": self.version,
+                "scope": get_ledger_scope(),
+                "step": step,
+                "elapsed": str(elapsed) if elapsed is not None else None,
+                "finished_at": datetime.utcnow(),
+            },
+            upsert=True,
+        )
+        _LOGGER.debug(f"ledger: step done ({self._create_step_id(step)})")
+
+    def get_checkpoint(self, key: str) -> [dict, None]:
+        """Return the saved checkpoint of a scan of the current step."""
+        checkpoint_id = self._create_checkpoint_id(key)
+        if checkpoint_id is None:
+            return None
+
+        checkpoint = self.collection.find_one(
+            {"_id": checkpoint_id, "type": "checkpoint"}
+        )
+        if checkpoint:
+            # keys are stored as pairs since the sort key may contain dots
+            checkpoint["last_item"] = dict(checkpoint["last_item"])
+        return checkpoint
+
+    def save_checkpoint(
+        self, key: str, last_item: dict, count: int, complete: bool = False
+    ):
+        checkpoint_id = self._create_checkpoint_id(key)
+        if self.read_only or checkpoint_id is None:
+            return
+
+        self.collection.replace_one(
+            {"_id": checkpoint_id},
+            {
+                "type": "checkpoint",
+                "version": self.version,
+                "scope": get_ledger_scope(),
+                "step": get_current_step_key(),
+                "key": key,
+                "last_item": [[field, value] for field, value in last_item.items()],
+                "count": count,
+                "complete": complete,
+                "updated_at": datetime.utcnow(),
+            },
+            upsert=True,
+        )
+
+    def save_index_drop(
+        self, db_name: str, col_name: str, comment=None, dropped: bool = False
+    ):
+        """Save an index drop deferred by IndexDropPlanner, or mark it dropped."""
+        if self.read_only:
+            return
+
+        q_update = {
+            "$setOnInsert": {
+                "type": "index_drop",
+                "version": self.version,
+                "db_name": db_name,
+                "col_name": col_name,
+                "comment": comment,
+                "requested_at": datetime.utcnow(),
+            }
+        }
+        if dropped:
+            q_update["$set"] = {"dropped": True, "dropped_at": datetime.utcnow()}
+        else:
+            q_update["$setOnInsert"]["dropped"] = False
+
+        self.collection.update_one(
+            {"_id": f"{self.version}/index_drop/{db_name}.{col_name}"},
+            q_update,
+            upsert=True,
+        )
+
+    def get_index_drops(self, dropped: bool = None) -> list:
+        q_filter = {"version": self.version, "type": "index_drop"}
+        if dropped is not None:
+            q_filter["dropped"] = dropped
+        return list(self.collection.find(q_filter, sort=[("requested_at", 1)]))
+
+    def save_index_snapshot(self, db_name: str, col_name: str, indexes: list):
+        """Save the indexes of a collection before its first drop."""
+        if self.read_only:
+            return
+
+        self.collection.update_one(
+            {"_id": f"{self.version}/index_snapshot/{db_name}.{col_name}"},
+            {
+                "$setOnInsert": {
+                    "type": "index_snapshot",
+                    "version": self.version,
+                    "db_name": db_name,
+                    "col_name": col_name,
+                    "indexes": indexes,
+                    "owner": None,
+                    "rebuilt": False,
+                    "captured_at": datetime.utcnow(),
+                }
+            },
+            upsert=True,
+        )
+
+    def claim_index_snapshots(self, owner: str, claim_seconds: int) -> list:
+        """Claim every index snapshot which no runner is rebuilding yet.
+
+        A claim older than claim_seconds was left by a runner which died before
+        the rebuild finished, and is claimed again.
+        """
+        snapshots = []
+        while True:
+            now = datetime.utcnow()
+            expired = now - timedelta(seconds=claim_seconds)
+            snapshot = self.collection.find_one_and_update(
+                {
+                    "version": self.version,
+                    "type": "index_snapshot",
+                    "rebuilt": False,
+                    "$or": [
+                        {"owner": None},
+                        {"claimed_at": {"$lt": expired}},
+                    ],
+                },
+                {"$set": {"owner": owner, "claimed_at": now}},
+            )
+            if snapshot is None:
+                return snapshots
+            snapshots.append(snapshot)
+
+    def renew_index_snapshot_claim(
+        self, db_name: str, col_name: str, owner: str
+    ) -> bool:
+        """Renew the claim of owner, False when another runner took it over."""
+        result = self.collection.update_one(
+            {
+                "_id": f"{self.version}/index_snapshot/{db_name}.{col_name}",
+                "owner": owner,
+                "rebuilt": False,
+            },
+            {"$set": {"claimed_at": datetime.utcnow()}},
+        )
+        return result.matched_count > 0
+
+    def mark_index_snapshot_rebuilt(self, db_name: str, col_name: str, error=None):
+        if self.read_only:
+            return
+
+        self.collection.update_one(
+            {"_id": f"{self.version}/index_snapshot/{db_name}.{col_name}"},
+            {
+                "$set": {
+                    "rebuilt": True,
+                    "error": error,
+                    "rebuilt_at": datetime.utcnow(),
+                }
+            },
+        )
+
+    def reset(self):
+        """Forget every recorded step and checkpoint of the version."""
+        if self.read_only:
+            return
+
+        result = self.collection.delete_many({"version": self.version})
+        _LOGGER.debug(
+            f"ledger: reset (version = {self.version}, deleted = {result.deleted_count})"
+        )
+
+    @staticmethod
+    def create_scan_key(
+        db_name: str, col_name: str, q_filter: dict, sort_key: str
+    ) -> str:
+        q_filter = json.dumps(q_filter, sort_keys=True, default=str)
+        digest = hashlib.sha1(q_filter.encode("utf-8")).hexdigest()[:16]
+        return f"{db_name}.{col_name}/{sort_key}/{digest}"
+
+    def _create_step_id(self, step: str) -> str:
+        return f"{self.version}/{get_ledger_scope()}/{step}"
+
+    def _create_checkpoint_id(self, key: str) -> [str, None]:
+        # keyed by the arguments of the step too, so that two calls of the same
+        # step with other arguments do not share their checkpoints
+        step = get_current_step_key()
+        if step is None:
+            return None
+        return f"{self.version}/{get_ledger_scope()}/{step}/{key}"
@@ -0,0 +1,134 @@
+import atexit
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+from datetime import datetime
+
+__all__ = ["QueueRotatingFileHandler", "JsonFormatter"]
+
+
+class JsonFormatter(logging.Formatter):
+    """Format a record as one compact JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        asctime = self.formatTime(record, self.datefmt)
+        log = {
+            "time": f"{asctime}.{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "file_name": record.filename,
+            "line": record.lineno,
+            "message": record.getMessage(),
+        }
+
+        if op := getattr(record, "op", None):
+            log["op"] = op
+
+        if record.exc_info:
+            log["exc_info"] = self.formatException(record.exc_info)
+
+        return json.dumps(log, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+class QueueRotatingFileHandler(logging.handlers.QueueHandler):
+    """Hand records to a background thread which writes the log file.
+
+    The calling thread only formats the record and puts it on an unbounded
+    queue. The writer thread rotates the file every `maxBytes` and gzips the
+    rotated file into `backup_dir` (default: "backup" next to the log file),
+    keeping at most `backupCount` compressed files.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        mode: str = "w",
+        maxBytes: int = 0,
+        backupCount: int = 0,
+        backup_dir: str = None,
+        encoding: str = "utf-8",
+    ):
+        super().__init__(queue.Queue(-1))
+
+        self.file_handler = _GzipRotatingFileHandler(
+            filename,
+            mode=mode,
+            maxBytes=maxBytes,
+            backupCount=backupCount,
+            backup_dir=backup_dir,
+            encoding=encoding,
+        )
+        self.file_handler.setFormatter(logging.Formatter("%(message)s"))
+
+        self.listener = logging.handlers.QueueListener(
+            self.queue, self.file_handler, respect_handler_level=False
+        )
+        self.listener.start()
+        atexit.register(self.close)
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+            self.file_handler.close()
+        super().close()
+
+
+class _GzipRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    def __init__(
+        self,
+        filename: str,
+        mode: str = "w",
+        maxBytes: int = 0,
+        backupCount: int = 0,
+        backup_dir: str = None,
+        encoding: str = "utf-8",
+    ):
+        if mode == "w":
+            open(filename, "w", encoding=encoding).close()
+
+        super().__init__(
+            filename,
+            mode="a",
+            maxBytes=maxBytes,
+            backupCount=backupCount,
+            encoding=encoding,
+        )
+
+        self.backup_dir = backup_dir or os.path.join(
+            os.path.dirname(self.baseFilename), "backup"
+        )
+
+    def doRollover(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+
+        os.makedirs(self.backup_dir, exist_ok=True)
+
+        name, _ = os.path.splitext(os.path.basename(self.baseFilename))
+        today = datetime.today().strftime("%Y%m%d.%H%M%S.%f")
+        backup_path = os.path.join(self.backup_dir, f"{name}.{today}.log.gz")
+
+        with open(self.baseFilename, "rb") as source:
+            with gzip.open(backup_path, "wb") as target:
+                shutil.copyfileobj(source, target)
+        open(self.baseFilename, "w", encoding=self.encoding).close()
+
+        self._remove_old_backups(name)
+        self.stream = self._open()
+
+    def _remove_old_backups(self, name: str):
+        if self.backupCount <= 0:
+            return
+
+        backups = sorted(
+            backup
+            for backup in os.listdir(self.backup_dir)
+            if backup.startswith(f"{name}.") and backup.endswith(".log.gz")
+        )
+        for backup in backups[: -self.backupCount]:
+            os.remove(os.path.join(self.backup_dir, backup))
@@ -11,7 +11,7 @@ from datetime import datetime
 from conf.default_conf import *
 from lib.util import load_yaml_from_file, deep_merge
 
-__all__ = ["set_logger"]
+__all__ = ["set_logger", "get_log_file_path"]
 
 _LOGGER = {
     "version": 1,
@@ -22,16 +22,20 @@ _LOGGER = {
 }
 
 
-def set_logger(version: str, file_path: str = None):
-    _set_config(version, file_path)
+def set_logger(version: str, file_path: str = None, assume_yes: bool = False):
+    _set_config(version, file_path, assume_yes)
     logging.config.dictConfig(_LOGGER)
 
 
-def _set_config(version, file_path):
+def get_log_file_path() -> str:
+    return _LOGGER["handlers"]["file"].get("filename")
+
+
+def _set_config(version, file_path, assume_yes=False):
     global_log_conf = LOG
     external_log_dir_path = load_yaml_from_file(file_path).get("LOG_PATH", "")
 
-    _set_default_logger(DEFAULT_LOGGER, version, external_log_dir_path)
+    _set_default_logger(DEFAULT_LOGGER, version, external_log_dir_path, assume_yes)
 
     if "loggers" in global_log_conf:
         _set_loggers(global_log_conf["loggers"])
@@ -43,14 +47,16 @@ def _set_config(version, file_path):
         _set_formatters(global_log_conf["formatters"])
 
 
-def _set_default_logger(default_logger, version, external_log_dir_path):
+def _set_default_logger(
+    default_logger, version, external_log_dir_path, assume_yes=False
+):
     _LOGGER["loggers"] = {default_logger: LOGGER_DEFAULT_TMPL}
     _LOGGER["formatters"] = FORMATTER_DEFAULT_TMPL
 
-    _set_log_file_path(version, external_log_dir_path)
+    _set_log_file_path(version, external_log_dir_path, assume_yes)
 
 
-def _set_log_file_path(version, external_log_dir_path):
+def _set_log_file_path(version, external_log_dir_path, assume_yes=False):
     home = os.path.expanduser("~")
 
     file_path = f"{home}/{LOG_PATH}/{version}.log"
@@ -59,19 +65,21 @@ def _set_log_file_path(version, external_log_dir_path):
             os.mkdir(os.path.join(home, LOG_PATH))
             os.mkdir(os.path.join(home, LOG_PATH, "backup"))
     else:
-        file_path = _set_external_file_path(external_log_dir_path, version)
+        file_path = _set_external_file_path(
+            external_log_dir_path, version, assume_yes
+        )
 
     _LOGGER["handlers"]["file"]["filename"] = file_path
 
 
-def _set_external_file_path(external_file_path, version):
+def _set_external_file_path(external_file_path, version, assume_yes=False):
     file_path = f"{external_file_path}/{version}.log"
 
     if os.path.exists(file_path):
         logs = [log for log in os.listdir(external_file_path) if version in log]
         target_log = sorted(logs)[-1]
 
-        _check_duplicated_migration(external_file_path, target_log)
+        _check_duplicated_migration(external_file_path, target_log, assume_yes)
 
     if not os.path.isdir(external_file_path):
         os.mkdir(external_file_path)
@@ -125,11 +133,14 @@ def _set_formatters(formatters):
         _LOGGER["formatters"][_formatter] = _default
 
 
-def _check_duplicated_migration(external_file_path, file_path):
+def _check_duplicated_migration(external_file_path, file_path, assume_yes=False):
     while True:
-        answer = prompt(
-            f"Previous db-migration history exists. Would you like to migrate?({file_path}) (Y/N)? : "
-        )
+        if assume_yes:
+            answer = "Y"
+        else:
+            answer = prompt(
+                f"Previous db-migration history exists. Would you like to migrate?({file_path}) (Y/N)? : "
+            )
 
         if answer in ["Y", "y"]:
             today = datetime.today().strftime("%Y%m%d.%H%m%S")
@@ -0,0 +1,101 @@
+__all__ = ["MISSING", "create_map_updates"]
+
+
+class _Missing(object):
+    def __repr__(self):
+        return "MISSING"
+
+
+MISSING = _Missing()
+
+
+def create_map_updates(
+    q_filter: dict,
+    key: str,
+    field: str,
+    value_map: dict,
+    unset: list = None,
+    default=MISSING,
+    chunk_size: int = 5000,
+) -> list:
+    """Compile `field = value_map[doc[key]]` into a list of update_many calls.
+
+    The map is inverted so that every distinct value becomes one update with
+    a `{key: {"$in": [...]}}` filter, chunked to `chunk_size` keys to stay far
+    below the 16MB command limit. Documents whose key is not in the map get
+    `default` when it is given, with `$nin` filters chunked the same way (see
+    _create_default_filters). Returns a list of (q_filter, q_update).
+    """
+    keys_by_value = {}
+    for map_key, value in value_map.items():
+        keys_by_value.setdefault(_hashable(value), (value, []))[1].append(map_key)
+
+    updates = []
+    for value, keys in keys_by_value.values():
+        for index in range(0, len(keys), chunk_size):
+            chunk = keys[index : index + chunk_size]
+            updates.append(
+                (
+                    _and_filter(q_filter, {key: {"$in": chunk}}),
+                    _create_update(field, value, unset),
+                )
+            )
+
+    if default is not MISSING:
+        for key_filter in _create_default_filters(list(value_map.keys()), chunk_size):
+            updates.append(
+                (
+                    _and_filter(q_filter, {key: key_filter}),
+                    _create_update(field, default, unset),
+                )
+            )
+
+    return updates
+
+
+def _create_default_filters(keys: list, chunk_size: int) -> list:
+    """Split "not in keys" into filters of at most `chunk_size` keys each.
+
+    The sorted keys are cut into ranges, and every range excludes only its own
+    keys: [{$not: {$gte: k1}, $nin: [...]}, {$gte: k1, $not: {$gte: k2},
+    $nin: [...]}, ..., {$gte: kn, $nin: [...]}]. Range operators only match
+    values of the type of the bound, so the first range, which has no lower
+    bound, also takes the null, missing and other typed values. Raises
+    TypeError when the keys cannot be ordered.
+    """
+    if len(keys) <= chunk_size:
+        return [{"$nin": keys}]
+
+    keys = sorted(keys)
+    key_filters = []
+    for index in range(0, len(keys), chunk_size):
+        chunk = keys[index : index + chunk_size]
+        key_filter = {}
+        if index > 0:
+            key_filter["$gte"] = chunk[0]
+        if index + chunk_size < len(keys):
+            key_filter["$not"] = {"$gte": keys[index + chunk_size]}
+        key_filter["$nin"] = chunk
+        key_filters.append(key_filter)
+    return key_filters
+
+
+def _create_update(field: str, value, unset: list = None) -> dict:
+    q_update = {"$set": {field: value}}
+    if unset:
+        q_update["$unset"] = {unset_field: 1 for unset_field in unset}
+    return q_update
+
+
+def _and_filter(q_filter: dict, key_filter: dict) -> dict:
+    if not q_filter:
+        return key_filter
+    return {"$and": [q_filter, key_filter]}
+
+
+def _hashable(value):
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return repr(value)
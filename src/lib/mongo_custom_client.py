@@ -1,28 +1,101 @@
+import os
 import sys
+import copy
 import click
+import contextlib
+import functools
 import logging
+import threading
 import yaml
 from prompt_toolkit import prompt
 from rich.console import Console
 from rich.syntax import Syntax
 
 import pymongo.collection
+import pymongo.errors
 
 from conf import *
+from lib.bulk_writer import BulkWriter
+from lib.ddl_executor import DDLExecutor
+from lib.dry_run import DryRunRecorder
+from lib.index_advisor import IndexAdvisor
+from lib.index_drop_planner import IndexDropPlanner
+from lib.index_snapshot import IndexSnapshot
+from lib.ledger import LEDGER_COLLECTION, MigrationLedger
+from lib.logger import get_log_file_path
+from lib.map_update import MISSING, create_map_updates
+from lib.op_logger import OperationLogger
+from lib.parallel_scanner import ParallelScanner
 from lib.util import load_yaml_from_file, print_stage, print_finish_stage
-from pymongo import MongoClient
+from lib.work_queue import WORK_QUEUE_COLLECTION, WorkQueue
+from pymongo import MongoClient, UpdateOne
 
 _LOGGER = logging.getLogger(DEFAULT_LOGGER)
 
 
 class MongoCustomClient(object):
+    # runtime options given by the command line (migrate.py)
+    options = {}
+    # shared by every client of the process when options["dry_run"] is set
+    _dry_run_recorder = None
+    # index definitions captured before drop_indexes, rebuilt by rebuild_indexes
+    _index_snapshot = None
+    # temporary indexes of migrate.py --index-advice
+    _index_advisor = None
+
     def __init__(self, file_path: str = None, version: str = None):
         self.conn = None
+        self.version = version
+        self._init_catalog()
         if file_path:
             self.file_conf = load_yaml_from_file(file_path)
             self.batch_size = self.file_conf.get("BATCH_SIZE", BATCH_SIZE)
+            self.bulk_write_max_bytes = self.file_conf.get(
+                "BULK_WRITE_MAX_BYTES", BULK_WRITE_MAX_BYTES
+            )
             self.page_size = self.file_conf.get("PAGE_SIZE", PAGE_SIZE)
+            self.pagination_mode = self.file_conf.get(
+                "PAGINATION_MODE", PAGINATION_MODE
+            )
             self.db_name_map = self.file_conf.get("DB_NAME_MAP", DB_NAME_MAP)
+            self.ledger_enabled = self.options.get("ledger") or self.file_conf.get(
+                "LEDGER", LEDGER
+            )
+            self.ledger_db = self.file_conf.get("LEDGER_DB", LEDGER_DB)
+            self.ledger_checkpoint_pages = self.file_conf.get(
+                "LEDGER_CHECKPOINT_PAGES", LEDGER_CHECKPOINT_PAGES
+            )
+            self.work_queue_lease_seconds = self.file_conf.get(
+                "WORK_QUEUE_LEASE_SECONDS", WORK_QUEUE_LEASE_SECONDS
+            )
+            self.work_queue_poll_seconds = self.file_conf.get(
+                "WORK_QUEUE_POLL_SECONDS", WORK_QUEUE_POLL_SECONDS
+            )
+            self.work_queue_max_attempts = self.file_conf.get(
+                "WORK_QUEUE_MAX_ATTEMPTS", WORK_QUEUE_MAX_ATTEMPTS
+            )
+            self.jobs = self.options.get("jobs") or self.file_conf.get("JOBS", JOBS)
+            self.domain_jobs = self.options.get("domain_jobs") or self.file_conf.get(
+                "DOMAIN_JOBS", DOMAIN_JOBS
+            )
+            self.domain_docs_per_second = self.file_conf.get(
+                "DOMAIN_DOCS_PER_SECOND", DOMAIN_DOCS_PER_SECOND
+            )
+            self.cross_domain_scan = self.options.get(
+                "cross_domain_scan"
+            ) or self.file_conf.get("CROSS_DOMAIN_SCAN", CROSS_DOMAIN_SCAN)
+            self.ddl_jobs = self.file_conf.get("DDL_JOBS", DDL_JOBS)
+            self.index_rebuild_jobs = self.file_conf.get(
+                "INDEX_REBUILD_JOBS", INDEX_REBUILD_JOBS
+            )
+            self.index_rebuild_claim_seconds = self.file_conf.get(
+                "INDEX_REBUILD_CLAIM_SECONDS", INDEX_REBUILD_CLAIM_SECONDS
+            )
+            self.op_logger = OperationLogger(
+                _LOGGER,
+                self.file_conf.get("LOG_SAMPLE_RATE", LOG_SAMPLE_RATE),
+                self.file_conf.get("LOG_PAYLOAD_MAX_LENGTH", LOG_PAYLOAD_MAX_LENGTH),
+            )
 
             print_stage("SET", "CONFIG")
             _LOGGER.debug(f"config from external yaml applied (file_path={file_path})")
@@ -31,39 +104,77 @@ class MongoCustomClient(object):
         else:
             self.file_conf = None
             self.batch_size = BATCH_SIZE
+            self.bulk_write_max_bytes = BULK_WRITE_MAX_BYTES
             self.page_size = PAGE_SIZE
+            self.pagination_mode = PAGINATION_MODE
             self.db_name_map = DB_NAME_MAP
+            self.ledger_enabled = self.options.get("ledger") or LEDGER
+            self.ledger_db = LEDGER_DB
+            self.ledger_checkpoint_pages = LEDGER_CHECKPOINT_PAGES
+            self.work_queue_lease_seconds = WORK_QUEUE_LEASE_SECONDS
+            self.work_queue_poll_seconds = WORK_QUEUE_POLL_SECONDS
+            self.work_queue_max_attempts = WORK_QUEUE_MAX_ATTEMPTS
+            self.jobs = self.options.get("jobs") or JOBS
+            self.domain_jobs = self.options.get("domain_jobs") or DOMAIN_JOBS
+            self.domain_docs_per_second = DOMAIN_DOCS_PER_SECOND
+            self.cross_domain_scan = (
+                self.options.get("cross_domain_scan") or CROSS_DOMAIN_SCAN
+            )
+            self.ddl_jobs = DDL_JOBS
+            self.index_rebuild_jobs = INDEX_REBUILD_JOBS
+            self.index_rebuild_claim_seconds = INDEX_REBUILD_CLAIM_SECONDS
+            self.op_logger = OperationLogger(
+                _LOGGER, LOG_SAMPLE_RATE, LOG_PAYLOAD_MAX_LENGTH
+            )
             _LOGGER.debug("conf from default conf")
 
+        self.recorder = self._get_dry_run_recorder()
+        self.ledger = None
+        self.index_drop_planner = None
+
         if self._ask_valid_config(version):
             self._create_connection_pool()
+            self.ledger = self._create_ledger(version)
+
+        self.index_snapshot = self._get_index_snapshot()
+        self.index_advisor = self._get_index_advisor()
 
     def insert_one(
         self, db_name: str, col_name: str, q_create: dict, is_new: bool = False
     ):
-        _LOGGER.debug(
-            f"insert_one:\n\t"
-            f"- db_name: {db_name}\n\t"
-            f"- col_name: {col_name}\n\t"
-            f"- q_create: {q_create}"
-            f"- is_new: {is_new}"
+        self._log_op(
+            "insert_one",
+            db_name=db_name,
+            col_name=col_name,
+            q_create=q_create,
+            is_new=is_new,
         )
 
         collection = self._get_collection(db_name, col_name, is_new)
         if isinstance(collection, pymongo.collection.Collection):
+            if self._skip_write("insert_one", db_name, col_name):
+                return
+
             collection.insert_one(q_create)
+            if is_new:
+                self._add_catalog_collection(db_name, col_name)
 
     def insert_many(self, db_name: str, col_name: str, records, is_new):
-        _LOGGER.debug(
-            f"insert_many:\n\t"
-            f"- db_name: {db_name}\n\t"
-            f"- col_name: {col_name}\n\t"
-            f"- is_new: {is_new}"
+        self._log_op(
+            "insert_many",
+            db_name=db_name,
+            col_name=col_name,
+            is_new=is_new,
         )
 
         collection = self._get_collection(db_name, col_name, is_new)
         if isinstance(collection, pymongo.collection.Collection):
+            if self._skip_write("insert_many", db_name, col_name, count=len(records)):
+                return
+
             collection.insert_many(records)
+            if is_new:
+                self._add_catalog_collection(db_name, col_name)
 
     def update_many(
         self,
@@ -73,19 +184,139 @@ class MongoCustomClient(object):
         q_update: dict,
         upsert: bool = False,
     ):
-        _LOGGER.debug(
-            f"update_many:\n\t"
-            f"- db_name: {db_name}\n\t"
-            f"- col_name: {col_name}\n\t"
-            f"- q_filter: {q_filter}\n\t"
-            f"- q_update: {q_update}\n\t"
-            f"- upsert: {upsert}"
+        self._log_op(
+            "update_many",
+            db_name=db_name,
+            col_name=col_name,
+            q_filter=q_filter,
+            q_update=q_update,
+            upsert=upsert,
         )
 
         collection = self._get_collection(db_name, col_name)
         if isinstance(collection, pymongo.collection.Collection):
+            if self._skip_write("update_many", db_name, col_name, collection, q_filter):
+                return
+
             collection.update_many(q_filter, q_update, upsert)
 
+    def update_many_by_map(
+        self,
+        db_name: str,
+        col_name: str,
+        q_filter: dict,
+        key: str,
+        field: str,
+        value_map: dict,
+        unset: list = None,
+        default=MISSING,
+    ) -> bool:
+        """Set field to value_map[doc[key]] with server-side updates only.
+
+        Returns False without writing anything when the map is larger than
+        MAP_UPDATE_MAX_KEYS, so the caller can fall back to a per-document path.
+        """
+        self._log_op(
+            "update_many_by_map",
+            db_name=db_name,
+            col_name=col_name,
+            q_filter=q_filter,
+            key=key,
+            field=field,
+            map_size=len(value_map),
+            unset=unset,
+        )
+
+        if len(value_map) > MAP_UPDATE_MAX_KEYS:
+            _LOGGER.debug(
+                f"update_many_by_map fallback: map is too large. "
+                f"({len(value_map)} > {MAP_UPDATE_MAX_KEYS})"
+            )
+            return False
+
+        collection = self._get_collection(db_name, col_name)
+        if isinstance(collection, pymongo.collection.Collection):
+            try:
+                map_updates = create_map_updates(
+                    q_filter,
+                    key,
+                    field,
+                    value_map,
+                    unset=unset,
+                    default=default,
+                    chunk_size=MAP_UPDATE_CHUNK_SIZE,
+                )
+            except TypeError as e:
+                _LOGGER.debug(f"update_many_by_map fallback: {e}")
+                return False
+            if self._skip_write(
+                "update_many",
+                db_name,
+                col_name,
+                collection,
+                q_filter,
+                count=len(map_updates),
+                round_trips=len(map_updates),
+            ):
+                return True
+
+            for map_filter, map_update in map_updates:
+                collection.update_many(map_filter, map_update)
+        return True
+
+    def update_by_map_scan(
+        self,
+        db_name: str,
+        col_name: str,
+        q_filter: dict,
+        key: str,
+        field: str,
+        value_map: dict,
+    ) -> int:
+        """Set field to value_map[doc[key]] in a single scan.
+
+        Unlike update_many_by_map, which runs one update_many per distinct
+        value, the collection is read once and every document is updated by
+        _id. Use it when the map spans many domains. Documents whose key is
+        not in value_map are left unchanged. Returns the number of updated
+        documents.
+        """
+        self._log_op(
+            "update_by_map_scan",
+            db_name=db_name,
+            col_name=col_name,
+            q_filter=q_filter,
+            key=key,
+            field=field,
+            map_size=len(value_map),
+        )
+
+        count = 0
+        skipped = 0
+        with self.bulk_writer(db_name, col_name) as writer:
+            for items in self.find_by_pagination(
+                db_name, col_name, q_filter, {"_id": 1, key: 1}, show_progress=True
+            ):
+                for item in items:
+                    value = self._get_field_value(item, key)
+                    if value not in value_map:
+                        skipped += 1
+                        continue
+
+                    writer.append(
+                        UpdateOne(
+                            {"_id": item["_id"]}, {"$set": {field: value_map[value]}}
+                        )
+                    )
+                    count += 1
+
+        if skipped:
+            _LOGGER.debug(
+                f"update_by_map_scan: {skipped} documents without a map entry "
+                f"are left unchanged ({db_name}.{col_name}, key = {key})"
+            )
+        return count
+
     def update_one(
         self,
         db_name: str,
@@ -94,44 +325,51 @@ class MongoCustomClient(object):
         q_update: dict,
         upsert: bool = False,
     ):
-        _LOGGER.debug(
-            f"update_one:\n\t"
-            f"- db_name: {db_name}\n\t"
-            f"- col_name: {col_name}\n\t"
-            f"- q_filter: {q_filter}\n\t"
-            f"- q_update: {q_update}\n\t"
-            f"- upsert: {upsert}"
+        self._log_op(
+            "update_one",
+            db_name=db_name,
+            col_name=col_name,
+            q_filter=q_filter,
+            q_update=q_update,
+            upsert=upsert,
         )
 
         collection = self._get_collection(db_name, col_name)
         if isinstance(collection, pymongo.collection.Collection):
+            if self._skip_write("update_one", db_name, col_name, collection, q_filter):
+                return
+
             collection.update_one(q_filter, q_update, upsert)
 
     def delete_many(
         self, db_name: str, col_name: str, q_filter: dict, q_options: dict = None
     ):
-        _LOGGER.debug(
-            f"delete_many:\n\t"
-            f"- db_name: {db_name}\n\t"
-            f"- col_name: {col_name}\n\t"
-            f"- q_filter: {q_filter}\n\t"
-            f"- q_options: {q_options}"
+        self._log_op(
+            "delete_many",
+            db_name=db_name,
+            col_name=col_name,
+            q_filter=q_filter,
+            q_options=q_options,
         )
 
         collection = self._get_collection(db_name, col_name)
         if isinstance(collection, pymongo.collection.Collection):
+            if self._skip_write("delete_many", db_name, col_name, collection, q_filter):
+                return
+
             collection.delete_many(q_filter, q_options)
 
     def count(self, db_name: str, col_name: str, q_filter: dict):
-        _LOGGER.debug(
-            f"count:\n\t"
-            f"- db_name: {db_name}\n\t"
-            f"- col_name: {col_name}\n\t"
-            f"- q_filter: {q_filter}"
+        self._log_op(
+            "count",
+            db_name=db_name,
+            col_name=col_name,
+            q_filter=q_filter,
         )
 
         collection = self._get_collection(db_name, col_name)
         if isinstance(collection, pymongo.collection.Collection):
+            self._record_read("count", db_name, col_name, collection, q_filter)
             return collection.count_documents(q_filter)
         else:
             return 0
@@ -139,30 +377,32 @@ class MongoCustomClient(object):
     def find_one(
         self, db_name: str, col_name: str, q_filter: dict, projection: dict = {}
     ):
-        _LOGGER.debug(
-            f"find_one:\n\t"
-            f"- db_name: {db_name}\n\t"
-            f"- col_name: {col_name}\n\t"
-            f"- q_filter: {q_filter}\n\t"
-            f"- projection: {projection}"
+        self._log_op(
+            "find_one",
+            db_name=db_name,
+            col_name=col_name,
+            q_filter=q_filter,
+            projection=projection,
         )
         collection = self._get_collection(db_name, col_name)
         if isinstance(collection, pymongo.collection.Collection):
+            self._record_read("find_one", db_name, col_name, collection, q_filter)
             return collection.find_one(q_filter)
         # else:
         #     return None
 
     def find(self, db_name: str, col_name: str, q_filter: dict, projection: dict = {}):
-        _LOGGER.debug(
-            f"find:\n\t"
-            f"- db_name: {db_name}\n\t"
-            f"- col_name: {col_name}\n\t"
-            f"- q_filter: {q_filter}\n\t"
-            f"- projection: {projection}"
+        self._log_op(
+            "find",
+            db_name=db_name,
+            col_name=col_name,
+            q_filter=q_filter,
+            projection=projection,
         )
 
         collection = self._get_collection(db_name, col_name)
         if isinstance(collection, pymongo.collection.Collection):
+            self._record_read("find", db_name, col_name, collection, q_filter)
             return collection.find(q_filter, projection)
         else:
             return []
@@ -174,14 +414,25 @@ class MongoCustomClient(object):
         q_filter: dict,
         projection=None,
         show_progress=False,
+        sort_key="_id",
+        checkpoint=True,
     ):
-        _LOGGER.debug(
-            f"find_by_pagination:\n\t"
-            f"- db_name: {db_name}\n\t"
-            f"- col_name: {col_name}\n\t"
-            f"- q_filter: {q_filter}\n\t"
-            f"- projection: {projection}\n\t"
-            f"- show_progress: {show_progress}"
+        """Yield the filtered documents page by page.
+
+        In keyset mode with the ledger enabled, the last processed sort key is
+        saved every LEDGER_CHECKPOINT_PAGES pages (after flushing the bulk
+        writers of the thread), and a re-run of the same step continues from
+        there. Pass checkpoint=False for scans whose filter differs per run.
+        """
+        self._log_op(
+            "find_by_pagination",
+            db_name=db_name,
+            col_name=col_name,
+            q_filter=q_filter,
+            projection=projection,
+            show_progress=show_progress,
+            sort_key=sort_key,
+            pagination_mode=self.pagination_mode,
         )
 
         if projection is None:
@@ -194,70 +445,305 @@ class MongoCustomClient(object):
             return []
 
         if isinstance(collection, pymongo.collection.Collection):
-            page_num = 0
             current_count = 0
-            while True:
-                skip_size = page_num * self.page_size
-                cursor = (
-                    collection.find(q_filter, projection)
-                    .skip(skip_size)
-                    .limit(self.page_size)
+            scan_key = None
+            last_item = None
+            is_resumed = False
+            if checkpoint and self.ledger and self.pagination_mode != "skip":
+                scan_key = MigrationLedger.create_scan_key(
+                    db_name, col_name, q_filter, sort_key
+                )
+                if saved := self.ledger.get_checkpoint(scan_key):
+                    if saved["complete"]:
+                        _LOGGER.debug(f"SKIP / scan already finished ({scan_key})")
+                        return
+
+                    last_item = saved["last_item"]
+                    current_count = saved["count"]
+                    is_resumed = True
+                    _LOGGER.debug(
+                        f"resume scan from checkpoint ({scan_key}, count={current_count})"
+                    )
+
+            if self.pagination_mode == "skip":
+                pages = self._find_by_skip(collection, q_filter, projection)
+            else:
+                pages = self._find_by_keyset(
+                    collection, q_filter, projection, sort_key, last_item
                 )
 
-                items = list(cursor)
+            page_count = 0
+            for items, last_item in pages:
                 current_count += len(items)
-                if len(items) == 0:
-                    if total_count != current_count:
-                        _LOGGER.error(
-                            f"Loop failed for an unknown reason.\n\t"
-                            f"- total_count: {total_count}\n\t"
-                            f"- current_count: {current_count}\n\t"
-                            f"- skip_size: {skip_size}\n\t"
-                            f"- page_size: {self.page_size}\n\t"
-                            f"- q_filter: {q_filter}\n\t"
-                            f"- projection: {projection}"
-                        )
-                    break
+                page_count += 1
+                self._record_read("find_page", db_name, col_name, collection, q_filter)
 
                 if show_progress:
                     current_percent = round(current_count / total_count * 100, 2)
                     _LOGGER.debug(
-                        f"{db_name}.{col_name} Operated Count : {current_count}/{total_count} ({current_percent}%)"
+                        "%s.%s Operated Count : %s/%s (%s%%)",
+                        db_name,
+                        col_name,
+                        current_count,
+                        total_count,
+                        current_percent,
                     )
 
                 yield items
-                page_num += 1
+
+                if scan_key and page_count % self.ledger_checkpoint_pages == 0:
+                    BulkWriter.flush_open_writers()
+                    self.ledger.save_checkpoint(scan_key, last_item, current_count)
+
+            if scan_key:
+                BulkWriter.flush_open_writers()
+                self.ledger.save_checkpoint(
+                    scan_key, last_item, current_count, complete=True
+                )
+
+            if total_count != current_count and not is_resumed:
+                _LOGGER.error(
+                    f"Loop failed for an unknown reason.\n\t"
+                    f"- total_count: {total_count}\n\t"
+                    f"- current_count: {current_count}\n\t"
+                    f"- page_size: {self.page_size}\n\t"
+                    f"- q_filter: {q_filter}\n\t"
+                    f"- projection: {projection}"
+                )
+
+    def _find_by_skip(self, collection, q_filter: dict, projection: dict):
+        page_num = 0
+        while True:
+            skip_size = page_num * self.page_size
+            cursor = (
+                collection.find(q_filter, projection)
+                .skip(skip_size)
+                .limit(self.page_size)
+            )
+
+            items = list(cursor)
+            if len(items) == 0:
+                break
+
+            yield items, None
+            page_num += 1
+
+    def _find_by_keyset(
+        self,
+        collection,
+        q_filter: dict,
+        projection: dict,
+        sort_key: str,
+        last_item: dict = None,
+    ):
+        """Page through a collection by resuming from the last seen sort key.
+
+        Each page is an index range scan on (sort_key, _id) instead of a skip,
+        so a full pass is linear in the number of documents. Documents that
+        leave the filter while being migrated do not shift later pages.
+        Yields (items, last_item) where last_item holds the keys to resume from.
+        """
+        projection, strip_fields = self._create_keyset_projection(
+            projection, sort_key
+        )
+
+        if sort_key == "_id":
+            sort = [("_id", pymongo.ASCENDING)]
+        else:
+            sort = [(sort_key, pymongo.ASCENDING), ("_id", pymongo.ASCENDING)]
+
+        while True:
+            page_filter = self._create_keyset_filter(q_filter, sort_key, last_item)
+            cursor = (
+                collection.find(page_filter, projection or None)
+                .sort(sort)
+                .limit(self.page_size)
+            )
+
+            items = list(cursor)
+            if len(items) == 0:
+                break
+
+            last_item = {
+                "_id": items[-1]["_id"],
+                sort_key: self._get_field_value(items[-1], sort_key),
+            }
+            if strip_fields:
+                for item in items:
+                    for field in strip_fields:
+                        item.pop(field, None)
+
+            yield items, last_item
+
+            if len(items) < self.page_size:
+                break
+
+    @staticmethod
+    def _create_keyset_filter(q_filter: dict, sort_key: str, last_item: dict):
+        if last_item is None:
+            return q_filter
+
+        if sort_key == "_id":
+            range_filter = {"_id": {"$gt": last_item["_id"]}}
+        else:
+            last_value = MongoCustomClient._get_field_value(last_item, sort_key)
+            if last_value is None:
+                # null and missing values sort first, and {$gt: null} matches
+                # nothing, so the rest is every non-null value plus the nulls
+                # after the last _id
+                greater_filter = {sort_key: {"$ne": None}}
+            else:
+                greater_filter = {sort_key: {"$gt": last_value}}
+            range_filter = {
+                "$or": [
+                    greater_filter,
+                    {sort_key: last_value, "_id": {"$gt": last_item["_id"]}},
+                ]
+            }
+
+        if not q_filter:
+            return range_filter
+        return {"$and": [q_filter, range_filter]}
+
+    @staticmethod
+    def _create_keyset_projection(projection: dict, sort_key: str):
+        """Make sure the paging keys are returned and remember which to strip."""
+        projection = dict(projection)
+        strip_fields = []
+
+        is_inclusion = any(
+            value for field, value in projection.items() if field != "_id"
+        )
+        for field in dict.fromkeys(["_id", sort_key]):
+            if field in projection and not projection[field]:
+                del projection[field]
+                strip_fields.append(field)
+            elif field != "_id" and is_inclusion and field not in projection:
+                projection[field] = 1
+                strip_fields.append(field)
+
+        return projection, strip_fields
+
+    @staticmethod
+    def _get_field_value(item: dict, field: str):
+        if field in item:
+            return item[field]
+
+        value = item
+        for key in field.split("."):
+            if not isinstance(value, dict):
+                return None
+            value = value.get(key)
+        return value
+
+    def parallel_scan(
+        self,
+        db_name: str,
+        col_name: str,
+        q_filter: dict,
+        handler,
+        projection=None,
+        jobs: int = None,
+        partitions: int = None,
+        split_method: str = "sample",
+        ordered: bool = False,
+        show_progress=False,
+    ):
+        """Run handler(items) over _id ranges of a collection in parallel.
+
+        handler receives a page of documents and returns the write operations
+        for that page, which are sent through a BulkWriter of each worker.
+        """
+        scanner = ParallelScanner(
+            self,
+            db_name,
+            col_name,
+            q_filter,
+            projection=projection,
+            jobs=jobs or self.jobs,
+            partitions=partitions,
+            split_method=split_method,
+            ordered=ordered,
+            show_progress=show_progress,
+        )
+        return scanner.run(handler)
 
     def aggregate(self, db_name: str, col_name: str, pipeline: list):
-        _LOGGER.debug(
-            f"aggregate:\n\t"
-            f"- db_name: {db_name}\n\t"
-            f"- col_name: {col_name}\n\t"
-            f"- pipeline: {pipeline}"
+        self._log_op(
+            "aggregate",
+            db_name=db_name,
+            col_name=col_name,
+            pipeline=pipeline,
         )
 
         collection = self._get_collection(db_name, col_name)
         if isinstance(collection, pymongo.collection.Collection):
+            self._record_read(
+                "aggregate",
+                db_name,
+                col_name,
+                collection,
+                self._get_match_filter(pipeline),
+            )
             return collection.aggregate(pipeline)
         else:
             return []
 
-    def bulk_write(self, db_name: str, col_name: str, operations: list):
+    def bulk_write(
+        self, db_name: str, col_name: str, operations: list, ordered: bool = True
+    ):
         if len(operations) > 0:
-            collection = self._get_collection(db_name, col_name)
-            collection.bulk_write(operations)
+            with self.bulk_writer(
+                db_name, col_name, ordered=ordered, background=False
+            ) as writer:
+                writer.extend(operations)
+            return writer.result
+
+    def bulk_writer(
+        self,
+        db_name: str,
+        col_name: str,
+        ordered: bool = True,
+        max_bytes: int = None,
+        background: bool = True,
+    ) -> BulkWriter:
+        self._log_op(
+            "bulk_writer",
+            db_name=db_name,
+            col_name=col_name,
+            ordered=ordered,
+            batch_size=self.batch_size,
+        )
+
+        collection = self._get_collection(db_name, col_name)
+        record_write = None
+        if self.recorder is not None:
+            record_write = functools.partial(
+                self.recorder.record_write, "bulk_write", db_name, col_name
+            )
+
+        return BulkWriter(
+            collection,
+            self.batch_size,
+            max_bytes=max_bytes or self.bulk_write_max_bytes,
+            ordered=ordered,
+            background=background,
+            name=f"{db_name}.{col_name}",
+            record_write=record_write,
+        )
 
     def get_indexes(self, db_name: str, col_name: str, comment=None):
-        _LOGGER.debug(
-            f"get_indexes:\n\t"
-            f"- db_name: {db_name}\n\t"
-            f"- col_name: {col_name}\n\t"
-            f"- comment: {comment}"
+        self._log_op(
+            "get_indexes",
+            db_name=db_name,
+            col_name=col_name,
+            comment=comment,
         )
 
         results = []
         collection = self._get_collection(db_name, col_name)
         if isinstance(collection, pymongo.collection.Collection):
+            self._record_read("get_indexes", db_name, col_name, collection)
             indexes = collection.index_information(comment=comment)
 
             for raw_index in indexes:
@@ -267,44 +753,322 @@ class MongoCustomClient(object):
                     "name": raw_index,
                     "v": indexes[raw_index]["v"],
                     "key": self._create_index_key(items),
+                    "options": {
+                        option: value
+                        for option, value in indexes[raw_index].items()
+                        if option not in ["key", "v", "ns"]
+                    },
                 }
                 results.append(index)
         return results
 
-    def drop_indexes(self, db_name: str, col_name: str, comment=None):
-        _LOGGER.debug(
-            f"drop_indexes:\n\t"
-            f"- db_name: {db_name}\n\t"
-            f"- col_name: {col_name}\n\t"
-            f"- comment: {comment}"
+    def create_index(
+        self, db_name: str, col_name: str, keys: list, name: str = None, **options
+    ):
+        self._log_op(
+            "create_index",
+            db_name=db_name,
+            col_name=col_name,
+            keys=keys,
+            name=name,
+            **options,
         )
 
         collection = self._get_collection(db_name, col_name)
         if isinstance(collection, pymongo.collection.Collection):
+            if self._skip_write("create_index", db_name, col_name):
+                return
+
+            return collection.create_index(keys, name=name, **options)
+
+    def has_index(self, db_name: str, col_name: str, name: str) -> bool:
+        return any(
+            index["name"] == name for index in self.get_indexes(db_name, col_name)
+        )
+
+    def drop_index(self, db_name: str, col_name: str, name: str):
+        self._log_op("drop_index", db_name=db_name, col_name=col_name, name=name)
+
+        collection = self._get_collection(db_name, col_name)
+        if isinstance(collection, pymongo.collection.Collection):
+            if self._skip_write("drop_index", db_name, col_name):
+                return
+
+            try:
+                collection.drop_index(name)
+            except pymongo.errors.OperationFailure as e:
+                _LOGGER.debug(f"SKIP / index not found ({name}): {e}")
+
+    def drop_indexes(
+        self, db_name: str, col_name: str, comment=None, defer: bool = True
+    ):
+        """Drop the indexes of a collection, or of every collection with "*"."""
+        self._log_op(
+            "drop_indexes",
+            db_name=db_name,
+            col_name=col_name,
+            comment=comment,
+            defer=defer,
+        )
+
+        if defer and self.index_drop_planner is not None:
+            if self.recorder is not None:
+                self.recorder.record_deferred_drop(db_name, col_name)
+            self.index_drop_planner.request(db_name, col_name, comment)
+            return
+
+        if col_name == "*":
+            if self._skip_write("drop_indexes", db_name, col_name):
+                return
+
+            return DDLExecutor(self).run(
+                "drop_indexes",
+                db_name,
+                self.get_collection_names(db_name),
+                comment=comment,
+                defer=False,
+            )
+
+        collection = self._get_collection(db_name, col_name)
+        if isinstance(collection, pymongo.collection.Collection):
+            if self._skip_write("drop_indexes", db_name, col_name):
+                return
+
+            self.index_snapshot.capture(
+                collection, self.get_indexes(db_name, col_name, comment)
+            )
             return collection.drop_indexes(comment=comment)
 
     def drop_collection(self, db_name: str, col_name: str):
-        _LOGGER.debug(
-            f"drop_collection:\n\t"
-            f"- db_name: {db_name}\n\t"
-            f"- col_name: {col_name}"
+        self._log_op(
+            "drop_collection",
+            db_name=db_name,
+            col_name=col_name,
         )
         collection = self._get_collection(db_name, col_name)
         if isinstance(collection, pymongo.collection.Collection):
-            return collection.drop()
+            if self._skip_write("drop_collection", db_name, col_name):
+                return
+
+            result = collection.drop()
+            self._remove_catalog_collection(db_name, col_name)
+            return result
+
+    def drop_collections(self, db_name: str, col_names: list) -> list:
+        """Drop many collections of a database concurrently (see DDLExecutor)."""
+        self._log_op("drop_collections", db_name=db_name, col_names=col_names)
+        return DDLExecutor(self).run("drop_collection", db_name, col_names)
+
+    def coll_mod(self, db_name: str, col_name: str, **options):
+        """Run collMod on a collection, or on every collection with "*"."""
+        self._log_op("coll_mod", db_name=db_name, col_name=col_name, **options)
+
+        if col_name == "*":
+            return DDLExecutor(self).run(
+                "coll_mod", db_name, self.get_collection_names(db_name), **options
+            )
+
+        collection = self._get_collection(db_name, col_name)
+        if isinstance(collection, pymongo.collection.Collection):
+            if self._skip_write("coll_mod", db_name, col_name):
+                return
+
+            return collection.database.command("collMod", col_name, **options)
+
+    def get_collection_names(self, db_name: str) -> list:
+        """Return the collections of a mapped database, without system ones."""
+        real_db_name = self.db_name_map.get(db_name)
+        if real_db_name is None or not self._has_database(real_db_name):
+            return []
+
+        # a lookup of "*" loads the collection names into the catalog
+        self._has_collection(real_db_name, "*")
+        with self._catalog_lock:
+            col_names = self._collection_names.get(real_db_name, set())
+            return sorted(
+                col_name for col_name in col_names if not col_name.startswith("system.")
+            )
 
     def distinct(self, db_name: str, col_name: str, key: str):
-        _LOGGER.debug(
-            f"distinct:\n\t"
-            f"- db_name: {db_name}\n\t"
-            f"- col_name: {col_name}\n\t"
-            f"- key: {key}"
+        self._log_op(
+            "distinct",
+            db_name=db_name,
+            col_name=col_name,
+            key=key,
         )
         collection = self._get_collection(db_name, col_name)
         if isinstance(collection, pymongo.collection.Collection):
+            self._record_read("distinct", db_name, col_name, collection)
             return collection.distinct(key)
 
+    def _log_op(self, op: str, **fields):
+        # attribute the record to the caller of the client method (the step)
+        self.op_logger.log(op, stacklevel=3, **fields)
+
+    @classmethod
+    def _get_dry_run_recorder(cls) -> [DryRunRecorder, None]:
+        if not cls.options.get("dry_run"):
+            return None
+
+        if MongoCustomClient._dry_run_recorder is None:
+            MongoCustomClient._dry_run_recorder = DryRunRecorder()
+        return MongoCustomClient._dry_run_recorder
+
+    @classmethod
+    def finish_dry_run(cls):
+        """Print the dry-run report and save it next to the log file."""
+        recorder = MongoCustomClient._dry_run_recorder
+        if recorder is None:
+            return
+
+        report_path = None
+        if log_file_path := get_log_file_path():
+            report_path = f"{os.path.splitext(log_file_path)[0]}.dry_run.json"
+
+        print_stage("REPORT", "DRY-RUN")
+        recorder.report(report_path)
+        print_finish_stage()
+
+    def _get_index_snapshot(self) -> IndexSnapshot:
+        if MongoCustomClient._index_snapshot is None:
+            MongoCustomClient._index_snapshot = IndexSnapshot(
+                self.ledger, self.index_rebuild_jobs, self.index_rebuild_claim_seconds
+            )
+        return MongoCustomClient._index_snapshot
+
+    def _get_index_advisor(self) -> [IndexAdvisor, None]:
+        report_path = self.options.get("index_advice")
+        if not report_path or self.recorder is not None or self.conn is None:
+            return None
+
+        if MongoCustomClient._index_advisor is None:
+            min_docs_examined = INDEX_ADVICE_MIN_DOCS_EXAMINED
+            if self.file_conf:
+                min_docs_examined = self.file_conf.get(
+                    "INDEX_ADVICE_MIN_DOCS_EXAMINED", min_docs_examined
+                )
+            MongoCustomClient._index_advisor = IndexAdvisor.from_report(
+                self, report_path, min_docs_examined
+            )
+        return MongoCustomClient._index_advisor
+
+    @classmethod
+    def finish_index_advice(cls):
+        """Drop the temporary indexes of --index-advice and report them."""
+        advisor = MongoCustomClient._index_advisor
+        if advisor is None:
+            return
+
+        print_stage("REPORT", "TEMPORARY INDEXES")
+        advisor.finish()
+        print_finish_stage()
+
+    @classmethod
+    def rebuild_indexes(cls) -> list:
+        """Rebuild the indexes dropped by the run (see IndexSnapshot)."""
+        snapshot = MongoCustomClient._index_snapshot
+        if snapshot is None:
+            return []
+
+        print_stage("REBUILD", "INDEXES")
+        results = snapshot.rebuild()
+        print_finish_stage()
+        return results
+
+    @contextlib.contextmanager
+    def defer_index_drops(self, flush: bool = True):
+        """Defer drop_indexes calls of the block (see IndexDropPlanner).
+
+        The requested drops are issued once when the block finishes without an
+        error. With flush=False they are only saved in the ledger, for a later
+        block to issue them, unless there is no ledger to save them in.
+        """
+        if not flush and self.ledger is None:
+            yield None
+            return
+
+        planner = IndexDropPlanner(self.ledger)
+        self.index_drop_planner = planner
+        try:
+            yield planner
+        finally:
+            self.index_drop_planner = None
+
+        if flush:
+            planner.flush(self)
+
+    def create_work_queue(self) -> WorkQueue:
+        """Return the queue of work units of this version (see WorkQueue)."""
+        return WorkQueue(
+            self.conn[self.ledger_db or LEDGER_DB][WORK_QUEUE_COLLECTION],
+            self.version,
+            lease_seconds=self.work_queue_lease_seconds,
+            poll_seconds=self.work_queue_poll_seconds,
+            max_attempts=self.work_queue_max_attempts,
+        )
+
+    def _create_ledger(self, version: str) -> [MigrationLedger, None]:
+        if not (self.ledger_enabled and self.ledger_db):
+            return None
+
+        ledger = MigrationLedger(
+            self.conn[self.ledger_db][LEDGER_COLLECTION],
+            version,
+            read_only=self.recorder is not None,
+        )
+        if self.options.get("reset_ledger"):
+            ledger.reset()
+            self.options["reset_ledger"] = False
+        return ledger
+
+    def _skip_write(
+        self,
+        op: str,
+        db_name: str,
+        col_name: str,
+        collection=None,
+        q_filter=None,
+        count: int = 1,
+        round_trips: int = 1,
+    ) -> bool:
+        """Record the write instead of executing it in dry-run mode."""
+        if self.recorder is None:
+            return False
+
+        self.recorder.record_write(
+            op,
+            db_name,
+            col_name,
+            count,
+            collection=collection,
+            q_filter=q_filter,
+            round_trips=round_trips,
+        )
+        return True
+
+    def _record_read(
+        self, op: str, db_name: str, col_name: str, collection=None, q_filter=None
+    ):
+        if self.recorder is not None:
+            self.recorder.record_read(op, db_name, col_name, collection, q_filter)
+
+    @staticmethod
+    def _get_match_filter(pipeline: list):
+        if pipeline and "$match" in pipeline[0]:
+            return pipeline[0]["$match"]
+        return None
+
     def _create_connection_pool(self):
+        connection_uri = self._get_connection_uri()
+        connection_options = self._get_connection_options()
+
+        self.conn = MongoClient(connection_uri, **connection_options)
+        _LOGGER.debug(
+            f"Mongo DB connection successful (options = {connection_options})"
+        )
+        print_finish_stage()
+
+    def _get_connection_uri(self) -> str:
         if self.file_conf:
             connection_uri = self.file_conf.get("CONNECTION_URI")
         else:
@@ -313,9 +1077,18 @@ class MongoCustomClient(object):
         if connection_uri is None:
             raise ValueError(f"DB Connection URI is invalid. (uri = {connection_uri})")
 
-        self.conn = MongoClient(connection_uri, readPreference="primary")
-        _LOGGER.debug("Mongo DB connection successful")
-        print_finish_stage()
+        return connection_uri
+
+    def _get_connection_options(self) -> dict:
+        connection_options = copy.deepcopy(CONNECTION_OPTIONS)
+        if self.file_conf:
+            connection_options.update(self.file_conf.get("CONNECTION_OPTIONS") or {})
+
+        compressors = connection_options.get("compressors")
+        if isinstance(compressors, list):
+            connection_options["compressors"] = ",".join(compressors)
+
+        return connection_options
 
     def _get_collection(
         self, db: str, col_name: str, is_new: bool = False
@@ -326,22 +1099,75 @@ class MongoCustomClient(object):
             if db_name is None:
                 raise TypeError(f"Does not found {db} key in DB_NAME_MAP")
 
-            db_names = self.conn.list_database_names()
-            if db_name not in db_names:
+            if not self._has_database(db_name):
                 raise ValueError(f"Does not found database. (db = {db_name})")
 
             if not is_new:
-                col_names = self.conn[db_name].list_collection_names()
-                if col_name not in col_names:
+                if not self._has_collection(db_name, col_name):
                     raise ValueError(
                         f"Dose not found collection. (db = {db_name}, collection = {col_name})"
                     )
-            return self.conn[db_name][col_name]
+            return self._get_collection_handle(db_name, col_name)
 
         except Exception as e:
             _LOGGER.debug(f"SKIP / {e}")
             return None
 
+    def invalidate_catalog(self):
+        with self._catalog_lock:
+            self._database_names = None
+            self._collection_names = {}
+            self._collection_handles = {}
+
+    def _init_catalog(self):
+        self._catalog_lock = threading.RLock()
+        self.catalog_stats = {"hit": 0, "miss": 0}
+        self.invalidate_catalog()
+
+    def _has_database(self, db_name: str) -> bool:
+        with self._catalog_lock:
+            if self._database_names and db_name in self._database_names:
+                self.catalog_stats["hit"] += 1
+                return True
+
+            self.catalog_stats["miss"] += 1
+            self._database_names = set(self.conn.list_database_names())
+            return db_name in self._database_names
+
+    def _has_collection(self, db_name: str, col_name: str) -> bool:
+        with self._catalog_lock:
+            col_names = self._collection_names.get(db_name)
+            if col_names and col_name in col_names:
+                self.catalog_stats["hit"] += 1
+                return True
+
+            self.catalog_stats["miss"] += 1
+            col_names = set(self.conn[db_name].list_collection_names())
+            self._collection_names[db_name] = col_names
+            return col_name in col_names
+
+    def _get_collection_handle(
+        self, db_name: str, col_name: str
+    ) -> pymongo.collection.Collection:
+        with self._catalog_lock:
+            key = (db_name, col_name)
+            if key not in self._collection_handles:
+                self._collection_handles[key] = self.conn[db_name][col_name]
+            return self._collection_handles[key]
+
+    def _add_catalog_collection(self, db: str, col_name: str):
+        db_name = self.db_name_map.get(db)
+        with self._catalog_lock:
+            if db_name in self._collection_names:
+                self._collection_names[db_name].add(col_name)
+
+    def _remove_catalog_collection(self, db: str, col_name: str):
+        db_name = self.db_name_map.get(db)
+        with self._catalog_lock:
+            if db_name in self._collection_names:
+                self._collection_names[db_name].discard(col_name)
+            self._collection_handles.pop((db_name, col_name), None)
+
     @staticmethod
     def _create_index_key(items):
         key = {}
@@ -359,6 +1185,9 @@ class MongoCustomClient(object):
 
     @staticmethod
     def _ask_valid_config(version):
+        if MongoCustomClient.options.get("assume_yes"):
+            return True
+
         while True:
             answer = prompt(
                 f"The current migration version is {version}. Do you want to run with that config? (Y/N)?"
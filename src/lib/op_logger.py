@@ -0,0 +1,109 @@
+import hashlib
+import logging
+import random
+import reprlib
+
+import bson
+
+__all__ = ["OperationLogger"]
+
+PAYLOAD_FIELDS = ["q_filter", "q_update", "q_create", "projection", "pipeline"]
+
+
+class OperationLogger(object):
+    """Debug logging of client operations that costs nothing when filtered.
+
+    The message is only formatted when a handler emits the record, payloads
+    are cut to `max_payload_length` characters (with size and sha1 of the full
+    payload) and every operation type can be sampled with its own rate, e.g.
+    {"insert_one": 0.01, "update_one": 0.01, "*": 1.0}.
+    The raw values are attached to the record as `op` and `op_fields`, and
+    the record is attributed to the caller `stacklevel` frames above log().
+
+    The logger itself is usually at DEBUG, so the check is made against the
+    lowest level of the handlers which would receive the record.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        sample_rates: dict = None,
+        max_payload_length: int = 512,
+    ):
+        self.logger = logger
+        self.sample_rates = sample_rates or {}
+        self.max_payload_length = max_payload_length
+
+    def log(self, op: str, stacklevel: int = 1, **fields):
+        if not self.is_enabled():
+            return
+
+        sample_rate = self.sample_rates.get(op, self.sample_rates.get("*", 1.0))
+        if sample_rate < 1.0 and random.random() >= sample_rate:
+            return
+
+        self.logger.debug(
+            _OperationMessage(op, fields, self.max_payload_length),
+            extra={"op": op, "op_fields": fields},
+            stacklevel=stacklevel + 1,
+        )
+
+    def is_enabled(self) -> bool:
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return False
+        return self._get_handler_level() <= logging.DEBUG
+
+    def _get_handler_level(self) -> int:
+        levels = []
+        logger = self.logger
+        while logger is not None:
+            levels.extend(handler.level for handler in logger.handlers)
+            if not logger.propagate:
+                break
+            logger = logger.parent
+
+        if not levels:
+            # records without a handler go to logging.lastResort
+            return logging.lastResort.level if logging.lastResort else logging.CRITICAL
+        return min(levels)
+
+
+class _OperationMessage(object):
+    def __init__(self, op: str, fields: dict, max_payload_length: int):
+        self.op = op
+        self.fields = fields
+        self.max_payload_length = max_payload_length
+
+    def __str__(self):
+        lines = [f"{self.op}:"]
+        for key, value in self.fields.items():
+            if key in PAYLOAD_FIELDS:
+                value = self._format_payload(value)
+            lines.append(f"- {key}: {value}")
+        return "\n\t".join(lines)
+
+    def _format_payload(self, value) -> str:
+        limit = self.max_payload_length
+        if not limit:
+            return str(value)
+
+        short_repr = reprlib.Repr()
+        short_repr.maxstring = limit
+        short_repr.maxother = limit
+        short_repr.maxdict = short_repr.maxlist = 32
+        short_repr.maxlevel = 4
+
+        text = short_repr.repr(value)
+        if len(text) <= limit and "..." not in text:
+            return text
+
+        encoded = self._encode(value)
+        sha1 = hashlib.sha1(encoded).hexdigest()[:12]
+        return f"{text[:limit]}... (size={len(encoded)}, sha1={sha1})"
+
+    @staticmethod
+    def _encode(value) -> bytes:
+        try:
+            return bson.encode({"v": value})
+        except Exception:
+            return repr(value).encode("utf-8")
@@ -0,0 +1,200 @@
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import pymongo
+import pymongo.collection
+from bson.int64 import Int64
+
+from conf import DEFAULT_LOGGER
+
+_LOGGER = logging.getLogger(DEFAULT_LOGGER)
+
+__all__ = ["ParallelScanner"]
+
+SAMPLES_PER_PARTITION = 20
+
+
+class ParallelScanner(object):
+    """Scan a filtered collection as independent _id ranges on a thread pool.
+
+    Split points are taken either from a random sample of _id values
+    (split_method="sample") or from a $bucketAuto over the filtered _id values
+    (split_method="bucket_auto"). _id ranges only match values of the same
+    BSON type, so a collection whose filtered _ids are of mixed types is
+    scanned as a single range. Every range is paged with keyset pagination
+    by a worker which runs `handler(items)` and sends the returned write
+    operations through its own BulkWriter.
+    """
+
+    def __init__(
+        self,
+        mongo_client,
+        db_name: str,
+        col_name: str,
+        q_filter: dict,
+        projection: dict = None,
+        jobs: int = 1,
+        partitions: int = None,
+        split_method: str = "sample",
+        ordered: bool = False,
+        show_progress: bool = False,
+    ):
+        self.mongo_client = mongo_client
+        self.db_name = db_name
+        self.col_name = col_name
+        self.q_filter = q_filter
+        self.projection = projection
+        self.jobs = max(jobs, 1)
+        self.partitions = partitions or (self.jobs * 4 if self.jobs > 1 else 1)
+        self.split_method = split_method
+        self.ordered = ordered
+        self.show_progress = show_progress
+
+    def run(self, handler) -> dict:
+        split_points = self._get_split_points()
+        ranges = list(zip([None] + split_points, split_points + [None]))
+
+        _LOGGER.debug(
+            f"parallel_scan:\n\t"
+            f"- db_name: {self.db_name}\n\t"
+            f"- col_name: {self.col_name}\n\t"
+            f"- jobs: {self.jobs}\n\t"
+            f"- ranges: {len(ranges)}"
+        )
+
+        result = {}
+        with ThreadPoolExecutor(
+            max_workers=self.jobs, thread_name_prefix="scanner"
+        ) as executor:
+            futures = [
+                executor.submit(
+                    contextvars.copy_context().run,
+                    self._scan_range,
+                    handler,
+                    lower,
+                    upper,
+                )
+                for lower, upper in ranges
+            ]
+            for future in futures:
+                for key, value in future.result().items():
+                    result[key] = result.get(key, 0) + value
+
+        _LOGGER.debug(
+            f"parallel_scan result ({self.db_name}.{self.col_name}): {result}"
+        )
+        return result
+
+    def _scan_range(self, handler, lower, upper) -> dict:
+        range_filter = self._create_range_filter(lower, upper)
+
+        with self.mongo_client.bulk_writer(
+            self.db_name, self.col_name, ordered=self.ordered
+        ) as writer:
+            for items in self.mongo_client.find_by_pagination(
+                self.db_name,
+                self.col_name,
+                range_filter,
+                self.projection,
+                show_progress=self.show_progress,
+                checkpoint=False,
+            ):
+                writer.extend(handler(items) or [])
+
+        return writer.result
+
+    def _create_range_filter(self, lower, upper) -> dict:
+        id_range = {}
+        if lower is not None:
+            id_range["$gte"] = lower
+        if upper is not None:
+            id_range["$lt"] = upper
+
+        if not id_range:
+            return self.q_filter
+        if not self.q_filter:
+            return {"_id": id_range}
+        return {"$and": [self.q_filter, {"_id": id_range}]}
+
+    def _get_split_points(self) -> list:
+        if self.partitions <= 1:
+            return []
+
+        collection = self.mongo_client._get_collection(self.db_name, self.col_name)
+        if not isinstance(collection, pymongo.collection.Collection):
+            return []
+
+        id_type = self._get_id_type(collection)
+        if id_type is None:
+            return []
+
+        if self.split_method == "bucket_auto":
+            pipeline = [
+                {"$match": self.q_filter},
+                {"$bucketAuto": {"groupBy": "$_id", "buckets": self.partitions}},
+            ]
+            buckets = list(collection.aggregate(pipeline, allowDiskUse=True))
+            return [bucket["_id"]["min"] for bucket in buckets[1:]]
+
+        sample_size = self.partitions * SAMPLES_PER_PARTITION
+        pipeline = [{"$sample": {"size": sample_size}}, {"$project": {"_id": 1}}]
+        if self.q_filter:
+            pipeline.insert(0, {"$match": self.q_filter})
+        samples = sorted(
+            set(
+                item["_id"]
+                for item in collection.aggregate(pipeline)
+                if self._get_type(item["_id"]) == id_type
+            )
+        )
+        if len(samples) < self.partitions:
+            return samples
+
+        step = len(samples) / self.partitions
+        return sorted(
+            set(samples[int(step * index)] for index in range(1, self.partitions))
+        )
+
+    def _get_id_type(self, collection):
+        """Return the type of the filtered _ids, or None when they are mixed.
+
+        Values are sorted by type first, so the lowest and the highest _id
+        have the same type only when every _id in between has it too.
+        """
+        ids = []
+        for direction in [pymongo.ASCENDING, pymongo.DESCENDING]:
+            items = list(
+                collection.find(self.q_filter, {"_id": 1})
+                .sort("_id", direction)
+                .limit(1)
+            )
+            if not items:
+                return None
+            ids.append(items[0]["_id"])
+
+        id_types = set(self._get_type(_id) for _id in ids)
+        if len(id_types) > 1:
+            _LOGGER.debug(
+                f"parallel_scan: mixed _id types, scanning a single range "
+                f"({self.db_name}.{self.col_name})"
+            )
+            return None
+
+        id_type = id_types.pop()
+        try:
+            sorted(ids)
+        except TypeError:
+            _LOGGER.debug(
+                f"parallel_scan: _id type {id_type.__name__} is not sortable, "
+                f"scanning a single range ({self.db_name}.{self.col_name})"
+            )
+            return None
+        return id_type
+
+    @staticmethod
+    def _get_type(value):
+        # numbers of every width compare with each other in MongoDB
+        if isinstance(value, (int, float, Int64)) and not isinstance(value, bool):
+            return float
+        return type(value)
@@ -0,0 +1,125 @@
+import contextvars
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from conf import DEFAULT_LOGGER
+
+_LOGGER = logging.getLogger(DEFAULT_LOGGER)
+
+__all__ = ["StepExecutor"]
+
+
+class StepExecutor(object):
+    """Run migration steps concurrently while keeping conflicting steps ordered.
+
+    Every step is registered with the (db_name, col_name) pairs it reads and
+    writes, "*" as col_name meaning every collection of the database. A step
+    waits for all earlier registered steps it conflicts with (one writes what
+    the other reads or writes); the others run on a pool of `jobs` threads.
+    A step registered without reads and writes conflicts with every step.
+
+    executor = StepExecutor(mongo_client)
+    executor.add(identity_user_tags_refactoring, writes=[("IDENTITY", "user")])
+    executor.add(identity_role_tags_refactoring, writes=[("IDENTITY", "role")])
+    executor.run()
+    """
+
+    def __init__(self, mongo_client, jobs: int = None):
+        self.mongo_client = mongo_client
+        self.jobs = max(jobs or getattr(mongo_client, "jobs", 1) or 1, 1)
+        self._steps = []
+
+    def add(self, step, reads=(), writes=(), args=(), kwargs=None):
+        """Register step(mongo_client, *args, **kwargs)."""
+        self._steps.append(
+            {
+                "name": getattr(step, "__name__", str(step)),
+                "func": step,
+                "reads": set(reads),
+                "writes": set(writes),
+                "args": args,
+                "kwargs": kwargs or {},
+            }
+        )
+        return step
+
+    def run(self):
+        if self.jobs <= 1 or len(self._steps) <= 1:
+            for step in self._steps:
+                self._run_step(step)
+            return
+
+        dependencies = self._build_dependencies()
+        dependents = {index: [] for index in range(len(self._steps))}
+        for index, depends_on in dependencies.items():
+            for dependency in depends_on:
+                dependents[dependency].append(index)
+
+        _LOGGER.debug(
+            f"step_executor:\n\t"
+            f"- jobs: {self.jobs}\n\t"
+            f"- steps: {len(self._steps)}\n\t"
+            f"- independent steps: "
+            f"{sum(1 for depends_on in dependencies.values() if not depends_on)}"
+        )
+
+        with ThreadPoolExecutor(
+            max_workers=self.jobs, thread_name_prefix="step"
+        ) as executor:
+            running = {}
+
+            def _submit_ready_steps():
+                ready = [index for index, deps in dependencies.items() if not deps]
+                for index in ready:
+                    del dependencies[index]
+                    future = executor.submit(
+                        contextvars.copy_context().run,
+                        self._run_step,
+                        self._steps[index],
+                    )
+                    running[future] = index
+
+            _submit_ready_steps()
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = running.pop(future)
+                    future.result()
+                    for dependent in dependents[index]:
+                        dependencies[dependent].discard(index)
+                _submit_ready_steps()
+
+    def _run_step(self, step: dict):
+        step["func"](self.mongo_client, *step["args"], **step["kwargs"])
+
+    def _build_dependencies(self) -> dict:
+        dependencies = {}
+        for index, step in enumerate(self._steps):
+            dependencies[index] = {
+                previous
+                for previous in range(index)
+                if self._is_conflicted(self._steps[previous], step)
+            }
+        return dependencies
+
+    @classmethod
+    def _is_conflicted(cls, step: dict, other: dict) -> bool:
+        if not (step["reads"] or step["writes"]):
+            return True
+        if not (other["reads"] or other["writes"]):
+            return True
+
+        return (
+            cls._is_overlapped(step["writes"], other["reads"] | other["writes"])
+            or cls._is_overlapped(other["writes"], step["reads"])
+        )
+
+    @staticmethod
+    def _is_overlapped(collections: set, others: set) -> bool:
+        for db_name, col_name in collections:
+            for other_db_name, other_col_name in others:
+                if db_name != other_db_name:
+                    continue
+                if col_name == other_col_name or "*" in [col_name, other_col_name]:
+                    return True
+        return False
@@ -1,7 +1,10 @@
 import logging
+import contextlib
 import yaml
 import re
 import functools
+import inspect
+import contextvars
 import click
 import shutil
 
@@ -9,6 +12,9 @@ from datetime import datetime
 from conf import DEFAULT_LOGGER
 
 _LOGGER = logging.getLogger(DEFAULT_LOGGER)
+_CURRENT_STEP = contextvars.ContextVar("current_step", default=None)
+_CURRENT_STEP_KEY = contextvars.ContextVar("current_step_key", default=None)
+_FAILED_STEPS = contextvars.ContextVar("failed_steps", default=None)
 
 TERMINAL_WIDTH = shutil.get_terminal_size(fallback=(120, 50)).columns
 YAML_LOADER = yaml.Loader
@@ -68,21 +74,106 @@ def print_finish_stage(action=None, name=None, total_time=None):
 
 
 def print_log(func):
+    if inspect.iscoroutinefunction(func):
+        return _print_async_log(func)
+
     @functools.wraps(func)
     def newFunc(*args, **kwargs):
+        ledger = getattr(args[0], "ledger", None) if args else None
+        advisor = getattr(args[0], "index_advisor", None) if args else None
+        step = _create_step_key(func, args)
+        if ledger is not None and ledger.is_done(step):
+            _LOGGER.warning(
+                f"SKIP {step}: finished by a previous run according to the ledger "
+                f"(version = {ledger.version}), run with --reset-ledger to run it again"
+            )
+            print_finish_stage("SKIP", func.__name__)
+            return
+
+        print_stage("EXECUTE", func.__name__)
+        start = datetime.now()
+        token = _CURRENT_STEP.set(func.__name__)
+        key_token = _CURRENT_STEP_KEY.set(step)
+        try:
+            with (
+                advisor.supporting_indexes(func.__name__)
+                if advisor is not None
+                else contextlib.nullcontext()
+            ):
+                func(*args, **kwargs)
+            end = datetime.now()
+            if ledger is not None:
+                ledger.mark_done(step, end - start)
+            print_finish_stage("DONE", func.__name__, end - start)
+        except Exception as e:
+            _LOGGER.error(e, exc_info=True)
+            print_finish_stage("ERROR", func.__name__)
+            _record_failed_step(step, e)
+        finally:
+            _CURRENT_STEP_KEY.reset(key_token)
+            _CURRENT_STEP.reset(token)
+
+    return newFunc
+
+
+def _print_async_log(func):
+    @functools.wraps(func)
+    async def newFunc(*args, **kwargs):
         print_stage("EXECUTE", func.__name__)
         start = datetime.now()
+        token = _CURRENT_STEP.set(func.__name__)
         try:
-            func(*args, **kwargs)
+            await func(*args, **kwargs)
             end = datetime.now()
             print_finish_stage("DONE", func.__name__, end - start)
         except Exception as e:
             _LOGGER.error(e, exc_info=True)
             print_finish_stage("ERROR", func.__name__)
+            _record_failed_step(func.__name__, e)
+        finally:
+            _CURRENT_STEP.reset(token)
 
     return newFunc
 
 
+def _create_step_key(func, args) -> str:
+    """Name a step with its scalar arguments, e.g. step_name(domain-xxx)."""
+    params = [str(arg) for arg in args[1:] if isinstance(arg, (str, int, float))]
+    return f"{func.__name__}({', '.join(params)})"
+
+
+@contextlib.contextmanager
+def collect_failed_steps():
+    """Collect the @print_log steps which fail in this context.
+
+    print_log logs the error of a step and goes on with the next one. Callers
+    which must not treat such a run as finished (e.g. a work unit) open this
+    scope and get a list of (step, error) to check once the run returns.
+    """
+    failed_steps = []
+    token = _FAILED_STEPS.set(failed_steps)
+    try:
+        yield failed_steps
+    finally:
+        _FAILED_STEPS.reset(token)
+
+
+def _record_failed_step(step: str, error: Exception):
+    failed_steps = _FAILED_STEPS.get()
+    if failed_steps is not None:
+        failed_steps.append((step, error))
+
+
+def get_current_step() -> str:
+    """Return the name of the @print_log step running in this context."""
+    return _CURRENT_STEP.get()
+
+
+def get_current_step_key() -> str:
+    """Return the name and scalar arguments of the running step (see ledger)."""
+    return _CURRENT_STEP_KEY.get()
+
+
 def deep_merge(from_dict: dict, into_dict: dict) -> dict:
     for key, value in from_dict.items():
         if isinstance(value, dict):
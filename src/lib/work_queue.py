@@ -0,0 +1,247 @@
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument, UpdateOne
+
+from conf import DEFAULT_LOGGER
+from lib.ledger import ledger_scope
+from lib.util import collect_failed_steps
+
+_LOGGER = logging.getLogger(DEFAULT_LOGGER)
+
+__all__ = ["WorkQueue"]
+
+WORK_QUEUE_COLLECTION = "work_queue"
+
+
+class WorkQueue(object):
+    """Work units of a version shared by runner processes on several hosts.
+
+    `migrate.py VERSION --enqueue` stores the units returned by the version's
+    create_work_units(mongo_client), a list of phases which each hold a list of
+    units ({"name": ..., "domain_id": ...}). `migrate.py VERSION --worker`
+    claims units with find_one_and_update and a lease which a heartbeat thread
+    renews while the unit runs. A unit whose lease expired (its runner died) is
+    claimed again by another runner. Units of a phase are only claimed once
+    every unit of the previous phases is done. A unit fails when it raises or
+    when one of its @print_log steps fails, and is retried up to `max_attempts`
+    times.
+
+    The lease is fenced by the owner and the attempt of the claim: the
+    heartbeat and the release of a unit only match the claim they were made
+    for, so a runner whose lease expired and was claimed by another runner
+    can't renew it or mark it done or failed.
+    """
+
+    def __init__(
+        self,
+        collection,
+        version: str,
+        lease_seconds: int = 300,
+        poll_seconds: int = 5,
+        max_attempts: int = 3,
+    ):
+        self.collection = collection
+        self.version = version
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+    def enqueue(self, phases: list) -> int:
+        """Store the units of every phase. Units already stored are kept."""
+        operations = []
+        for phase, units in enumerate(phases):
+            for unit in units:
+                unit_key = self._create_unit_key(unit)
+                operations.append(
+                    UpdateOne(
+                        {"_id": f"{self.version}/{phase}/{unit_key}"},
+                        {
+                            "$setOnInsert": {
+                                "version": self.version,
+                                "phase": phase,
+                                "unit": unit,
+                                "status": "pending",
+                                "owner": None,
+                                "lease_until": None,
+                                "attempts": 0,
+                                "created_at": datetime.utcnow(),
+                            }
+                        },
+                        upsert=True,
+                    )
+                )
+
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+        _LOGGER.debug(
+            f"work_queue: enqueued "
+            f"(version = {self.version}, units = {len(operations)})"
+        )
+        return len(operations)
+
+    def run_worker(self, mongo_client, run_unit) -> dict:
+        """Claim and run units with run_unit(mongo_client, unit) until all are done."""
+        result = {"done": 0, "failed": 0, "lost": 0}
+        while True:
+            phase = self._get_current_phase()
+            if phase is None:
+                break
+
+            work = self._claim(phase)
+            if work is None:
+                if self._has_failed_units(phase):
+                    _LOGGER.error(
+                        f"work_queue: phase {phase} has failed units. "
+                        f"(version = {self.version})"
+                    )
+                    break
+
+                time.sleep(self.poll_seconds)
+                continue
+
+            result[self._run(mongo_client, run_unit, work)] += 1
+
+        _LOGGER.debug(f"work_queue: worker finished ({self.worker_id}): {result}")
+        return result
+
+    def get_status(self) -> dict:
+        status = {}
+        pipeline = [
+            {"$match": {"version": self.version}},
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+        ]
+        for item in self.collection.aggregate(pipeline):
+            status[item["_id"]] = item["count"]
+        return status
+
+    def _run(self, mongo_client, run_unit, work: dict) -> str:
+        """Run a claimed unit and return "done", "failed" or "lost"."""
+        unit = work["unit"]
+        stop_heartbeat = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat,
+            args=(work, stop_heartbeat),
+            name="work_queue_heartbeat",
+            daemon=True,
+        )
+        heartbeat.start()
+
+        try:
+            with collect_failed_steps() as failed_steps:
+                with ledger_scope(unit.get("domain_id") or ""):
+                    run_unit(mongo_client, unit)
+            if failed_steps:
+                raise RuntimeError(
+                    f"{len(failed_steps)} step(s) failed: "
+                    + ", ".join(f"{step}: {error}" for step, error in failed_steps)
+                )
+        except Exception as e:
+            _LOGGER.error(
+                f"work_queue: unit failed ({work['_id']}): {e}", exc_info=True
+            )
+            status = "failed" if work["attempts"] >= self.max_attempts else "pending"
+            return "failed" if self._release(work, status, error=str(e)) else "lost"
+        finally:
+            stop_heartbeat.set()
+            heartbeat.join()
+
+        return "done" if self._release(work, "done") else "lost"
+
+    def _claim(self, phase: int) -> [dict, None]:
+        now = datetime.utcnow()
+        return self.collection.find_one_and_update(
+            {
+                "version": self.version,
+                "phase": phase,
+                "$or": [
+                    {"status": "pending"},
+                    {"status": "running", "lease_until": {"$lt": now}},
+                ],
+            },
+            {
+                "$set": {
+                    "status": "running",
+                    "owner": self.worker_id,
+                    "lease_until": now + timedelta(seconds=self.lease_seconds),
+                    "started_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def _heartbeat(self, work: dict, stop: threading.Event):
+        while not stop.wait(max(self.lease_seconds / 3, 1)):
+            result = self.collection.update_one(
+                self._create_lease_filter(work),
+                {
+                    "$set": {
+                        "lease_until": datetime.utcnow()
+                        + timedelta(seconds=self.lease_seconds)
+                    }
+                },
+            )
+            if result.matched_count == 0:
+                _LOGGER.warning(
+                    f"work_queue: lease lost ({work['_id']}, "
+                    f"attempt = {work['attempts']}), the unit may run twice"
+                )
+                return
+
+    def _release(self, work: dict, status: str, error: str = None) -> bool:
+        """Set the status of a unit if this runner still holds its claim."""
+        result = self.collection.update_one(
+            self._create_lease_filter(work),
+            {
+                "$set": {
+                    "status": status,
+                    "lease_until": None,
+                    "finished_at": datetime.utcnow(),
+                    "error": error,
+                }
+            },
+        )
+        if result.matched_count == 0:
+            _LOGGER.warning(
+                f"work_queue: lease lost ({work['_id']}, "
+                f"attempt = {work['attempts']}), {status} is not recorded"
+            )
+            return False
+        return True
+
+    def _create_lease_filter(self, work: dict) -> dict:
+        return {
+            "_id": work["_id"],
+            "status": "running",
+            "owner": self.worker_id,
+            "attempts": work["attempts"],
+        }
+
+    def _get_current_phase(self) -> [int, None]:
+        """Return the first phase which still has units that are not done."""
+        work = self.collection.find_one(
+            {"version": self.version, "status": {"$ne": "done"}},
+            {"phase": 1},
+            sort=[("phase", 1)],
+        )
+        return work["phase"] if work else None
+
+    def _has_failed_units(self, phase: int) -> bool:
+        return (
+            self.collection.count_documents(
+                {"version": self.version, "phase": phase, "status": "failed"},
+                limit=1,
+            )
+            > 0
+        )
+
+    @staticmethod
+    def _create_unit_key(unit: dict) -> str:
+        return "/".join(str(value) for value in unit.values())
@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
+import asyncio
 import click
+import inspect
 import logging
+import os
 
 from conf import DEFAULT_LOGGER
-from lib import set_logger
+from lib import set_logger, MongoCustomClient
 
 _LOGGER = logging.getLogger(DEFAULT_LOGGER)
 
@@ -11,12 +14,20 @@ _help = """
 Execute DB migration based on the {version}.py file located in the migration folder.\
  Users can manage version history for DB migration.\n
 Example usages:\n
-    migrate.py version [-f <config_yml_path>] [-d]\n
+    migrate.py version [-f <config_yml_path>] [-j <jobs>] [--domain-jobs <jobs>] [--cross-domain-scan] [--dry-run] [--index-advice <dry_run_json>] [--ledger] [--reset-ledger] [--rebuild-indexes] [-y]\n
+    migrate.py version -f <config_yml_path> --enqueue\n
+    migrate.py version -f <config_yml_path> --worker [-y]\n
 The contents included in config yml:\n
     - BATCH_SIZE (type: int)\n
         A number of rows to be sent as a batch to the database\n
+    - JOBS (type: int)\n
+        A number of worker threads used by parallel operations\n
+    - DOMAIN_JOBS (type: int)\n
+        A number of domains migrated concurrently (v2.0.1)\n
     - DB_NAME_MAP (type: dict)\n
         This is used because the database name is different depending on the environment.\n
+    - WORK_QUEUE_LEASE_SECONDS (type: int)\n
+        Lease of a work unit claimed by --worker, renewed while the unit runs\n
     - LOG_PATH\n
         default: ${HOME}/db_migration_log/{version}.log
 """
@@ -32,11 +43,162 @@ The contents included in config yml:\n
     help="Config file (YAML)",
     required=True,
 )
-def main(version, file_path=None):
-    set_logger(version, file_path)
+@click.option(
+    "-j",
+    "--jobs",
+    "jobs",
+    type=click.IntRange(min=1),
+    help="A number of worker threads used by parallel operations",
+)
+@click.option(
+    "--domain-jobs",
+    "domain_jobs",
+    type=click.IntRange(min=1),
+    help="A number of domains migrated concurrently",
+)
+@click.option(
+    "--cross-domain-scan",
+    "cross_domain_scan",
+    is_flag=True,
+    default=False,
+    help="Scan per-domain collections once for all domains (v2.0.1)",
+)
+@click.option(
+    "--dry-run",
+    "dry_run",
+    is_flag=True,
+    default=False,
+    help="Run reads and explain their filters, but only record writes",
+)
+@click.option(
+    "--index-advice",
+    "index_advice",
+    type=click.Path(exists=True),
+    help="Dry-run report (.dry_run.json) whose full scans get temporary indexes",
+)
+@click.option(
+    "--ledger",
+    "ledger",
+    is_flag=True,
+    default=False,
+    help="Skip the steps finished by a previous run and resume unfinished scans",
+)
+@click.option(
+    "--reset-ledger",
+    "reset_ledger",
+    is_flag=True,
+    default=False,
+    help="Forget finished steps and checkpoints of the version and run everything",
+)
+@click.option(
+    "--rebuild-indexes",
+    "rebuild_indexes",
+    is_flag=True,
+    default=False,
+    help="Rebuild the indexes dropped by the migration after the run",
+)
+@click.option(
+    "-y",
+    "--yes",
+    "assume_yes",
+    is_flag=True,
+    default=False,
+    help="Answer yes to every confirmation (non-interactive runners)",
+)
+@click.option(
+    "--enqueue",
+    "enqueue",
+    is_flag=True,
+    default=False,
+    help="Split the version into work units shared by --worker runners",
+)
+@click.option(
+    "--worker",
+    "worker",
+    is_flag=True,
+    default=False,
+    help="Claim and run work units of the version until all of them are done",
+)
+def main(
+    version,
+    file_path=None,
+    jobs=None,
+    domain_jobs=None,
+    cross_domain_scan=False,
+    dry_run=False,
+    index_advice=None,
+    ledger=False,
+    reset_ledger=False,
+    rebuild_indexes=False,
+    assume_yes=False,
+    enqueue=False,
+    worker=False,
+):
+    if dry_run and (enqueue or worker or index_advice):
+        raise click.UsageError(
+            "--dry-run can not be used with --enqueue, --worker or --index-advice"
+        )
+
+    log_name = f"{version}.worker-{os.getpid()}" if worker else version
+    set_logger(log_name, file_path, assume_yes or worker)
+    MongoCustomClient.options.update(
+        {
+            "jobs": jobs,
+            "domain_jobs": domain_jobs,
+            "cross_domain_scan": cross_domain_scan,
+            "dry_run": dry_run,
+            "index_advice": index_advice,
+            # the work units share their progress through the ledger
+            "ledger": ledger or reset_ledger or enqueue or worker,
+            "reset_ledger": reset_ledger,
+            "rebuild_indexes": rebuild_indexes,
+            "assume_yes": assume_yes or worker,
+        }
+    )
 
     module = _get_module(version)
-    getattr(module, "main")(file_path)
+    if enqueue or worker:
+        _run_work_queue(module, file_path, enqueue, worker, rebuild_indexes)
+    else:
+        _run_main(module, file_path, version)
+        MongoCustomClient.finish_index_advice()
+        if rebuild_indexes and not dry_run:
+            MongoCustomClient.rebuild_indexes()
+
+    if dry_run:
+        MongoCustomClient.finish_dry_run()
+
+
+def _run_main(module, file_path, version):
+    main_func = getattr(module, "main")
+    if inspect.iscoroutinefunction(main_func):
+        # AsyncMongoCustomClient does not prompt inside the event loop
+        MongoCustomClient._ask_valid_config(getattr(module, "VERSION", version))
+        asyncio.run(main_func(file_path))
+    else:
+        main_func(file_path)
+
+
+def _run_work_queue(module, file_path, enqueue, worker, rebuild_indexes=False):
+    for attr in ["VERSION", "create_work_units", "run_work_unit"]:
+        if not hasattr(module, attr):
+            raise click.UsageError(
+                f"{module.__name__} can not be split into work units. ({attr})"
+            )
+
+    mongo_client = MongoCustomClient(file_path, module.VERSION)
+    queue = mongo_client.create_work_queue()
+    if enqueue:
+        count = queue.enqueue(module.create_work_units(mongo_client))
+        click.echo(f"{count} work units are queued. (version = {module.VERSION})")
+
+    if worker:
+        queue.run_worker(mongo_client, module.run_work_unit)
+        MongoCustomClient.finish_index_advice()
+        status = queue.get_status()
+        click.echo(f"Work queue status: {status}")
+        if rebuild_indexes and set(status) == {"done"}:
+            MongoCustomClient.rebuild_indexes()
 
 
 def _change_version_name(version: str):
@@ -3,6 +3,7 @@ from pymongo import UpdateOne
 
 from conf import DEFAULT_LOGGER
 from lib import MongoCustomClient
+from lib.step_executor import StepExecutor
 from lib.util import print_log
 
 _LOGGER = logging.getLogger(DEFAULT_LOGGER)
@@ -13,144 +14,135 @@ _LOGGER = logging.getLogger(DEFAULT_LOGGER)
 def identity_project_group_tags_refactoring(mongo_client: MongoCustomClient):
     items = mongo_client.find("IDENTITY", "project_group", {}, {"tags": 1})
 
-    operations = []
-    for item in items:
-        if isinstance(item["tags"], list):
-            operations.append(
-                UpdateOne(
-                    {"_id": item["_id"]}, {"$set": {"tags": _change_tags(item["tags"])}}
+    with mongo_client.bulk_writer("IDENTITY", "project_group") as writer:
+        for item in items:
+            if isinstance(item["tags"], list):
+                writer.append(
+                    UpdateOne(
+                        {"_id": item["_id"]},
+                        {"$set": {"tags": _change_tags(item["tags"])}},
+                    )
                 )
-            )
-
-    mongo_client.bulk_write("IDENTITY", "project_group", operations)
 
 
 @print_log
 def identity_role_binding_tags_refactoring(mongo_client: MongoCustomClient):
     items = mongo_client.find("IDENTITY", "role_binding", {}, {"tags": 1})
 
-    operations = []
-    for item in items:
-        if isinstance(item["tags"], list):
-            operations.append(
-                UpdateOne(
-                    {"_id": item["_id"]}, {"$set": {"tags": _change_tags(item["tags"])}}
+    with mongo_client.bulk_writer("IDENTITY", "role_binding") as writer:
+        for item in items:
+            if isinstance(item["tags"], list):
+                writer.append(
+                    UpdateOne(
+                        {"_id": item["_id"]},
+                        {"$set": {"tags": _change_tags(item["tags"])}},
+                    )
                 )
-            )
-
-    mongo_client.bulk_write("IDENTITY", "role_binding", operations)
 
 
 @print_log
 def identity_project_tags_refactoring(mongo_client: MongoCustomClient):
     items = mongo_client.find("IDENTITY", "project", {}, {"tags": 1})
 
-    operations = []
-    for item in items:
-        if isinstance(item["tags"], list):
-            operations.append(
-                UpdateOne(
-                    {"_id": item["_id"]}, {"$set": {"tags": _change_tags(item["tags"])}}
+    with mongo_client.bulk_writer("IDENTITY", "project") as writer:
+        for item in items:
+            if isinstance(item["tags"], list):
+                writer.append(
+                    UpdateOne(
+                        {"_id": item["_id"]},
+                        {"$set": {"tags": _change_tags(item["tags"])}},
+                    )
                 )
-            )
-
-    mongo_client.bulk_write("IDENTITY", "project", operations)
 
 
 @print_log
 def identity_user_tags_refactoring(mongo_client: MongoCustomClient):
     items = mongo_client.find("IDENTITY", "user", {}, {"tags": 1})
 
-    operations = []
-    for item in items:
-        if isinstance(item["tags"], list):
-            operations.append(
-                UpdateOne(
-                    {"_id": item["_id"]}, {"$set": {"tags": _change_tags(item["tags"])}}
+    with mongo_client.bulk_writer("IDENTITY", "user") as writer:
+        for item in items:
+            if isinstance(item["tags"], list):
+                writer.append(
+                    UpdateOne(
+                        {"_id": item["_id"]},
+                        {"$set": {"tags": _change_tags(item["tags"])}},
+                    )
                 )
-            )
-
-    mongo_client.bulk_write("IDENTITY", "user", operations)
 
 
 @print_log
 def identity_service_account_tags_refactoring(mongo_client: MongoCustomClient):
     items = mongo_client.find("IDENTITY", "service_account", {}, {"tags": 1})
 
-    operations = []
-    for item in items:
-        if isinstance(item["tags"], list):
-            operations.append(
-                UpdateOne(
-                    {"_id": item["_id"]}, {"$set": {"tags": _change_tags(item["tags"])}}
+    with mongo_client.bulk_writer("IDENTITY", "service_account") as writer:
+        for item in items:
+            if isinstance(item["tags"], list):
+                writer.append(
+                    UpdateOne(
+                        {"_id": item["_id"]},
+                        {"$set": {"tags": _change_tags(item["tags"])}},
+                    )
                 )
-            )
-
-    mongo_client.bulk_write("IDENTITY", "service_account", operations)
 
 
 @print_log
 def identity_domain_tags_refactoring(mongo_client: MongoCustomClient):
     items = mongo_client.find("IDENTITY", "domain", {}, {"tags": 1})
 
-    operations = []
-    for item in items:
-        if isinstance(item["tags"], list):
-            operations.append(
-                UpdateOne(
-                    {"_id": item["_id"]}, {"$set": {"tags": _change_tags(item["tags"])}}
+    with mongo_client.bulk_writer("IDENTITY", "domain") as writer:
+        for item in items:
+            if isinstance(item["tags"], list):
+                writer.append(
+                    UpdateOne(
+                        {"_id": item["_id"]},
+                        {"$set": {"tags": _change_tags(item["tags"])}},
+                    )
                 )
-            )
-
-    mongo_client.bulk_write("IDENTITY", "domain", operations)
 
 
 @print_log
 def identity_role_tags_refactoring(mongo_client: MongoCustomClient):
     items = mongo_client.find("IDENTITY", "role", {}, {"tags": 1})
 
-    operations = []
-    for item in items:
-        if isinstance(item["tags"], list):
-            operations.append(
-                UpdateOne(
-                    {"_id": item["_id"]}, {"$set": {"tags": _change_tags(item["tags"])}}
+    with mongo_client.bulk_writer("IDENTITY", "role") as writer:
+        for item in items:
+            if isinstance(item["tags"], list):
+                writer.append(
+                    UpdateOne(
+                        {"_id": item["_id"]},
+                        {"$set": {"tags": _change_tags(item["tags"])}},
+                    )
                 )
-            )
-
-    mongo_client.bulk_write("IDENTITY", "role", operations)
 
 
 @print_log
 def identity_provider_tags_refactoring(mongo_client: MongoCustomClient):
     items = mongo_client.find("IDENTITY", "provider", {}, {"tags": 1})
 
-    operations = []
-    for item in items:
-        if isinstance(item["tags"], list):
-            operations.append(
-                UpdateOne(
-                    {"_id": item["_id"]}, {"$set": {"tags": _change_tags(item["tags"])}}
+    with mongo_client.bulk_writer("IDENTITY", "provider") as writer:
+        for item in items:
+            if isinstance(item["tags"], list):
+                writer.append(
+                    UpdateOne(
+                        {"_id": item["_id"]},
+                        {"$set": {"tags": _change_tags(item["tags"])}},
+                    )
                 )
-            )
-
-    mongo_client.bulk_write("IDENTITY", "provider", operations)
 
 
 @print_log
 def identity_policy_tags_refactoring(mongo_client: MongoCustomClient):
     items = mongo_client.find("IDENTITY", "policy", {}, {"tags": 1})
 
-    operations = []
-    for item in items:
-        if isinstance(item["tags"], list):
-            operations.append(
-                UpdateOne(
-                    {"_id": item["_id"]}, {"$set": {"tags": _change_tags(item["tags"])}}
+    with mongo_client.bulk_writer("IDENTITY", "policy") as writer:
+        for item in items:
+            if isinstance(item["tags"], list):
+                writer.append(
+                    UpdateOne(
+                        {"_id": item["_id"]},
+                        {"$set": {"tags": _change_tags(item["tags"])}},
+                    )
                 )
-            )
-
-    mongo_client.bulk_write("IDENTITY", "policy", operations)
 
 
 # monitoring service
@@ -158,16 +150,15 @@ def identity_policy_tags_refactoring(mongo_client: MongoCustomClient):
 def monitoring_data_source_tags_refactoring(mongo_client: MongoCustomClient):
     items = mongo_client.find("MONITORING", "data_source", {}, {"tags": 1})
 
-    operations = []
-    for item in items:
-        if isinstance(item["tags"], list):
-            operations.append(
-                UpdateOne(
-                    {"_id": item["_id"]}, {"$set": {"tags": _change_tags(item["tags"])}}
+    with mongo_client.bulk_writer("MONITORING", "data_source") as writer:
+        for item in items:
+            if isinstance(item["tags"], list):
+                writer.append(
+                    UpdateOne(
+                        {"_id": item["_id"]},
+                        {"$set": {"tags": _change_tags(item["tags"])}},
+                    )
                 )
-            )
-
-    mongo_client.bulk_write("MONITORING", "data_source", operations)
 
 
 # statistic service
@@ -175,16 +166,15 @@ def monitoring_data_source_tags_refactoring(mongo_client: MongoCustomClient):
 def statistics_schedule_tags_refactoring(mongo_client: MongoCustomClient):
     items = mongo_client.find("STATISTICS", "schedule", {}, {"tags": 1})
 
-    operations = []
-    for item in items:
-        if isinstance(item["tags"], list):
-            operations.append(
-                UpdateOne(
-                    {"_id": item["_id"]}, {"$set": {"tags": _change_tags(item["tags"])}}
+    with mongo_client.bulk_writer("STATISTICS", "schedule") as writer:
+        for item in items:
+            if isinstance(item["tags"], list):
+                writer.append(
+                    UpdateOne(
+                        {"_id": item["_id"]},
+                        {"$set": {"tags": _change_tags(item["tags"])}},
+                    )
                 )
-            )
-
-    mongo_client.bulk_write("STATISTICS", "schedule", operations)
 
 
 # secret service
@@ -192,32 +182,30 @@ def statistics_schedule_tags_refactoring(mongo_client: MongoCustomClient):
 def secret_secret_tags_refactoring(mongo_client: MongoCustomClient):
     items = mongo_client.find("SECRET", "secret", {}, {"tags": 1})
 
-    operations = []
-    for item in items:
-        if isinstance(item["tags"], list):
-            operations.append(
-                UpdateOne(
-                    {"_id": item["_id"]}, {"$set": {"tags": _change_tags(item["tags"])}}
+    with mongo_client.bulk_writer("SECRET", "secret") as writer:
+        for item in items:
+            if isinstance(item["tags"], list):
+                writer.append(
+                    UpdateOne(
+                        {"_id": item["_id"]},
+                        {"$set": {"tags": _change_tags(item["tags"])}},
+                    )
                 )
-            )
-
-    mongo_client.bulk_write("SECRET", "secret", operations)
 
 
 @print_log
 def secret_secret_group_tags_refactoring(mongo_client: MongoCustomClient):
     items = mongo_client.find("SECRET", "secret_group", {}, {"tags": 1})
 
-    operations = []
-    for item in items:
-        if isinstance(item["tags"], list):
-            operations.append(
-                UpdateOne(
-                    {"_id": item["_id"]}, {"$set": {"tags": _change_tags(item["tags"])}}
+    with mongo_client.bulk_writer("SECRET", "secret_group") as writer:
+        for item in items:
+            if isinstance(item["tags"], list):
+                writer.append(
+                    UpdateOne(
+                        {"_id": item["_id"]},
+                        {"$set": {"tags": _change_tags(item["tags"])}},
+                    )
                 )
-            )
-
-    mongo_client.bulk_write("SECRET", "secret_group", operations)
 
 
 # repository service
@@ -225,64 +213,60 @@ def secret_secret_group_tags_refactoring(mongo_client: MongoCustomClient):
 def repository_schema_tags_refactoring(mongo_client: MongoCustomClient):
     items = mongo_client.find("REPOSITORY", "schema", {}, {"tags": 1})
 
-    operations = []
-    for item in items:
-        if isinstance(item["tags"], list):
-            operations.append(
-                UpdateOne(
-                    {"_id": item["_id"]}, {"$set": {"tags": _change_tags(item["tags"])}}
+    with mongo_client.bulk_writer("REPOSITORY", "schema") as writer:
+        for item in items:
+            if isinstance(item["tags"], list):
+                writer.append(
+                    UpdateOne(
+                        {"_id": item["_id"]},
+                        {"$set": {"tags": _change_tags(item["tags"])}},
+                    )
                 )
-            )
-
-    mongo_client.bulk_write("REPOSITORY", "schema", operations)
 
 
 @print_log
 def repository_plugin_tags_refactoring(mongo_client: MongoCustomClient):
     items = mongo_client.find("REPOSITORY", "plugin", {}, {"tags": 1})
 
-    operations = []
-    for item in items:
-        if isinstance(item["tags"], list):
-            operations.append(
-                UpdateOne(
-                    {"_id": item["_id"]}, {"$set": {"tags": _change_tags(item["tags"])}}
+    with mongo_client.bulk_writer("REPOSITORY", "plugin") as writer:
+        for item in items:
+            if isinstance(item["tags"], list):
+                writer.append(
+                    UpdateOne(
+                        {"_id": item["_id"]},
+                        {"$set": {"tags": _change_tags(item["tags"])}},
+                    )
                 )
-            )
-
-    mongo_client.bulk_write("REPOSITORY", "plugin", operations)
 
 
 @print_log
 def repository_policy_tags_refactoring(mongo_client: MongoCustomClient):
     items = mongo_client.find("REPOSITORY", "policy", {}, {"tags": 1})
 
-    operations = []
-    for item in items:
-        if isinstance(item["tags"], list):
-            operations.append(
-                UpdateOne(
-                    {"_id": item["_id"]}, {"$set": {"tags": _change_tags(item["tags"])}}
+    with mongo_client.bulk_writer("REPOSITORY", "policy") as writer:
+        for item in items:
+            if isinstance(item["tags"], list):
+                writer.append(
+                    UpdateOne(
+                        {"_id": item["_id"]},
+                        {"$set": {"tags": _change_tags(item["tags"])}},
+                    )
                 )
-            )
-
-    mongo_client.bulk_write("REPOSITORY", "policy", operations)
 
 
 @print_log
 def plugin_supervisor_tags_refactoring(mongo_client: MongoCustomClient):
     items = mongo_client.find("PLUGIN", "supervisor", {}, {"tags": 1})
 
-    operations = []
-    for item in items:
-        if isinstance(item["tags"], list):
-            operations.append(
-                UpdateOne(
-                    {"_id": item["_id"]}, {"$set": {"tags": _change_tags(item["tags"])}}
+    with mongo_client.bulk_writer("PLUGIN", "supervisor") as writer:
+        for item in items:
+            if isinstance(item["tags"], list):
+                writer.append(
+                    UpdateOne(
+                        {"_id": item["_id"]},
+                        {"$set": {"tags": _change_tags(item["tags"])}},
+                    )
                 )
-            )
-
-    mongo_client.bulk_write("PLUGIN", "supervisor", operations)
 
 
 # config service
@@ -290,32 +274,30 @@ def plugin_supervisor_tags_refactoring(mongo_client: MongoCustomClient):
 def config_user_config_tags_refactoring(mongo_client: MongoCustomClient):
     items = mongo_client.find("CONFIG", "user_config", {}, {"tags": 1})
 
-    operations = []
-    for item in items:
-        if isinstance(item["tags"], list):
-            operations.append(
-                UpdateOne(
-                    {"_id": item["_id"]}, {"$set": {"tags": _change_tags(item["tags"])}}
+    with mongo_client.bulk_writer("CONFIG", "user_config") as writer:
+        for item in items:
+            if isinstance(item["tags"], list):
+                writer.append(
+                    UpdateOne(
+                        {"_id": item["_id"]},
+                        {"$set": {"tags": _change_tags(item["tags"])}},
+                    )
                 )
-            )
-
-    mongo_client.bulk_write("CONFIG", "user_config", operations)
 
 
 @print_log
 def config_domain_config_tags_refactoring(mongo_client: MongoCustomClient):
     items = mongo_client.find("CONFIG", "domain_config", {}, {"tags": 1})
 
-    operations = []
-    for item in items:
-        if isinstance(item["tags"], list):
-            operations.append(
-                UpdateOne(
-                    {"_id": item["_id"]}, {"$set": {"tags": _change_tags(item["tags"])}}
+    with mongo_client.bulk_writer("CONFIG", "domain_config") as writer:
+        for item in items:
+            if isinstance(item["tags"], list):
+                writer.append(
+                    UpdateOne(
+                        {"_id": item["_id"]},
+                        {"$set": {"tags": _change_tags(item["tags"])}},
+                    )
                 )
-            )
-
-    mongo_client.bulk_write("CONFIG", "domain_config", operations)
 
 
 # inventory service
@@ -323,64 +305,60 @@ def config_domain_config_tags_refactoring(mongo_client: MongoCustomClient):
 def inventory_resource_group_tags_refactoring(mongo_client: MongoCustomClient):
     items = mongo_client.find("INVENTORY", "resource_group", {}, {"tags": 1})
 
-    operations = []
-    for item in items:
-        if isinstance(item["tags"], list):
-            operations.append(
-                UpdateOne(
-                    {"_id": item["_id"]}, {"$set": {"tags": _change_tags(item["tags"])}}
+    with mongo_client.bulk_writer("INVENTORY", "resource_group") as writer:
+        for item in items:
+            if isinstance(item["tags"], list):
+                writer.append(
+                    UpdateOne(
+                        {"_id": item["_id"]},
+                        {"$set": {"tags": _change_tags(item["tags"])}},
+                    )
                 )
-            )
-
-    mongo_client.bulk_write("INVENTORY", "resource_group", operations)
 
 
 @print_log
 def inventory_region_tags_refactoring(mongo_client: MongoCustomClient):
     items = mongo_client.find("INVENTORY", "region", {}, {"tags": 1})
 
-    operations = []
-    for item in items:
-        if isinstance(item["tags"], list):
-            operations.append(
-                UpdateOne(
-                    {"_id": item["_id"]}, {"$set": {"tags": _change_tags(item["tags"])}}
+    with mongo_client.bulk_writer("INVENTORY", "region") as writer:
+        for item in items:
+            if isinstance(item["tags"], list):
+                writer.append(
+                    UpdateOne(
+                        {"_id": item["_id"]},
+                        {"$set": {"tags": _change_tags(item["tags"])}},
+                    )
                 )
-            )
-
-    mongo_client.bulk_write("INVENTORY", "region", operations)
 
 
 @print_log
 def inventory_collector_tags_refactoring(mongo_client: MongoCustomClient):
     items = mongo_client.find("INVENTORY", "collector", {}, {"tags": 1})
 
-    operations = []
-    for item in items:
-        if isinstance(item["tags"], list):
-            operations.append(
-                UpdateOne(
-                    {"_id": item["_id"]}, {"$set": {"tags": _change_tags(item["tags"])}}
+    with mongo_client.bulk_writer("INVENTORY", "collector") as writer:
+        for item in items:
+            if isinstance(item["tags"], list):
+                writer.append(
+                    UpdateOne(
+                        {"_id": item["_id"]},
+                        {"$set": {"tags": _change_tags(item["tags"])}},
+                    )
                 )
-            )
-
-    mongo_client.bulk_write("INVENTORY", "collector", operations)
 
 
 @print_log
 def inventory_cloud_service_type_tags_refactoring(mongo_client: MongoCustomClient):
     items = mongo_client.find("INVENTORY", "cloud_service_type", {}, {"tags": 1})
 
-    operations = []
-    for item in items:
-        if isinstance(item["tags"], list):
-            operations.append(
-                UpdateOne(
-                    {"_id": item["_id"]}, {"$set": {"tags": _change_tags(item["tags"])}}
+    with mongo_client.bulk_writer("INVENTORY", "cloud_service_type") as writer:
+        for item in items:
+            if isinstance(item["tags"], list):
+                writer.append(
+                    UpdateOne(
+                        {"_id": item["_id"]},
+                        {"$set": {"tags": _change_tags(item["tags"])}},
+                    )
                 )
-            )
-
-    mongo_client.bulk_write("INVENTORY", "cloud_service_type", operations)
 
 
 def _change_tags(data):
@@ -407,43 +385,79 @@ def _change_tags(data):
 
 def main(file_path):
     mongo_client: MongoCustomClient = MongoCustomClient(file_path, "v1.10.1")
+    executor = StepExecutor(mongo_client)
 
     # execute migration functions
     # identity service / 9 resources
-    identity_project_group_tags_refactoring(mongo_client)
-    identity_role_binding_tags_refactoring(mongo_client)
-    identity_project_tags_refactoring(mongo_client)
-    identity_user_tags_refactoring(mongo_client)
-    identity_service_account_tags_refactoring(mongo_client)
-    identity_domain_tags_refactoring(mongo_client)
-    identity_role_tags_refactoring(mongo_client)
-    identity_provider_tags_refactoring(mongo_client)
-    identity_policy_tags_refactoring(mongo_client)
+    executor.add(
+        identity_project_group_tags_refactoring,
+        writes=[("IDENTITY", "project_group")],
+    )
+    executor.add(
+        identity_role_binding_tags_refactoring,
+        writes=[("IDENTITY", "role_binding")],
+    )
+    executor.add(identity_project_tags_refactoring, writes=[("IDENTITY", "project")])
+    executor.add(identity_user_tags_refactoring, writes=[("IDENTITY", "user")])
+    executor.add(
+        identity_service_account_tags_refactoring,
+        writes=[("IDENTITY", "service_account")],
+    )
+    executor.add(identity_domain_tags_refactoring, writes=[("IDENTITY", "domain")])
+    executor.add(identity_role_tags_refactoring, writes=[("IDENTITY", "role")])
+    executor.add(identity_provider_tags_refactoring, writes=[("IDENTITY", "provider")])
+    executor.add(identity_policy_tags_refactoring, writes=[("IDENTITY", "policy")])
 
     # monitoring service / 1 resource
-    monitoring_data_source_tags_refactoring(mongo_client)
+    executor.add(
+        monitoring_data_source_tags_refactoring,
+        writes=[("MONITORING", "data_source")],
+    )
 
     # statistics service / 1 resource
-    statistics_schedule_tags_refactoring(mongo_client)
+    executor.add(
+        statistics_schedule_tags_refactoring,
+        writes=[("STATISTICS", "schedule")],
+    )
 
     # secret service / 2 resources
-    secret_secret_tags_refactoring(mongo_client)
-    secret_secret_group_tags_refactoring(mongo_client)
+    executor.add(secret_secret_tags_refactoring, writes=[("SECRET", "secret")])
+    executor.add(
+        secret_secret_group_tags_refactoring,
+        writes=[("SECRET", "secret_group")],
+    )
 
     # repository service / 3 resources
-    repository_schema_tags_refactoring(mongo_client)
-    repository_plugin_tags_refactoring(mongo_client)
-    repository_policy_tags_refactoring(mongo_client)
+    executor.add(repository_schema_tags_refactoring, writes=[("REPOSITORY", "schema")])
+    executor.add(repository_plugin_tags_refactoring, writes=[("REPOSITORY", "plugin")])
+    executor.add(repository_policy_tags_refactoring, writes=[("REPOSITORY", "policy")])
 
     # plugin service / 1 resource
-    plugin_supervisor_tags_refactoring(mongo_client)
+    executor.add(plugin_supervisor_tags_refactoring, writes=[("PLUGIN", "supervisor")])
 
     # config service / 2 resources
-    config_user_config_tags_refactoring(mongo_client)
-    config_domain_config_tags_refactoring(mongo_client)
+    executor.add(
+        config_user_config_tags_refactoring,
+        writes=[("CONFIG", "user_config")],
+    )
+    executor.add(
+        config_domain_config_tags_refactoring,
+        writes=[("CONFIG", "domain_config")],
+    )
 
     # inventory service / 4 resources
-    inventory_resource_group_tags_refactoring(mongo_client)
-    inventory_region_tags_refactoring(mongo_client)
-    inventory_collector_tags_refactoring(mongo_client)
-    inventory_cloud_service_type_tags_refactoring(mongo_client)
+    executor.add(
+        inventory_resource_group_tags_refactoring,
+        writes=[("INVENTORY", "resource_group")],
+    )
+    executor.add(inventory_region_tags_refactoring, writes=[("INVENTORY", "region")])
+    executor.add(
+        inventory_collector_tags_refactoring,
+        writes=[("INVENTORY", "collector")],
+    )
+    executor.add(
+        inventory_cloud_service_type_tags_refactoring,
+        writes=[("INVENTORY", "cloud_service_type")],
+    )
+
+    executor.run()
@@ -12,35 +12,35 @@ def inventory_cloud_service_tags_refactoring(mongo_client: MongoCustomClient):
     items = mongo_client.find(
         "INVENTORY", "cloud_service", {}, {"provider": 1, "tags": 1}
     )
-    operations = []
-    for item in items:
-        provider = item.get("provider", "")
-        if isinstance(item["tags"], list):
-            operations.append(
-                UpdateOne(
-                    {"_id": item["_id"]},
-                    {
-                        "$set": {
-                            "tags": _change_tags_to_list_of_dict(
-                                _change_tags(item["tags"]), provider
-                            )
-                        }
-                    },
+    with mongo_client.bulk_writer("INVENTORY", "cloud_service") as writer:
+        for item in items:
+            provider = item.get("provider", "")
+            if isinstance(item["tags"], list):
+                writer.append(
+                    UpdateOne(
+                        {"_id": item["_id"]},
+                        {
+                            "$set": {
+                                "tags": _change_tags_to_list_of_dict(
+                                    _change_tags(item["tags"]), provider
+                                )
+                            }
+                        },
+                    )
                 )
-            )
-        elif isinstance(item["tags"], dict):
-            operations.append(
-                UpdateOne(
-                    {"_id": item["_id"]},
-                    {
-                        "$set": {
-                            "tags": _change_tags_to_list_of_dict(item["tags"], provider)
-                        }
-                    },
+            elif isinstance(item["tags"], dict):
+                writer.append(
+                    UpdateOne(
+                        {"_id": item["_id"]},
+                        {
+                            "$set": {
+                                "tags": _change_tags_to_list_of_dict(
+                                    item["tags"], provider
+                                )
+                            }
+                        },
+                    )
                 )
-            )
-
-    mongo_client.bulk_write("INVENTORY", "cloud_service", operations)
 
 
 @print_log
@@ -83,63 +83,69 @@ def inventory_cloud_service_refactor_data_structure(mongo_client: MongoCustomCli
     projection = {"provider": 1, "metadata": 1, "tags": 1, "collection_info": 1}
     target_filter = {"tags": {"$type": "array"}}
 
-    for cloud_services in mongo_client.find_by_pagination(
-        "INVENTORY", "cloud_service", target_filter, projection, show_progress=True
-    ):
-        operations = []
-        for cloud_service in cloud_services:
-            provider = cloud_service.get("provider", "custom")
-            metadata = cloud_service.get("metadata", {})
-            tags = cloud_service.get("tags", {})
-            collection_info = cloud_service.get("collection_info", {})
+    mongo_client.parallel_scan(
+        "INVENTORY",
+        "cloud_service",
+        target_filter,
+        _create_cloud_service_operations,
+        projection,
+        show_progress=True,
+    )
 
-            update_fields = {"$set": {}}
 
-            if tags and isinstance(tags, list):
-                new_tags = {}
-                new_tag_keys = {}
+def _create_cloud_service_operations(cloud_services):
+    operations = []
+    for cloud_service in cloud_services:
+        provider = cloud_service.get("provider", "custom")
+        metadata = cloud_service.get("metadata", {})
+        tags = cloud_service.get("tags", {})
+        collection_info = cloud_service.get("collection_info", {})
 
-                for tag in tags:
-                    tag_key = str(tag["key"])
-                    tag_value = str(tag.get("value", ""))
-                    tag_provider = str(tag.get("provider", "custom"))
+        update_fields = {"$set": {}}
 
-                    hashed_key = string_to_hash(tag_key)
+        if tags and isinstance(tags, list):
+            new_tags = {}
+            new_tag_keys = {}
 
-                    new_tags[tag_provider] = new_tags.get(tag_provider, {})
-                    new_tags[tag_provider][hashed_key] = {
-                        "key": tag_key,
-                        "value": tag_value,
-                    }
+            for tag in tags:
+                tag_key = str(tag["key"])
+                tag_value = str(tag.get("value", ""))
+                tag_provider = str(tag.get("provider", "custom"))
 
-                    new_tag_keys[tag_provider] = new_tag_keys.get(tag_provider, [])
-                    new_tag_keys[tag_provider].append(tag_key)
+                hashed_key = string_to_hash(tag_key)
 
-                for provider, tag_keys in new_tag_keys.items():
-                    new_tag_keys[provider] = list(set(tag_keys))
+                new_tags[tag_provider] = new_tags.get(tag_provider, {})
+                new_tags[tag_provider][hashed_key] = {
+                    "key": tag_key,
+                    "value": tag_value,
+                }
 
-                update_fields["$set"].update({"tags": new_tags})
-                update_fields["$set"].update({"tag_keys": new_tag_keys})
+                new_tag_keys[tag_provider] = new_tag_keys.get(tag_provider, [])
+                new_tag_keys[tag_provider].append(tag_key)
 
-            elif isinstance(tags, list):
-                update_fields["$set"].update({"tags": {}})
+            for provider, tag_keys in new_tag_keys.items():
+                new_tag_keys[provider] = list(set(tag_keys))
 
-            if metadata and provider not in metadata:
-                new_metadata = {}
-                for plugin_id in metadata:
-                    new_metadata = {provider: metadata[plugin_id]}
+            update_fields["$set"].update({"tags": new_tags})
+            update_fields["$set"].update({"tag_keys": new_tag_keys})
 
-                update_fields["$set"].update({"metadata": new_metadata})
+        elif isinstance(tags, list):
+            update_fields["$set"].update({"tags": {}})
 
-            if collection_info and isinstance(collection_info, dict):
-                update_fields["$set"].update({"collection_info": []})
+        if metadata and provider not in metadata:
+            new_metadata = {}
+            for plugin_id in metadata:
+                new_metadata = {provider: metadata[plugin_id]}
 
-            if len(update_fields["$set"].keys()) > 0:
-                operations.append(
-                    UpdateOne({"_id": cloud_service["_id"]}, update_fields)
-                )
+            update_fields["$set"].update({"metadata": new_metadata})
+
+        if collection_info and isinstance(collection_info, dict):
+            update_fields["$set"].update({"collection_info": []})
+
+        if len(update_fields["$set"].keys()) > 0:
+            operations.append(UpdateOne({"_id": cloud_service["_id"]}, update_fields))
 
-        mongo_client.bulk_write("INVENTORY", "cloud_service", operations)
+    return operations
 
 
 @print_log
@@ -1,6 +1,7 @@
 import logging
 from conf import DEFAULT_LOGGER
 from lib import MongoCustomClient
+from lib.step_executor import StepExecutor
 from lib.util import print_log
 from pymongo import UpdateOne
 
@@ -143,32 +144,83 @@ def inventory_prowler_change_options_to_compliance_framework(
 
 def main(file_path):
     mongo_client: MongoCustomClient = MongoCustomClient(file_path, "v1.12.2")
+    executor = StepExecutor(mongo_client)
 
     # identity
-    identity_provider_drop(mongo_client)
+    executor.add(identity_provider_drop, writes=[("IDENTITY", "provider")])
 
     # dashboard
-    dashboard_domain_dashboard_drop(mongo_client)
-    dashboard_domain_dashboard_version_drop(mongo_client)
-    dashboard_project_dashboard_drop(mongo_client)
-    dashboard_project_dashboard_version_drop(mongo_client)
+    executor.add(
+        dashboard_domain_dashboard_drop,
+        writes=[("DASHBOARD", "domain_dashboard")],
+    )
+    executor.add(
+        dashboard_domain_dashboard_version_drop,
+        writes=[("DASHBOARD", "domain_dashboard_version")],
+    )
+    executor.add(
+        dashboard_project_dashboard_drop,
+        writes=[("DASHBOARD", "project_dashboard")],
+    )
+    executor.add(
+        dashboard_project_dashboard_version_drop,
+        writes=[("DASHBOARD", "project_dashboard_version")],
+    )
 
     # cost-analysis
-    cost_analysis_public_dashboard_drop(mongo_client)
-    cost_analysis_user_dashboard_drop(mongo_client)
-    cost_analysis_custom_widget_drop(mongo_client)
-    cost_analysis_cost_drop(mongo_client)
-    cost_analysis_monthly_cost_drop(mongo_client)
-    cost_analysis_budget_usage_drop(mongo_client)
-    cost_analysis_cost_query_set_drop(mongo_client)
-    cost_analysis_cost_query_history_drop(mongo_client)
-    cost_analysis_budget_drop(mongo_client)
-    cost_analysis_job_drop(mongo_client)
-    cost_analysis_job_task_drop(mongo_client)
+    executor.add(
+        cost_analysis_public_dashboard_drop,
+        writes=[("COST_ANALYSIS", "public_dashboard")],
+    )
+    executor.add(
+        cost_analysis_user_dashboard_drop,
+        writes=[("COST_ANALYSIS", "user_dashboard")],
+    )
+    executor.add(
+        cost_analysis_custom_widget_drop,
+        writes=[("COST_ANALYSIS", "custom_widget")],
+    )
+    executor.add(cost_analysis_cost_drop, writes=[("COST_ANALYSIS", "cost")])
+    executor.add(
+        cost_analysis_monthly_cost_drop,
+        writes=[("COST_ANALYSIS", "monthly_cost")],
+    )
+    executor.add(
+        cost_analysis_budget_usage_drop,
+        writes=[("COST_ANALYSIS", "budget_usage")],
+    )
+    executor.add(
+        cost_analysis_cost_query_set_drop,
+        writes=[("COST_ANALYSIS", "cost_query_set")],
+    )
+    executor.add(
+        cost_analysis_cost_query_history_drop,
+        writes=[("COST_ANALYSIS", "cost_query_history")],
+    )
+    executor.add(cost_analysis_budget_drop, writes=[("COST_ANALYSIS", "budget")])
+    executor.add(cost_analysis_job_drop, writes=[("COST_ANALYSIS", "job")])
+    executor.add(cost_analysis_job_task_drop, writes=[("COST_ANALYSIS", "job_task")])
 
     # inventory
-    inventory_cloud_service_stats_drop(mongo_client)
-    inventory_monthly_cloud_service_stats_drop(mongo_client)
-    inventory_cloud_service_query_sets_drop(mongo_client)
-    inventory_cloud_service_stats_query_history_drop(mongo_client)
-    inventory_prowler_change_options_to_compliance_framework(mongo_client)
+    executor.add(
+        inventory_cloud_service_stats_drop,
+        writes=[("INVENTORY", "cloud_service_stats")],
+    )
+    executor.add(
+        inventory_monthly_cloud_service_stats_drop,
+        writes=[("INVENTORY", "monthly_cloud_service_stats")],
+    )
+    executor.add(
+        inventory_cloud_service_query_sets_drop,
+        writes=[("INVENTORY", "cloud_service_query_sets")],
+    )
+    executor.add(
+        inventory_cloud_service_stats_query_history_drop,
+        writes=[("INVENTORY", "cloud_service_stats_query_history")],
+    )
+    executor.add(
+        inventory_prowler_change_options_to_compliance_framework,
+        writes=[("INVENTORY", "collector")],
+    )
+
+    executor.run()
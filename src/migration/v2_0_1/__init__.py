@@ -1,7 +1,9 @@
+import functools
 import logging
 
 from conf import DEFAULT_LOGGER
 from lib import MongoCustomClient
+from lib.domain_executor import DomainExecutor
 from migration.v2_0_1 import (
     identity,
     dashboard,
@@ -19,32 +21,141 @@ from migration.v2_0_1 import (
 
 _LOGGER = logging.getLogger(DEFAULT_LOGGER)
 
+# collections whose per-domain size decides the schedule of each domain loop
+DOMAIN_COLLECTIONS = [
+    ("IDENTITY", "project_group"),
+    ("IDENTITY", "project"),
+    ("IDENTITY", "service_account"),
+    ("IDENTITY", "role_binding"),
+    ("IDENTITY", "user"),
+    ("DASHBOARD", "domain_dashboard"),
+    ("DASHBOARD", "project_dashboard"),
+    ("SECRET", "secret"),
+    ("MONITORING", "alert"),
+    ("MONITORING", "event"),
+    ("MONITORING", "note"),
+    ("NOTIFICATION", "project_channel"),
+]
+DOMAIN_RESOURCE_COLLECTIONS = [
+    ("INVENTORY", "cloud_service"),
+    ("INVENTORY", "note"),
+    ("COST_ANALYSIS", "budget"),
+    ("COST_ANALYSIS", "cost_query_set"),
+    ("COST_ANALYSIS", "cost"),
+    ("COST_ANALYSIS", "monthly_cost"),
+]
+
+
+VERSION = "v2.0.1"
+
 
 def main(file_path):
-    mongo_client: MongoCustomClient = MongoCustomClient(file_path, "v2.0.1")
+    mongo_client: MongoCustomClient = MongoCustomClient(file_path, VERSION)
+    # the indexes of every module are dropped once, after the last read
+    with mongo_client.defer_index_drops():
+        _migrate(mongo_client)
+
+
+def _migrate(mongo_client: MongoCustomClient):
+    domain_executor = DomainExecutor(mongo_client)
+    cross_domain = mongo_client.cross_domain_scan
+
+    domain_items = list(_find_domains_to_migrate(mongo_client))
+    project_maps = []
+    for workspace_map, project_map in domain_executor.run(
+        domain_items,
+        functools.partial(_migrate_domain, cross_domain=cross_domain),
+        DOMAIN_COLLECTIONS,
+    ):
+        identity.merge_workspace_project_map(workspace_map, project_map)
+        project_maps.append(project_map)
+
+    if cross_domain and domain_items:
+        # the escalation policies of a domain need the workspace_id of its alerts
+        monitoring.cross_domain_main(
+            mongo_client,
+            [domain_info["domain_id"] for domain_info in domain_items],
+            _create_project_workspace_map(project_maps),
+        )
+        domain_executor.run(domain_items, _migrate_domain_monitoring)
+
+    _migrate_global(mongo_client)
+
+    domain_items = list(mongo_client.find("IDENTITY", "domain", {}, {}))
+    project_maps = []
+    for workspace_map, project_map in domain_executor.run(
+        domain_items,
+        functools.partial(_migrate_domain_resources, cross_domain=cross_domain),
+        DOMAIN_RESOURCE_COLLECTIONS,
+    ):
+        identity.merge_workspace_project_map(workspace_map, project_map)
+        project_maps.append(project_map)
+
+    if cross_domain and domain_items:
+        inventory.cross_domain_main(
+            mongo_client,
+            [domain_info["domain_id"] for domain_info in domain_items],
+            _create_project_workspace_map(project_maps),
+        )
 
-    domain_items = mongo_client.find(
+    _finish(mongo_client)
+
+
+def create_work_units(mongo_client: MongoCustomClient) -> list:
+    """Phases of work units for migrate.py --enqueue (see WorkQueue)."""
+    domain_ids = [
+        domain_info["domain_id"]
+        for domain_info in mongo_client.find("IDENTITY", "domain", {}, {})
+    ]
+    domain_ids_to_migrate = [
+        domain_info["domain_id"]
+        for domain_info in _find_domains_to_migrate(mongo_client)
+    ]
+
+    return [
+        [
+            {"name": "domain", "domain_id": domain_id}
+            for domain_id in domain_ids_to_migrate
+        ],
+        [{"name": "global"}],
+        [
+            {"name": "domain_resources", "domain_id": domain_id}
+            for domain_id in domain_ids
+        ],
+        [{"name": "finish"}],
+    ]
+
+
+def run_work_unit(mongo_client: MongoCustomClient, unit: dict):
+    # index drops are saved in the ledger and issued by the finish unit
+    with mongo_client.defer_index_drops(flush=unit["name"] == "finish"):
+        _run_work_unit(mongo_client, unit)
+
+
+def _run_work_unit(mongo_client: MongoCustomClient, unit: dict):
+    if unit["name"] in ["domain", "domain_resources"]:
+        domain_info = mongo_client.find_one(
+            "IDENTITY", "domain", {"domain_id": unit["domain_id"]}
+        )
+        if unit["name"] == "domain":
+            _migrate_domain(mongo_client, domain_info)
+        else:
+            _migrate_domain_resources(mongo_client, domain_info)
+    elif unit["name"] == "global":
+        _migrate_global(mongo_client)
+    elif unit["name"] == "finish":
+        _finish(mongo_client)
+    else:
+        raise ValueError(f"Unknown work unit. (unit = {unit})")
+
+
+def _find_domains_to_migrate(mongo_client: MongoCustomClient):
+    return mongo_client.find(
         "IDENTITY", "domain", {"tags.migration_complete": {"$eq": None}}, {}
     )
 
-    for domain_info in domain_items:
-        domain_id = domain_info["domain_id"]
-        tags = domain_info.get("tags")
-
-        workspace_mode = False
-        if tags.get("workspace_mode") == "multi":
-            workspace_mode = True
-
-        workspace_map, project_map = identity.main(
-            mongo_client, domain_id, workspace_mode
-        )
-
-        dashboard.main(mongo_client, domain_id, project_map)
-        secret.main(mongo_client, domain_id, project_map)
-        monitoring.main(mongo_client, domain_id, project_map, workspace_mode)
-        notification.main(mongo_client, domain_id, project_map)
-        identity.update_domain(mongo_client, domain_id, domain_info["tags"])
 
+def _migrate_global(mongo_client: MongoCustomClient):
     board.main(mongo_client)
     file_manager.file_update_fields(mongo_client)
     file_manager.file_delete_documents(mongo_client)
@@ -65,24 +176,71 @@ def main(file_path):
     plugin.drop_collections(mongo_client)
     dashboard.drop_collections(mongo_client)
 
-    domain_items = mongo_client.find("IDENTITY", "domain", {}, {})
-    for domain_info in domain_items:
-        domain_id = domain_info["domain_id"]
-        tags = domain_info.get("tags")
 
-        workspace_mode = False
-        if tags.get("workspace_mode") == "multi":
-            workspace_mode = True
+def _finish(mongo_client: MongoCustomClient):
+    inventory.drop_collections(mongo_client)
+    cost_analysis.drop_collections(mongo_client)
 
-        workspace_map, project_map = identity.create_workspace_project_map(
-            mongo_client, domain_id, workspace_mode
-        )
 
-        inventory.main(mongo_client, domain_id, project_map)
+def _migrate_domain(
+    mongo_client: MongoCustomClient, domain_info: dict, cross_domain: bool = False
+):
+    """With cross_domain, monitoring is left to _migrate_domain_monitoring."""
+    domain_id = domain_info["domain_id"]
+    workspace_mode = _is_workspace_mode(domain_info)
 
-        cost_analysis.main(
-            mongo_client, domain_id, workspace_map, project_map, workspace_mode
-        )
+    workspace_map, project_map = identity.main(mongo_client, domain_id, workspace_mode)
 
-    inventory.drop_collections(mongo_client)
-    cost_analysis.drop_collections(mongo_client)
+    dashboard.main(mongo_client, domain_id, project_map)
+    secret.main(mongo_client, domain_id, project_map)
+    if not cross_domain:
+        monitoring.main(mongo_client, domain_id, project_map, workspace_mode)
+    notification.main(mongo_client, domain_id, project_map)
+    if not cross_domain:
+        identity.update_domain(mongo_client, domain_id, domain_info["tags"])
+
+    return workspace_map, project_map
+
+
+def _migrate_domain_monitoring(mongo_client: MongoCustomClient, domain_info: dict):
+    domain_id = domain_info["domain_id"]
+    monitoring.main(
+        mongo_client,
+        domain_id,
+        identity.PROJECT_MAP,
+        _is_workspace_mode(domain_info),
+        cross_domain=True,
+    )
+    identity.update_domain(mongo_client, domain_id, domain_info["tags"])
+
+
+def _migrate_domain_resources(
+    mongo_client: MongoCustomClient, domain_info: dict, cross_domain: bool = False
+):
+    domain_id = domain_info["domain_id"]
+    workspace_mode = _is_workspace_mode(domain_info)
+
+    workspace_map, project_map = identity.create_workspace_project_map(
+        mongo_client, domain_id, workspace_mode
+    )
+
+    inventory.main(mongo_client, domain_id, project_map, cross_domain=cross_domain)
+    cost_analysis.main(
+        mongo_client, domain_id, workspace_map, project_map, workspace_mode
+    )
+
+    return workspace_map, project_map
+
+
+def _create_project_workspace_map(project_maps: list) -> dict:
+    """Merge per-domain {domain_id: {project_id: workspace_id}} maps."""
+    project_workspace_map = {}
+    for project_map in project_maps:
+        for domain_project_map in project_map.values():
+            project_workspace_map.update(domain_project_map)
+    return project_workspace_map
+
+
+def _is_workspace_mode(domain_info: dict) -> bool:
+    tags = domain_info.get("tags")
+    return tags.get("workspace_mode") == "multi"
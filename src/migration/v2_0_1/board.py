@@ -10,8 +10,7 @@ _LOGGER = logging.getLogger(DEFAULT_LOGGER)
 @print_log
 def drop_collections(mongo_client: MongoCustomClient):
     collections = ["board", "post"]
-    for collection in collections:
-        mongo_client.drop_collection("BOARD", collection)
+    mongo_client.drop_collections("BOARD", collections)
 
 
 @print_log
@@ -112,6 +112,11 @@ def cost_analysis_cost_refactoring(
     if domain_tags.get("tags").get("is_EA"):
         is_EA = True
 
+    if _update_cost_by_map(
+        mongo_client, domain_id, workspace_map, project_map, workspace_mode, is_EA
+    ):
+        return
+
     for costs_info in mongo_client.find_by_pagination(
         "COST_ANALYSIS",
         "cost",
@@ -154,11 +159,78 @@ def cost_analysis_cost_refactoring(
         mongo_client.bulk_write("COST_ANALYSIS", "cost", operations)
 
 
+def _update_cost_by_map(
+    mongo_client, domain_id, workspace_map, project_map, workspace_mode, is_EA
+):
+    unset = ["project_group_id", "plugin_info.schema"]
+    q_filter = {"domain_id": domain_id, "workspace_id": {"$in": [None, ""]}}
+    no_project_filter = {**q_filter, "project_id": {"$in": [None, ""]}}
+
+    if not mongo_client.update_many_by_map(
+        "COST_ANALYSIS",
+        "cost",
+        {**q_filter, "project_id": {"$nin": [None, ""]}},
+        "project_id",
+        "workspace_id",
+        project_map.get(domain_id, {}),
+        unset=unset,
+        default=None,
+    ):
+        return False
+
+    # costs with neither a project nor a project group go first: the project
+    # group updates below $unset project_group_id, so an unmapped project group
+    # would match this filter afterwards and get the workspace of EA domains.
+    # The per-document loop gave these costs the workspace_id of the previous
+    # document; here they get None, or the first project's workspace for EA.
+    workspace_id = None
+    if is_EA and project_map.get(domain_id):
+        workspace_id = list(project_map[domain_id].values())[0]
+
+    mongo_client.update_many(
+        "COST_ANALYSIS",
+        "cost",
+        {**no_project_filter, "project_group_id": {"$in": [None, ""]}},
+        {
+            "$set": {"workspace_id": workspace_id},
+            "$unset": {field: 1 for field in unset},
+        },
+    )
+
+    project_group_filter = {
+        **no_project_filter,
+        "project_group_id": {"$nin": [None, ""]},
+    }
+    if workspace_mode:
+        if not mongo_client.update_many_by_map(
+            "COST_ANALYSIS",
+            "cost",
+            project_group_filter,
+            "project_group_id",
+            "workspace_id",
+            workspace_map["multi"].get(domain_id, {}),
+            unset=unset,
+            default=None,
+        ):
+            return False
+    else:
+        mongo_client.update_many(
+            "COST_ANALYSIS",
+            "cost",
+            project_group_filter,
+            {
+                "$set": {"workspace_id": workspace_map["single"].get(domain_id)},
+                "$unset": {field: 1 for field in unset},
+            },
+        )
+
+    return True
+
+
 @print_log
 def cost_analysis_monthly_cost_refactoring(
     mongo_client, domain_id, workspace_map, project_map, workspace_mode
 ):
-    workspace_id = None
     is_EA = False
 
     domain_tags = mongo_client.find_one(
@@ -167,25 +239,17 @@ def cost_analysis_monthly_cost_refactoring(
     if domain_tags.get("tags").get("is_EA"):
         is_EA = True
 
-    for monthly_costs_info in mongo_client.find_by_pagination(
-        "COST_ANALYSIS",
-        "monthly_cost",
-        {"domain_id": domain_id},
-        {
-            "_id": 1,
-            "workspace_id": 1,
-            "project_id": 1,
-            "project_group_id": 1,
-            "domain_id": 1,
-        },
-        show_progress=True,
-    ):
+    def _create_monthly_cost_operations(monthly_costs_info):
         operations = []
 
         for monthly_cost_info in monthly_costs_info:
             if monthly_cost_info.get("workspace_id"):
                 continue
 
+            # reset for every document: a document matching no branch below
+            # used to inherit the workspace_id of the previous one, which
+            # depends on the page order once the ranges run concurrently
+            workspace_id = None
             if monthly_cost_info.get("project_id"):
                 workspace_id = project_map[monthly_cost_info["domain_id"]].get(
                     monthly_cost_info.get("project_id")
@@ -209,7 +273,22 @@ def cost_analysis_monthly_cost_refactoring(
 
             operations.append(UpdateOne({"_id": monthly_cost_info["_id"]}, set_params))
 
-        mongo_client.bulk_write("COST_ANALYSIS", "monthly_cost", operations)
+        return operations
+
+    mongo_client.parallel_scan(
+        "COST_ANALYSIS",
+        "monthly_cost",
+        {"domain_id": domain_id},
+        _create_monthly_cost_operations,
+        {
+            "_id": 1,
+            "workspace_id": 1,
+            "project_id": 1,
+            "project_group_id": 1,
+            "domain_id": 1,
+        },
+        show_progress=True,
+    )
 
 
 @print_log
@@ -223,8 +302,7 @@ def cost_analysis_data_source_plugin_info_migration(mongo_client):
 @print_log
 def drop_collections(mongo_client):
     collections = ["job", "job_task", "cost_query_history"]
-    for collection in collections:
-        mongo_client.drop_collection("COST_ANALYSIS", collection)
+    mongo_client.drop_collections("COST_ANALYSIS", collections)
 
 
 def _create_cost_query_set(mongo_client, cost_query_set_info, workspace_id):
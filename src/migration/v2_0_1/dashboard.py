@@ -90,8 +90,7 @@ def drop_collections(mongo_client: MongoCustomClient):
         "project_dashboard_version",
     ]
 
-    for collection in collections:
-        mongo_client.drop_collection("DASHBOARD", collection)
+    mongo_client.drop_collections("DASHBOARD", collections)
 
 
 def _change_prefix(dashboard_id, prefix):
@@ -199,8 +199,7 @@ def dashboard_drop_collections(mongo_client: MongoCustomClient):
         "project_dashboard",
         "project_dashboard_version",
     ]
-    for collection in collections:
-        mongo_client.drop_collection("DASHBOARD", collection)
+    mongo_client.drop_collections("DASHBOARD", collections)
 
 
 @print_log
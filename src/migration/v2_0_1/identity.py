@@ -2,6 +2,7 @@ import logging
 
 from datetime import datetime
 
+from pymongo import UpdateOne
 from spaceone.core.utils import generate_id
 
 from conf import DEFAULT_LOGGER
@@ -31,9 +32,16 @@ PROJECT_MAP = {
 }
 
 
+def merge_workspace_project_map(workspace_map: dict, project_map: dict):
+    """Merge the maps returned by main() for a domain into the module maps."""
+    WORKSPACE_MAP["single"].update(workspace_map["single"])
+    WORKSPACE_MAP["multi"].update(workspace_map["multi"])
+    PROJECT_MAP.update(project_map)
+
+
 @print_log
 def identity_domain_refactoring_and_external_auth_creating(
-    mongo_client: MongoCustomClient, domain_id_param
+    mongo_client: MongoCustomClient, domain_id_param, workspace_map
 ):
     domains = mongo_client.find(
         "IDENTITY", "domain", {"domain_id": domain_id_param}, {}
@@ -59,9 +67,9 @@ def identity_domain_refactoring_and_external_auth_creating(
 
         if workspace_mode := tags.get("workspace_mode"):
             if workspace_mode == "multi":
-                WORKSPACE_MAP["multi"].update({domain_id: {}})
+                workspace_map["multi"].update({domain_id: {}})
             else:
-                WORKSPACE_MAP["single"].update({domain_id: ""})
+                workspace_map["single"].update({domain_id: ""})
 
         if plugin_info and domain_state != "DELETED":
             params = {
@@ -81,82 +89,84 @@ def identity_domain_refactoring_and_external_auth_creating(
 
 @print_log
 def identity_project_group_refactoring_and_workspace_creating(
-    mongo_client: MongoCustomClient, domain_id_param
+    mongo_client: MongoCustomClient, domain_id_param, workspace_map
 ):
-    project_groups = mongo_client.find(
-        "IDENTITY", "project_group", {"domain_id": domain_id_param}, {}
-    )
-    for project_group in project_groups:
-        if "parent_project_group" in project_group.keys():
-            domain_id = project_group["domain_id"]
-            project_group_id = project_group["project_group_id"]
-            parent_project_group_id = project_group.get("parent_project_group_id")
-            project_group_name = project_group["name"]
-
-            unset_params = {
-                "$unset": {
-                    "parent_project_group": 1,
-                    "created_by": 1,
-                    "parent_project_group_id": 1,
+    project_group_tree = _ProjectGroupTree.load(mongo_client, domain_id_param)
+    with _WorkspaceRegistry(mongo_client, domain_id_param) as workspace_registry:
+        for project_group in project_group_tree.project_groups:
+            if "parent_project_group" in project_group.keys():
+                domain_id = project_group["domain_id"]
+                project_group_id = project_group["project_group_id"]
+                parent_project_group_id = project_group.get("parent_project_group_id")
+                project_group_name = project_group["name"]
+
+                unset_params = {
+                    "$unset": {
+                        "parent_project_group": 1,
+                        "created_by": 1,
+                        "parent_project_group_id": 1,
+                    }
                 }
-            }
 
-            set_params = {"$set": {"parent_group_id": parent_project_group_id}}
-
-            if domain_id in WORKSPACE_MAP["multi"].keys():
-                if not parent_project_group_id:
-                    _create_workspace(domain_id, mongo_client, project_group_name)
-                    workspace_id = _get_workspace_id(
-                        domain_id, mongo_client, project_group_name
-                    )
-                    WORKSPACE_MAP["multi"][domain_id].update(
-                        {project_group_id: workspace_id}
-                    )
-                    set_params["$set"].update({"workspace_id": workspace_id})
-                else:
-                    root_project_group = _get_root_project_group_id_by_project_group_id(
-                        domain_id, parent_project_group_id, mongo_client
-                    )
-                    root_project_group_id = root_project_group["project_group_id"]
-                    root_project_group_name = root_project_group["name"]
+                set_params = {"$set": {"parent_group_id": parent_project_group_id}}
 
-                    if (
-                        root_project_group_id
-                        in WORKSPACE_MAP["multi"][domain_id].keys()
-                    ):
-                        workspace_id = WORKSPACE_MAP["multi"][domain_id][
-                            root_project_group_id
-                        ]
-                        set_params["$set"].update({"workspace_id": workspace_id})
-                    else:
-                        _create_workspace(
-                            domain_id, mongo_client, root_project_group_name
+                if domain_id in workspace_map["multi"].keys():
+                    if not parent_project_group_id:
+                        workspace_id = workspace_registry.get_workspace_id(
+                            project_group_name
                         )
-                        workspace_id = _get_workspace_id(
-                            domain_id, mongo_client, root_project_group_name
-                        )
-                        WORKSPACE_MAP["multi"][domain_id].update(
-                            {root_project_group_id: workspace_id}
+                        workspace_map["multi"][domain_id].update(
+                            {project_group_id: workspace_id}
                         )
                         set_params["$set"].update({"workspace_id": workspace_id})
-            else:
-                workspace_id = WORKSPACE_MAP["single"].get(domain_id)
-                if not workspace_id:
-                    _create_workspace(domain_id, mongo_client)
-                    workspace_id = _get_workspace_id(domain_id, mongo_client)
-                    WORKSPACE_MAP["single"][domain_id] = workspace_id
-                set_params["$set"].update({"workspace_id": workspace_id})
+                    else:
+                        root_project_group = project_group_tree.get_root(
+                            parent_project_group_id
+                        )
+                        root_project_group_id = root_project_group["project_group_id"]
+                        root_project_group_name = root_project_group["name"]
 
-            mongo_client.update_one(
-                "IDENTITY", "project_group", {"_id": project_group["_id"]}, set_params
-            )
-            mongo_client.update_one(
-                "IDENTITY", "project_group", {"_id": project_group["_id"]}, unset_params
-            )
+                        if (
+                            root_project_group_id
+                            in workspace_map["multi"][domain_id].keys()
+                        ):
+                            workspace_id = workspace_map["multi"][domain_id][
+                                root_project_group_id
+                            ]
+                            set_params["$set"].update({"workspace_id": workspace_id})
+                        else:
+                            workspace_id = workspace_registry.get_workspace_id(
+                                root_project_group_name
+                            )
+                            workspace_map["multi"][domain_id].update(
+                                {root_project_group_id: workspace_id}
+                            )
+                            set_params["$set"].update({"workspace_id": workspace_id})
+                else:
+                    workspace_id = workspace_map["single"].get(domain_id)
+                    if not workspace_id:
+                        workspace_id = workspace_registry.get_workspace_id()
+                        workspace_map["single"][domain_id] = workspace_id
+                    set_params["$set"].update({"workspace_id": workspace_id})
+
+                mongo_client.update_one(
+                    "IDENTITY",
+                    "project_group",
+                    {"_id": project_group["_id"]},
+                    set_params,
+                )
+                mongo_client.update_one(
+                    "IDENTITY",
+                    "project_group",
+                    {"_id": project_group["_id"]},
+                    unset_params,
+                )
 
 
 @print_log
-def identity_project_refactoring(mongo_client: MongoCustomClient, domain_id_param):
+def identity_project_refactoring(
+    mongo_client: MongoCustomClient, domain_id_param, workspace_map, project_map
+):
     projects = mongo_client.find(
         "IDENTITY", "project", {"domain_id": domain_id_param}, {}
     )
@@ -165,6 +175,10 @@ def identity_project_refactoring(mongo_client: MongoCustomClient, domain_id_para
         _LOGGER.error(f"domain({domain_id_param}) has no projects.")
         return
 
+    project_group_tree = _ProjectGroupTree.load(mongo_client, domain_id_param)
+    project_users, project_group_users = _get_users_by_project(
+        mongo_client, domain_id_param
+    )
     for project in projects:
         if "project_group" in project.keys():
             set_params = {
@@ -177,53 +191,33 @@ def identity_project_refactoring(mongo_client: MongoCustomClient, domain_id_para
             project_id = project["project_id"]
             domain_id = project["domain_id"]
             project_group_id = project.get("project_group_id")
-            root_project_group_id = _get_root_project_group_id_by_project_group_id(
-                domain_id, project_group_id, mongo_client
-            )["project_group_id"]
+            root_project_group_id = project_group_tree.get_root(project_group_id)[
+                "project_group_id"
+            ]
             workspace_id = ""
 
-            if domain_id in WORKSPACE_MAP["multi"].keys():
-                if root_project_group_id in WORKSPACE_MAP["multi"][domain_id].keys():
-                    workspace_id = WORKSPACE_MAP["multi"][domain_id][
+            if domain_id in workspace_map["multi"].keys():
+                if root_project_group_id in workspace_map["multi"][domain_id].keys():
+                    workspace_id = workspace_map["multi"][domain_id][
                         root_project_group_id
                     ]
 
-            if domain_id in WORKSPACE_MAP["single"].keys():
-                workspace_id = WORKSPACE_MAP["single"][domain_id]
+            if domain_id in workspace_map["single"].keys():
+                workspace_id = workspace_map["single"][domain_id]
 
             if not workspace_id:
-                project_group_info = mongo_client.find_one(
-                    "IDENTITY", "project_group",
-                    {"project_group_id": project_group_id},
-                    {}
-                )
+                project_group_info = project_group_tree.get(project_group_id)
                 workspace_id = project_group_info["workspace_id"]
 
-            if domain_id not in PROJECT_MAP.keys():
-                PROJECT_MAP[domain_id] = {project_id: workspace_id}
+            if domain_id not in project_map.keys():
+                project_map[domain_id] = {project_id: workspace_id}
             else:
-                PROJECT_MAP[domain_id].update({project_id: workspace_id})
-
-            users = []
-            if pg_role_bindings := mongo_client.find(
-                "IDENTITY", "role_binding", {"project_group_id": project_group_id}, {}
-            ):
-                for role_binding in pg_role_bindings:
-                    if (
-                        role_binding["resource_type"] == "identity.User"
-                        and role_binding["resource_id"] not in users
-                    ):
-                        users.append(role_binding["resource_id"])
-
-            if project_role_bindings := mongo_client.find(
-                "IDENTITY", "role_binding", {"project_id": project_id}, {}
-            ):
-                for role_binding in project_role_bindings:
-                    if (
-                        role_binding["resource_type"] == "identity.User"
-                        and role_binding["resource_id"] not in users
-                    ):
-                        users.append(role_binding["resource_id"])
+                project_map[domain_id].update({project_id: workspace_id})
+
+            users = sorted(
+                project_group_users.get(project_group_id, set())
+                | project_users.get(project_id, set())
+            )
 
             set_params["$set"].update({"workspace_id": workspace_id, "users": users})
 
@@ -232,62 +226,171 @@ def identity_project_refactoring(mongo_client: MongoCustomClient, domain_id_para
             )
 
 
-def _create_workspace(domain_id, mongo_client, project_group_name=None):
-    workspaces = mongo_client.find(
-        "IDENTITY", "workspace", {"domain_id": domain_id}, {}
-    )
-    workspace_ids = [workspace["workspace_id"] for workspace in workspaces]
+def _get_users_by_project(mongo_client, domain_id):
+    """Return the user ids of the role bindings of a domain per project and per
+    project group, grouped by one aggregation."""
+    pipeline = [
+        {"$match": {"domain_id": domain_id, "resource_type": "identity.User"}},
+        {
+            "$group": {
+                "_id": {
+                    "project_id": "$project_id",
+                    "project_group_id": "$project_group_id",
+                },
+                "users": {"$addToSet": "$resource_id"},
+            }
+        },
+    ]
 
-    create_params = {
-        "name": "Default",
-        "state": "ENABLED",
-        "tags": {},
-        "domain_id": domain_id,
-        "created_by": "SpaceONE",
-        "created_at": datetime.utcnow(),
-        "deleted_at": None,
-    }
+    project_users = {}
+    project_group_users = {}
+    for item in mongo_client.aggregate("IDENTITY", "role_binding", pipeline):
+        if project_id := item["_id"].get("project_id"):
+            project_users.setdefault(project_id, set()).update(item["users"])
+        if project_group_id := item["_id"].get("project_group_id"):
+            project_group_users.setdefault(project_group_id, set()).update(
+                item["users"]
+            )
 
-    workspace_id = generate_id("workspace")
-    if workspace_id not in workspace_ids:
-        create_params.update({"workspace_id": workspace_id})
+    return project_users, project_group_users
 
-    if project_group_name:
-        create_params["name"] = project_group_name
 
-    mongo_client.insert_one("IDENTITY", "workspace", create_params, is_new=True)
+class _WorkspaceRegistry(object):
+    """Workspaces of a domain, read once, with the ones created by the step.
 
+    get_workspace_id() returns the first workspace with the given name (or the
+    first workspace of the domain without a name) and creates it when there is
+    none, with an id generated here, so that no query is needed to learn it.
+    New workspaces are inserted in batches of BATCH_SIZE and when the registry
+    is closed.
+    """
 
-def _get_workspace_id(domain_id, mongo_client, workspace_name=None):
-    query = {"domain_id": domain_id}
+    def __init__(self, mongo_client: MongoCustomClient, domain_id: str):
+        self.mongo_client = mongo_client
+        self.domain_id = domain_id
+        self._workspace_ids = set()
+        self._workspace_ids_by_name = {}
+        self._first_workspace_id = None
+        self._new_workspaces = []
 
-    if workspace_name:
-        query.update({"name": workspace_name})
+        for workspace in mongo_client.find(
+            "IDENTITY",
+            "workspace",
+            {"domain_id": domain_id},
+            {"workspace_id": 1, "name": 1},
+        ):
+            self._add_workspace(workspace["workspace_id"], workspace.get("name"))
 
-    workspaces = mongo_client.find("IDENTITY", "workspace", query, {})
-    return [workspace["workspace_id"] for workspace in workspaces][0]
+    def __enter__(self):
+        return self
 
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.flush()
 
-def _get_root_project_group_id_by_project_group_id(
-    domain_id, project_group_id, mongo_client
-):
-    while project_group_id:
-        project_group = mongo_client.find_one(
-            "IDENTITY",
-            "project_group",
-            {"project_group_id": project_group_id, "domain_id": domain_id},
-            {},
+    def get_workspace_id(self, workspace_name=None) -> str:
+        if workspace_name:
+            workspace_id = self._workspace_ids_by_name.get(workspace_name)
+        else:
+            workspace_id = self._first_workspace_id
+
+        if workspace_id is None:
+            workspace_id = self._create_workspace(workspace_name or "Default")
+        return workspace_id
+
+    def flush(self):
+        if self._new_workspaces:
+            self.mongo_client.insert_many(
+                "IDENTITY", "workspace", self._new_workspaces, is_new=True
+            )
+            self._new_workspaces = []
+
+    def _create_workspace(self, workspace_name: str) -> str:
+        workspace_id = generate_id("workspace")
+        while workspace_id in self._workspace_ids:
+            workspace_id = generate_id("workspace")
+
+        self._new_workspaces.append(
+            {
+                "name": workspace_name,
+                "state": "ENABLED",
+                "tags": {},
+                "domain_id": self.domain_id,
+                "created_by": "SpaceONE",
+                "created_at": datetime.utcnow(),
+                "deleted_at": None,
+                "workspace_id": workspace_id,
+            }
+        )
+        self._add_workspace(workspace_id, workspace_name)
+
+        if len(self._new_workspaces) >= self.mongo_client.batch_size:
+            self.flush()
+        return workspace_id
+
+    def _add_workspace(self, workspace_id: str, workspace_name: str):
+        self._workspace_ids.add(workspace_id)
+        self._workspace_ids_by_name.setdefault(workspace_name, workspace_id)
+        if self._first_workspace_id is None:
+            self._first_workspace_id = workspace_id
+
+
+class _ProjectGroupTree(object):
+    """Project groups of a domain, loaded with one read, indexed by their parent.
+
+    get_root() walks up the parent pointers in memory and remembers the root of
+    every group on the way (path compression), so that the projects of a group
+    and the groups below it resolve their root with a dict lookup. Parents are
+    read from parent_project_group_id, or from parent_group_id for the groups
+    already refactored by a previous (interrupted) run.
+    """
+
+    def __init__(self, project_groups):
+        self.project_groups = list(project_groups)
+        self._project_groups = {
+            project_group["project_group_id"]: project_group
+            for project_group in self.project_groups
+        }
+        self._roots = {}
+
+    @classmethod
+    def load(cls, mongo_client: MongoCustomClient, domain_id: str):
+        return cls(
+            mongo_client.find("IDENTITY", "project_group", {"domain_id": domain_id}, {})
         )
-        if parent_project_group_id := project_group.get("parent_project_group_id"):
-            project_group_id = parent_project_group_id
 
-        else:
-            return project_group
+    def get(self, project_group_id: str) -> [dict, None]:
+        return self._project_groups.get(project_group_id)
+
+    def get_root(self, project_group_id: str) -> [dict, None]:
+        path = []
+        root = None
+        while project_group_id and project_group_id not in path:
+            if project_group_id in self._roots:
+                root = self._roots[project_group_id]
+                break
+
+            project_group = self._project_groups.get(project_group_id)
+            if project_group is None:
+                _LOGGER.error(f"project group({project_group_id}) not found.")
+                break
+
+            path.append(project_group_id)
+            parent_group_id = project_group.get(
+                "parent_project_group_id"
+            ) or project_group.get("parent_group_id")
+            if not parent_group_id:
+                root = project_group
+                break
+            project_group_id = parent_group_id
+
+        for project_group_id in path:
+            self._roots[project_group_id] = root
+        return root
 
 
 @print_log
 def identity_service_account_and_trusted_account_creating(
-    mongo_client, domain_id_param, workspace_mode
+    mongo_client, domain_id_param, workspace_mode, workspace_map, project_map
 ):
     domain_id = domain_id_param
     service_account_infos = mongo_client.find(
@@ -367,7 +470,7 @@ def identity_service_account_and_trusted_account_creating(
         """check project_id"""
         if service_account_info.get("project_id"):
             project_id = service_account_info.get("project_id")
-            workspace_id = PROJECT_MAP[domain_id].get(project_id)
+            workspace_id = project_map[domain_id].get(project_id)
         else:
             if service_account_info.get("project"):
                 project_object_id = service_account_info.get("project")
@@ -378,12 +481,12 @@ def identity_service_account_and_trusted_account_creating(
                 )
 
                 project_id = project_info.get("project_id")
-                workspace_id = PROJECT_MAP[domain_id].get(project_id)
+                workspace_id = project_map[domain_id].get(project_id)
             else:
                 if workspace_mode:
-                    workspace_id = list(WORKSPACE_MAP["multi"][domain_id].values())[0]
+                    workspace_id = list(workspace_map["multi"][domain_id].values())[0]
                 else:
-                    workspace_id = list(PROJECT_MAP[domain_id].values())[0]
+                    workspace_id = list(project_map[domain_id].values())[0]
 
                 project_id = _create_unmanaged_sa_project(
                     domain_id, workspace_id, mongo_client
@@ -425,115 +528,125 @@ def _create_unmanaged_sa_project(domain_id, workspace_id, mongo_client):
 
 
 @print_log
-def identity_role_binding_refactoring(mongo_client, domain_id_param):
-    if not PROJECT_MAP.get(domain_id_param):
+def identity_role_binding_refactoring(mongo_client, domain_id_param, project_map):
+    if not project_map.get(domain_id_param):
         _LOGGER.error(f"domain({domain_id_param}) has no projects.")
         return None
 
+    roles = {
+        role_info["role_id"]: role_info
+        for role_info in mongo_client.find(
+            "IDENTITY",
+            "role",
+            {"domain_id": domain_id_param},
+            {"role_id": 1, "role_type": 1},
+        )
+    }
+    project_group_tree = _ProjectGroupTree.load(mongo_client, domain_id_param)
     role_binding_infos = mongo_client.find(
         "IDENTITY", "role_binding", {"domain_id": domain_id_param}, {}
     )
 
-    for role_binding_info in role_binding_infos:
-        param_role_id = role_binding_info["role_id"]
+    with mongo_client.bulk_writer("IDENTITY", "role_binding") as writer:
+        for role_binding_info in role_binding_infos:
+            writer.append(
+                UpdateOne(
+                    {"_id": role_binding_info["_id"]},
+                    _create_role_binding_params(
+                        role_binding_info,
+                        roles[role_binding_info["role_id"]],
+                        project_group_tree,
+                        project_map[domain_id_param],
+                    ),
+                )
+            )
+
 
-        role_info = mongo_client.find_one(
-            "IDENTITY", "role", {"role_id": param_role_id, "domain_id": domain_id_param}, {}
-        )
-        
-        if role_info.get("role_type") == "DOMAIN":
-            role_id = "managed-domain-admin"
-            role_type = "DOMAIN_ADMIN"
-            workspace_id = "*"
-            resource_group = "DOMAIN"
+def _create_role_binding_params(
+    role_binding_info, role_info, project_group_tree, project_map
+):
+    if role_info.get("role_type") == "DOMAIN":
+        role_id = "managed-domain-admin"
+        role_type = "DOMAIN_ADMIN"
+        workspace_id = "*"
+        resource_group = "DOMAIN"
+    else:
+        resource_group = "WORKSPACE"
+        if not role_binding_info.get("project_group_id"):
+            role_id = "managed-workspace-member"
+            role_type = "WORKSPACE_MEMBER"
+            workspace_id = project_map.get(role_binding_info.get("project_id"))
         else:
-            resource_group = "WORKSPACE"
-            if not role_binding_info.get("project_group_id"):
+            project_group_info = project_group_tree.get(
+                role_binding_info.get("project_group_id")
+            )
+            workspace_id = project_group_info.get("workspace_id")
+            if not project_group_info.get("parent_group_id"):
+                role_id = "managed-workspace-owner"
+                role_type = "WORKSPACE_OWNER"
+            else:
                 role_id = "managed-workspace-member"
                 role_type = "WORKSPACE_MEMBER"
-                workspace_id = PROJECT_MAP[domain_id_param].get(
-                    role_binding_info.get("project_id")
-                )
-            else:
-                project_group_info = mongo_client.find_one(
-                    "IDENTITY",
-                    "project_group",
-                    {
-                        "project_group_id": role_binding_info.get("project_group_id"),
-                    },
-                    {},
-                )
-                workspace_id = project_group_info.get("workspace_id")
-                if not project_group_info.get("parent_group_id"):
-                    role_id = "managed-workspace-owner"
-                    role_type = "WORKSPACE_OWNER"
-                else:
-                    role_id = "managed-workspace-member"
-                    role_type = "WORKSPACE_MEMBER"
-
-        set_param = {
-            "$set": {
-                "user_id": role_binding_info["resource_id"],
-                "role_id": role_id,
-                "role_type": role_type,
-                "workspace_id": workspace_id,
-                "resource_group": resource_group,
-            },
-            "$unset": {
-                "resource_type": 1,
-                "resource_id": 1,
-                "role": 1,
-                "project": 1,
-                "project_group": 1,
-                "project_id": 1,
-                "project_group_id": 1,
-                "user": 1,
-                "labels": 1,
-                "tags": 1,
-            },
-        }
 
-        mongo_client.update_one(
-            "IDENTITY", "role_binding", {"_id": role_binding_info["_id"]}, set_param
-        )
+    return {
+        "$set": {
+            "user_id": role_binding_info["resource_id"],
+            "role_id": role_id,
+            "role_type": role_type,
+            "workspace_id": workspace_id,
+            "resource_group": resource_group,
+        },
+        "$unset": {
+            "resource_type": 1,
+            "resource_id": 1,
+            "role": 1,
+            "project": 1,
+            "project_group": 1,
+            "project_id": 1,
+            "project_group_id": 1,
+            "user": 1,
+            "labels": 1,
+            "tags": 1,
+        },
+    }
 
 
 @print_log
 def identity_user_refactoring(mongo_client, domain_id_param):
+    domain_admin_role_ids = {}
+    for role_binding_info in mongo_client.find(
+        "IDENTITY",
+        "role_binding",
+        {"domain_id": domain_id_param, "role_type": "DOMAIN_ADMIN"},
+        {"user_id": 1, "role_id": 1},
+    ):
+        domain_admin_role_ids.setdefault(
+            role_binding_info["user_id"], role_binding_info["role_id"]
+        )
+
     user_infos = mongo_client.find(
         "IDENTITY", "user", {"domain_id": domain_id_param}, {}
     )
 
-    role_type = "USER"
-    role_id = None
-
-    for user_info in user_infos:
-        role_binding_info = mongo_client.find_one(
-            "IDENTITY",
-            "role_binding",
-            {
-                "domain_id": user_info["domain_id"],
-                "user_id": user_info["user_id"],
-                "role_type": "DOMAIN_ADMIN",
-            },
-            {},
-        )
-        if role_binding_info:
-            role_type = "DOMAIN_ADMIN"
-            role_id = role_binding_info["role_id"]
+    with mongo_client.bulk_writer("IDENTITY", "user") as writer:
+        for user_info in user_infos:
+            if user_info["user_id"] in domain_admin_role_ids:
+                role_type = "DOMAIN_ADMIN"
+                role_id = domain_admin_role_ids[user_info["user_id"]]
+            else:
+                role_type = "USER"
+                role_id = None
 
-        set_param = {
-            "$set": {
-                "auth_type": user_info["backend"],
-                "role_type": role_type,
-                "role_id": role_id,
-            },
-            "$unset": {"user_type": 1, "backend": 1},
-        }
+            set_param = {
+                "$set": {
+                    "auth_type": user_info["backend"],
+                    "role_type": role_type,
+                    "role_id": role_id,
+                },
+                "$unset": {"user_type": 1, "backend": 1},
+            }
 
-        mongo_client.update_one(
-            "IDENTITY", "user", {"_id": user_info["_id"]}, set_param
-        )
+            writer.append(UpdateOne({"_id": user_info["_id"]}, set_param))
 
 
 def _get_schema_to_schema_id(schema):
@@ -584,8 +697,7 @@ def identity_role_refactoring(mongo_client, domain_id_param):
 
 def drop_collections(mongo_client):
     collections = ["provider", "domain_owner", "policy", "a_p_i_key"]
-    for collection in collections:
-        mongo_client.drop_collection("IDENTITY", collection)
+    mongo_client.drop_collections("IDENTITY", collections)
 
 
 @print_log
@@ -600,8 +712,18 @@ def update_domain(mongo_client, domain_id_param, domain_tags):
 
 
 def create_workspace_project_map(
-    mongo_client: MongoCustomClient, domain_id_param, workspace_mode
+    mongo_client: MongoCustomClient,
+    domain_id_param,
+    workspace_mode,
+    workspace_map: dict = None,
+    project_map: dict = None,
 ):
+    """Fill the maps of a domain (new ones unless given) from its workspaces."""
+    if workspace_map is None:
+        workspace_map = {"single": {}, "multi": {}}
+    if project_map is None:
+        project_map = {}
+
     workspace_infos = mongo_client.find(
         "IDENTITY", "workspace", {"domain_id": domain_id_param}, {}
     )
@@ -610,11 +732,11 @@ def create_workspace_project_map(
         domain_id = workspace_info["domain_id"]
 
         if workspace_mode:
-            if domain_id not in WORKSPACE_MAP["multi"].keys():
-                WORKSPACE_MAP["multi"].update({domain_id: {}})
+            if domain_id not in workspace_map["multi"].keys():
+                workspace_map["multi"].update({domain_id: {}})
         else:
-            if domain_id not in WORKSPACE_MAP["single"].keys():
-                WORKSPACE_MAP["single"].update({domain_id: ""})
+            if domain_id not in workspace_map["single"].keys():
+                workspace_map["single"].update({domain_id: ""})
 
         project_infos = mongo_client.find(
             "IDENTITY", "project", {"workspace_id": workspace_id}, {}
@@ -624,17 +746,50 @@ def create_workspace_project_map(
             project_id = project_info["project_id"]
 
             if workspace_mode:
-                WORKSPACE_MAP["multi"][domain_id].update(
+                workspace_map["multi"][domain_id].update(
                     {project_group_id: workspace_id}
                 )
             else:
-                WORKSPACE_MAP["single"][domain_id] = workspace_id
+                workspace_map["single"][domain_id] = workspace_id
 
-            if domain_id not in PROJECT_MAP.keys():
-                PROJECT_MAP[domain_id] = {project_id: workspace_id}
+            if domain_id not in project_map.keys():
+                project_map[domain_id] = {project_id: workspace_id}
             else:
-                PROJECT_MAP[domain_id].update({project_id: workspace_id})
-    return WORKSPACE_MAP, PROJECT_MAP
+                project_map[domain_id].update({project_id: workspace_id})
+    return workspace_map, project_map
+
+
+def restore_workspace_project_map(
+    mongo_client: MongoCustomClient,
+    domain_id_param,
+    workspace_mode,
+    workspace_map: dict,
+    project_map: dict,
+):
+    if workspace_mode:
+        workspace_map["multi"].setdefault(domain_id_param, {})
+        project_groups = mongo_client.find(
+            "IDENTITY",
+            "project_group",
+            {"domain_id": domain_id_param, "workspace_id": {"$exists": True}},
+            {"project_group_id": 1, "workspace_id": 1},
+        )
+        for project_group in project_groups:
+            workspace_map["multi"][domain_id_param][
+                project_group["project_group_id"]
+            ] = project_group["workspace_id"]
+    else:
+        workspace_info = mongo_client.find_one(
+            "IDENTITY", "workspace", {"domain_id": domain_id_param}
+        )
+        if workspace_info:
+            workspace_map["single"][domain_id_param] = workspace_info["workspace_id"]
+        else:
+            workspace_map["single"].setdefault(domain_id_param, "")
+
+    return create_workspace_project_map(
+        mongo_client, domain_id_param, workspace_mode, workspace_map, project_map
+    )
 
 
 @print_log
@@ -643,21 +798,39 @@ def identity_drop_indexes(mongo_client: MongoCustomClient):
 
 
 def main(mongo_client, domain_id, workspace_mode):
+    # maps of this domain, merged by the caller (see merge_workspace_project_map)
+    workspace_map = {"single": {}, "multi": {}}
+    project_map = {}
+    is_resumed = mongo_client.ledger and mongo_client.ledger.has_done_steps()
     identity_drop_indexes(mongo_client)
 
-    workspace_infos = mongo_client.find(
-        "IDENTITY", "workspace", {"domain_id": domain_id}, {"_id": 1}
-    )
+    if is_resumed:
+        # resumed run: finished steps are skipped, so restore their maps
+        restore_workspace_project_map(
+            mongo_client, domain_id, workspace_mode, workspace_map, project_map
+        )
+    else:
+        workspace_infos = mongo_client.find(
+            "IDENTITY", "workspace", {"domain_id": domain_id}, {"_id": 1}
+        )
 
-    if len([workspace_info for workspace_info in workspace_infos]) > 0:
-        return create_workspace_project_map(mongo_client, domain_id, workspace_mode)
+        if len([workspace_info for workspace_info in workspace_infos]) > 0:
+            return create_workspace_project_map(
+                mongo_client, domain_id, workspace_mode, workspace_map, project_map
+            )
 
-    identity_domain_refactoring_and_external_auth_creating(mongo_client, domain_id)
-    identity_project_group_refactoring_and_workspace_creating(mongo_client, domain_id)
-    identity_project_refactoring(mongo_client, domain_id)
-    identity_service_account_and_trusted_account_creating(mongo_client, domain_id, workspace_mode)
-    identity_role_binding_refactoring(mongo_client, domain_id)
+    identity_domain_refactoring_and_external_auth_creating(
+        mongo_client, domain_id, workspace_map
+    )
+    identity_project_group_refactoring_and_workspace_creating(
+        mongo_client, domain_id, workspace_map
+    )
+    identity_project_refactoring(mongo_client, domain_id, workspace_map, project_map)
+    identity_service_account_and_trusted_account_creating(
+        mongo_client, domain_id, workspace_mode, workspace_map, project_map
+    )
+    identity_role_binding_refactoring(mongo_client, domain_id, project_map)
     identity_user_refactoring(mongo_client, domain_id)
     identity_role_refactoring(mongo_client, domain_id)
 
-    return WORKSPACE_MAP, PROJECT_MAP
+    return workspace_map, project_map
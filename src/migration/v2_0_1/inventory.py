@@ -19,8 +19,7 @@ def drop_collections(mongo_client: MongoCustomClient):
         "cloud_service_stats_query_history",
     ]
 
-    for collection in collections:
-        mongo_client.drop_collection("INVENTORY", collection)
+    mongo_client.drop_collections("INVENTORY", collections)
 
 
 def cloud_service_report_update_fields(mongo_client: MongoCustomClient):
@@ -103,6 +102,21 @@ def inventory_cloud_service_refactoring(
 
 @print_log
 def inventory_note_refactoring(mongo_client: MongoCustomClient, domain_id, project_map):
+    if mongo_client.update_many_by_map(
+        "INVENTORY",
+        "note",
+        {
+            "domain_id": domain_id,
+            "workspace_id": {"$in": [None, ""]},
+            "project_id": {"$exists": True},
+        },
+        "project_id",
+        "workspace_id",
+        project_map.get(domain_id, {}),
+        default=None,
+    ):
+        return
+
     operations = []
 
     inventory_notes_info = mongo_client.find(
@@ -126,13 +140,37 @@ def inventory_note_refactoring(mongo_client: MongoCustomClient, domain_id, proje
     mongo_client.bulk_write("INVENTORY", "note", operations)
 
 
+@print_log
+def inventory_cross_domain_update_workspace_id(
+    mongo_client: MongoCustomClient, col_name, domain_ids, project_workspace_map
+):
+    mongo_client.update_by_map_scan(
+        "INVENTORY",
+        col_name,
+        {"domain_id": {"$in": domain_ids}, "workspace_id": {"$in": [None, ""]}},
+        "project_id",
+        "workspace_id",
+        project_workspace_map,
+    )
+
+
 @print_log
 def inventory_drop_indexes(mongo_client: MongoCustomClient):
     mongo_client.drop_indexes("INVENTORY", "*")
 
 
-def main(mongo_client: MongoCustomClient, domain_id, project_map):
+def main(mongo_client: MongoCustomClient, domain_id, project_map, cross_domain=False):
     inventory_drop_indexes(mongo_client)
-    inventory_cloud_service_refactoring(mongo_client, domain_id, project_map)
-    inventory_note_refactoring(mongo_client, domain_id, project_map)
+    if not cross_domain:
+        inventory_cloud_service_refactoring(mongo_client, domain_id, project_map)
+        inventory_note_refactoring(mongo_client, domain_id, project_map)
     inventory_collector_drop_fields(mongo_client)
+
+
+def cross_domain_main(mongo_client, domain_ids, project_workspace_map):
+    """Run the project_id -> workspace_id steps of main() once for all domains."""
+    inventory_drop_indexes(mongo_client)
+    for col_name in ["cloud_service", "note"]:
+        inventory_cross_domain_update_workspace_id(
+            mongo_client, col_name, domain_ids, project_workspace_map
+        )
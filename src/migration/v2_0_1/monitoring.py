@@ -10,6 +10,16 @@ from lib.util import print_log
 
 _LOGGER = logging.getLogger(DEFAULT_LOGGER)
 
+# collections whose workspace_id is resolved from the project_id of a document
+PROJECT_COLLECTIONS = [
+    "project_alert_config",
+    "event_rule",
+    "webhook",
+    "alert",
+    "event",
+    "note",
+]
+
 
 @print_log
 def event_rule_update_fields(mongo_client: MongoCustomClient):
@@ -42,8 +52,7 @@ def alert_update_fields(mongo_client: MongoCustomClient):
 @print_log
 def drop_collections(mongo_client: MongoCustomClient):
     collections = ["alert_number", "maintenance_window"]
-    for collection in collections:
-        mongo_client.drop_collection("MONITORING", collection)
+    mongo_client.drop_collections("MONITORING", collections)
 
 
 @print_log
@@ -275,6 +284,21 @@ def monitoring_webhook_update_fields(
 def monitoring_alert_update_fields(
     mongo_client: MongoCustomClient, domain_id, project_map
 ):
+    if mongo_client.update_many_by_map(
+        "MONITORING",
+        "alert",
+        {
+            "domain_id": domain_id,
+            "workspace_id": {"$in": [None, ""]},
+            "project_id": {"$exists": True},
+        },
+        "project_id",
+        "workspace_id",
+        project_map.get(domain_id, {}),
+        default=None,
+    ):
+        return
+
     operations = []
 
     alert_infos = mongo_client.find(
@@ -305,6 +329,21 @@ def monitoring_alert_update_fields(
 def monitoring_event_update_fields(
     mongo_client: MongoCustomClient, domain_id, project_map
 ):
+    if mongo_client.update_many_by_map(
+        "MONITORING",
+        "event",
+        {
+            "domain_id": domain_id,
+            "workspace_id": {"$in": [None, ""]},
+            "project_id": {"$exists": True},
+        },
+        "project_id",
+        "workspace_id",
+        project_map.get(domain_id, {}),
+        default=None,
+    ):
+        return
+
     operations = []
 
     event_infos = mongo_client.find(
@@ -359,19 +398,48 @@ def monitoring_note_update_fields(
     mongo_client.bulk_write("MONITORING", "note", operations)
 
 
+@print_log
+def monitoring_cross_domain_update_workspace_id(
+    mongo_client: MongoCustomClient, col_name, domain_ids, project_workspace_map
+):
+    mongo_client.update_by_map_scan(
+        "MONITORING",
+        col_name,
+        {"domain_id": {"$in": domain_ids}, "workspace_id": {"$in": [None, ""]}},
+        "project_id",
+        "workspace_id",
+        project_workspace_map,
+    )
+
+
 @print_log
 def monitoring_drop_indexes(mongo_client: MongoCustomClient):
     mongo_client.drop_indexes("MONITORING", "*")
 
 
-def main(mongo_client, domain_id, project_map, workspace_mode):
+def main(mongo_client, domain_id, project_map, workspace_mode, cross_domain=False):
     monitoring_drop_indexes(mongo_client)
-    monitoring_project_alert_config_update_fields(mongo_client, domain_id, project_map)
-    monitoring_event_rule_update_fields(mongo_client, domain_id, project_map)
-    monitoring_webhook_update_fields(mongo_client, domain_id, project_map)
-    monitoring_alert_update_fields(mongo_client, domain_id, project_map)
-    monitoring_event_update_fields(mongo_client, domain_id, project_map)
-    monitoring_note_update_fields(mongo_client, domain_id, project_map)
+    if not cross_domain:
+        monitoring_project_alert_config_update_fields(
+            mongo_client, domain_id, project_map
+        )
+        monitoring_event_rule_update_fields(mongo_client, domain_id, project_map)
+        monitoring_webhook_update_fields(mongo_client, domain_id, project_map)
+        monitoring_alert_update_fields(mongo_client, domain_id, project_map)
+        monitoring_event_update_fields(mongo_client, domain_id, project_map)
+        monitoring_note_update_fields(mongo_client, domain_id, project_map)
     monitoring_escalation_policy_refactoring(
         mongo_client, domain_id, project_map, workspace_mode
     )
+
+
+def cross_domain_main(mongo_client, domain_ids, project_workspace_map):
+    """Run the project_id -> workspace_id steps of main() once for all domains.
+
+    project_workspace_map is {project_id: workspace_id} of every domain.
+    """
+    monitoring_drop_indexes(mongo_client)
+    for col_name in PROJECT_COLLECTIONS:
+        monitoring_cross_domain_update_workspace_id(
+            mongo_client, col_name, domain_ids, project_workspace_map
+        )
@@ -14,6 +14,21 @@ _LOGGER = logging.getLogger(DEFAULT_LOGGER)
 def notification_project_channel_refactoring(
     mongo_client: MongoCustomClient, domain_id_param, project_map
 ):
+    if mongo_client.update_many_by_map(
+        "NOTIFICATION",
+        "project_channel",
+        {
+            "domain_id": domain_id_param,
+            "workspace_id": {"$in": [None, ""]},
+            "project_id": {"$exists": True},
+        },
+        "project_id",
+        "workspace_id",
+        project_map.get(domain_id_param, {}),
+        default=None,
+    ):
+        return
+
     operations = []
 
     project_channel_infos = mongo_client.find(
@@ -10,8 +10,7 @@ _LOGGER = logging.getLogger(DEFAULT_LOGGER)
 @print_log
 def drop_collections(mongo_client: MongoCustomClient):
     collections = ["installed_plugin", "installed_plugin_ref", "supervisor"]
-    for collection in collections:
-        mongo_client.drop_collection("PLUGIN", collection)
+    mongo_client.drop_collections("PLUGIN", collections)
 
 
 @print_log
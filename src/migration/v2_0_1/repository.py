@@ -9,5 +9,4 @@ _LOGGER = logging.getLogger(DEFAULT_LOGGER)
 @print_log
 def drop_collections(mongo_client):
     collections = ["repository", "policy", "schema", "plugin"]
-    for collection in collections:
-        mongo_client.drop_collection("REPOSITORY", collection)
+    mongo_client.drop_collections("REPOSITORY", collections)
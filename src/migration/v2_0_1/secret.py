@@ -147,8 +147,7 @@ def _get_schema_to_schema_id(schema):
 @print_log
 def drop_collections(mongo_client):
     collections = ["secret_group", "secret_group_map"]
-    for collection in collections:
-        mongo_client.drop_collection("SECRET", collection)
+    mongo_client.drop_collections("SECRET", collections)
 
 
 @print_log
@@ -10,8 +10,7 @@ _LOGGER = logging.getLogger(DEFAULT_LOGGER)
 @print_log
 def drop_collections(mongo_client):
     collections = ["history", "schedule"]
-    for collection in collections:
-        mongo_client.drop_collection("STATISTICS", collection)
+    mongo_client.drop_collections("STATISTICS", collections)
 
 
 @print_log